@@ -0,0 +1,146 @@
+"""
+AccountBalance maintenance.
+
+Each AccountBalance row holds the debit and credit totals of one account's
+journal lines for one month. apply_deltas() adds amounts to those rows with
+``UPDATE ... SET debit_total = debit_total + x`` (inserting missing rows),
+so writers never re-sum journal lines. Journal lines saved or deleted
+through the ORM are applied by the signal handlers below; bulk writers call
+apply_deltas() themselves.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .financial_models import AccountBalance, JournalEntry, JournalEntryLine
+
+
+def period_of(day):
+    """First day of the month containing `day`"""
+    return day.replace(day=1)
+
+
+def new_deltas():
+    """Accumulator for apply_deltas(): {(account_id, period): [debit, credit]}"""
+    return defaultdict(lambda: [Decimal('0'), Decimal('0')])
+
+
+def apply_deltas(deltas):
+    """Add {(account_id, period): (debit, credit)} amounts to the AccountBalance rows"""
+    now = timezone.now()
+    # Fixed order so concurrent writers lock rows in the same sequence
+    for (account_id, period), (debit, credit) in sorted(deltas.items()):
+        if not debit and not credit:
+            continue
+        rows = AccountBalance.objects.filter(account_id=account_id, period=period)
+        increment = dict(debit_total=F('debit_total') + debit, credit_total=F('credit_total') + credit, updated_at=now)
+        if rows.update(**increment):
+            continue
+        try:
+            with transaction.atomic():
+                AccountBalance.objects.create(
+                    account_id=account_id, period=period, debit_total=debit, credit_total=credit
+                )
+        except IntegrityError:
+            # Another transaction created the row first
+            rows.update(**increment)
+
+
+def rebuild_balances(account_ids=None):
+    """Recompute AccountBalance rows from the journal lines (all accounts by default)"""
+    lines = JournalEntryLine.objects.all()
+    balances = AccountBalance.objects.all()
+    if account_ids is not None:
+        lines = lines.filter(account_id__in=account_ids)
+        balances = balances.filter(account_id__in=account_ids)
+
+    totals = new_deltas()
+    for line in lines.order_by().values('account_id', 'transaction_date').annotate(
+        debit=Sum('debit_amount'), credit=Sum('credit_amount')
+    ):
+        key = (line['account_id'], period_of(line['transaction_date']))
+        totals[key][0] += line['debit'] or 0
+        totals[key][1] += line['credit'] or 0
+
+    with transaction.atomic():
+        balances.delete()
+        AccountBalance.objects.bulk_create(
+            [
+                AccountBalance(account_id=account_id, period=period, debit_total=debit, credit_total=credit)
+                for (account_id, period), (debit, credit) in sorted(totals.items())
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def _add_line(deltas, account_id, period, debit, credit, sign=1):
+    deltas[(account_id, period)][0] += sign * (debit or 0)
+    deltas[(account_id, period)][1] += sign * (credit or 0)
+
+
+@receiver(post_save, sender='api.JournalEntryLine')
+def journal_line_saved(sender, instance, created, **kwargs):
+    period = period_of(instance.journal_entry.transaction_date)
+    deltas = new_deltas()
+    if created:
+        _add_line(deltas, instance.account_id, period, instance.debit_amount, instance.credit_amount)
+    else:
+        changes = instance.get_changes()
+        if not changes.keys() & {'account', 'debit_amount', 'credit_amount', 'journal_entry'}:
+            return
+        old = {name: change['old'] for name, change in changes.items()}
+        old_period = period
+        if 'journal_entry' in old:
+            old_period = period_of(JournalEntry.objects.get(pk=old['journal_entry']).transaction_date)
+        _add_line(
+            deltas, old.get('account', instance.account_id), old_period,
+            Decimal(old.get('debit_amount', instance.debit_amount)),
+            Decimal(old.get('credit_amount', instance.credit_amount)),
+            sign=-1,
+        )
+        _add_line(deltas, instance.account_id, period, instance.debit_amount, instance.credit_amount)
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender='api.JournalEntryLine')
+def journal_line_deleted(sender, instance, **kwargs):
+    # Lines go before their entry when an entry is deleted, so it is still there
+    entry = JournalEntry.objects.filter(pk=instance.journal_entry_id).first()
+    if entry is None:
+        return
+    deltas = new_deltas()
+    _add_line(
+        deltas, instance.account_id, period_of(entry.transaction_date),
+        instance.debit_amount, instance.credit_amount, sign=-1,
+    )
+    apply_deltas(deltas)
+
+
+@receiver(post_save, sender='api.JournalEntry')
+def journal_entry_saved(sender, instance, created, **kwargs):
+    """Move the entry's lines to the new date, and their totals to the new month if it changed"""
+    if created:
+        return
+    moved = instance.get_changes().get('transaction_date')
+    if not moved:
+        return
+    instance.lines.update(transaction_date=instance.transaction_date)
+    old_period = period_of(datetime.date.fromisoformat(moved['old']))
+    new_period = period_of(instance.transaction_date)
+    if old_period == new_period:
+        return
+
+    deltas = new_deltas()
+    for line in instance.lines.order_by().values('account_id').annotate(
+        debit=Sum('debit_amount'), credit=Sum('credit_amount')
+    ):
+        _add_line(deltas, line['account_id'], old_period, line['debit'], line['credit'], sign=-1)
+        _add_line(deltas, line['account_id'], new_period, line['debit'], line['credit'])
+    apply_deltas(deltas)
@@ -0,0 +1,143 @@
+"""
+ActivityLog retention.
+
+Rows older than the retention window are moved, in id-ordered chunks, to
+one gzipped JSONL file per calendar month
+(``activity_log-YYYY-MM.jsonl.gz`` under ACTIVITY_LOG_ARCHIVE_PATH) and
+deleted from the table. Each chunk is appended as its own gzip member, so
+an interrupted run leaves valid files; readers drop ids seen twice in case
+a chunk was written but not deleted before a crash.
+"""
+import gzip
+import json
+import os
+import re
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+ARCHIVE_FILE_RE = re.compile(r'^activity_log-(\d{4})-(\d{2})\.jsonl\.gz$')
+
+
+def archive_dir():
+    return str(getattr(settings, 'ACTIVITY_LOG_ARCHIVE_PATH', os.path.join(settings.BASE_DIR, 'archive', 'activity_logs')))
+
+
+def archive_path(year, month):
+    return os.path.join(archive_dir(), f'activity_log-{year:04d}-{month:02d}.jsonl.gz')
+
+
+def retention_cutoff(months=None, now=None):
+    """Start of the oldest month kept in the table"""
+    if months is None:
+        months = getattr(settings, 'ACTIVITY_LOG_RETENTION_MONTHS', 12)
+    now = timezone.localtime(now or timezone.now())
+    index = now.year * 12 + (now.month - 1) - months
+    return now.replace(year=index // 12, month=index % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _serialize(row):
+    return {
+        'id': row['id'],
+        'user_id': row['user_id'],
+        'username': row['user__username'],
+        'action': row['action'],
+        'content_type': row['content_type'],
+        'object_id': row['object_id'],
+        'description': row['description'],
+        'created_at': row['created_at'].isoformat(),
+    }
+
+
+def archive_activity_logs(before, chunk_size=5000, dry_run=False):
+    """
+    Move ActivityLog rows created before `before` to monthly archive files.
+    Returns {(year, month): rows archived}.
+    """
+    from .models import ActivityLog
+
+    archived = defaultdict(int)
+    queryset = ActivityLog.objects.filter(created_at__lt=before)
+    if dry_run:
+        for created_at in queryset.values_list('created_at', flat=True).iterator(chunk_size=chunk_size):
+            local = timezone.localtime(created_at)
+            archived[(local.year, local.month)] += 1
+        return dict(archived)
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values('id', 'user_id', 'user__username', 'action', 'content_type', 'object_id', 'description', 'created_at')
+            [:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        by_month = defaultdict(list)
+        for row in rows:
+            local = timezone.localtime(row['created_at'])
+            by_month[(local.year, local.month)].append(_serialize(row))
+
+        # Files first, then delete: a crash in between only duplicates rows
+        for (year, month), entries in by_month.items():
+            with gzip.open(archive_path(year, month), 'at', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + '\n')
+            archived[(year, month)] += len(entries)
+
+        with transaction.atomic():
+            ActivityLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+    return dict(archived)
+
+
+def archived_months():
+    """[(year, month), ...] with an archive file, newest first"""
+    try:
+        names = os.listdir(archive_dir())
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        match = ARCHIVE_FILE_RE.match(name)
+        if match:
+            months.append((int(match.group(1)), int(match.group(2))))
+    return sorted(months, reverse=True)
+
+
+def read_archive(year, month, user_id=None, content_type=None, object_id=None, action=None):
+    """Archived rows for one month, newest first, optionally filtered"""
+    path = archive_path(year, month)
+    if not os.path.exists(path):
+        return []
+
+    entries = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            if user_id is not None and entry['user_id'] != user_id:
+                continue
+            if content_type and entry['content_type'] != content_type:
+                continue
+            if object_id is not None and entry['object_id'] != object_id:
+                continue
+            if action and entry['action'] != action:
+                continue
+            entries[entry['id']] = entry
+    return sorted(entries.values(), key=lambda entry: (entry['created_at'], entry['id']), reverse=True)
+
+
+def parse_month(value):
+    """'2024-05' -> (2024, 5), or None if malformed"""
+    try:
+        parsed = datetime.strptime(value, '%Y-%m')
+    except (TypeError, ValueError):
+        return None
+    return parsed.year, parsed.month
@@ -2,14 +2,14 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Client, Service, Quotation, QuotationItem, Invoice, InvoiceItem, 
-    ActivityLog, NumberSequence, Interaction, ClientAttachment
+    ActivityLog, NumberSequence, Interaction, ClientAttachment, EmailOutbox
 )
 
 @admin.register(NumberSequence)
 class NumberSequenceAdmin(admin.ModelAdmin):
-    list_display = ('document_type', 'year', 'month', 'last_number', 'updated_at')
+    list_display = ('document_type', 'scope', 'year', 'month', 'last_number', 'updated_at')
     list_filter = ('document_type', 'year', 'month')
-    search_fields = ('document_type',)
+    search_fields = ('document_type', 'scope')
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-year', '-month', 'document_type')
 
@@ -151,6 +151,22 @@ class ActivityLogAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         return False  # Prevent editing of activity logs
 
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('document_type', 'object_id', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'document_type', 'created_at')
+    search_fields = ('recipient', 'last_error')
+    readonly_fields = ('created_at', 'sent_at', 'locked_at', 'last_error', 'attempts')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        from django.utils import timezone
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), locked_at=None
+        )
+        self.message_user(request, f'{updated} email(s) queued for retry.')
+    retry_now.short_description = 'Retry selected emails now'
+
 @admin.register(Interaction)
 class InteractionAdmin(admin.ModelAdmin):
     list_display = ('client', 'interaction_type', 'direction', 'subject', 'amount', 'status', 'created_by', 'created_at')
@@ -6,4 +6,8 @@ class ApiConfig(AppConfig):
     name = 'api'
     
     def ready(self):
-        import api.signals  # Import signals when app is ready
+        import api.subscribers  # Register domain event handlers
+        import api.project_financials  # Keep ProjectFinancials rollups current
+        import api.project_sections  # Invalidate cached project detail sections
+        import api.account_balances  # Keep AccountBalance totals current
+        import api.posting  # Post journal entries for documents
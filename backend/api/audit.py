@@ -0,0 +1,137 @@
+"""
+Buffered ActivityLog writer.
+
+record_activity() queues an ActivityLog row in memory; a daemon thread
+writes queued rows with bulk_create every AUDIT_LOG_FLUSH_INTERVAL_MS or
+once AUDIT_LOG_BATCH_SIZE rows are waiting, so audit inserts are no longer
+part of request latency. Rows are only queued once the surrounding
+transaction commits, so a rolled-back request leaves no audit trail of
+changes that never happened. The queue is flushed at interpreter exit and from
+gunicorn's worker_exit hook. Set AUDIT_LOG_ASYNC = False to write rows
+synchronously (e.g. when debugging).
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogBuffer:
+    def __init__(self, flush_interval_ms=500, batch_size=100, max_queue=10000):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wakeup = threading.Event()
+        # Held while draining and writing, so rows never sit outside the
+        # queue unwritten when flush() is called at shutdown
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, entry):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Writer has fallen behind - write inline rather than drop rows
+            self.flush()
+            with self._write_lock:
+                self._bulk_write([entry])
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def _bulk_write(self, entries):
+        from .models import ActivityLog
+        try:
+            ActivityLog.objects.bulk_create(entries, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Failed to write %s audit log entries', len(entries))
+
+    def _run(self):
+        while True:
+            # Wake when a full batch is waiting, or every flush interval
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._queue.empty():
+                continue
+            close_old_connections()
+            self.flush()
+            close_old_connections()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        with self._write_lock:
+            while True:
+                entries = []
+                while len(entries) < self.batch_size:
+                    try:
+                        entries.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not entries:
+                    return
+                self._bulk_write(entries)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AuditLogBuffer(
+                    flush_interval_ms=getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL_MS', 500),
+                    batch_size=getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 100),
+                    max_queue=getattr(settings, 'AUDIT_LOG_MAX_QUEUE', 10000),
+                )
+    return _buffer
+
+
+def record_activity(user, action, content_type, object_id, description):
+    """
+    Queue an ActivityLog row once the current transaction commits (or write
+    it now, inside that transaction, when AUDIT_LOG_ASYNC is off)
+    """
+    from .models import ActivityLog
+
+    entry = ActivityLog(
+        user_id=getattr(user, 'pk', user),
+        action=action,
+        content_type=content_type,
+        object_id=object_id or 0,
+        description=description,
+        created_at=timezone.now(),
+    )
+    if not getattr(settings, 'AUDIT_LOG_ASYNC', True):
+        entry.save()
+        return entry
+
+    transaction.on_commit(lambda: get_buffer().enqueue(entry))
+    return entry
+
+
+def flush_audit_log():
+    """Write any queued audit rows; called at exit and from gunicorn's worker_exit hook"""
+    if _buffer is not None:
+        _buffer.flush()
+
+
+atexit.register(flush_audit_log)
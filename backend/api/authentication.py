@@ -0,0 +1,124 @@
+"""
+JWT login and authentication with user claims.
+
+Login verifies the password once (ClaimsTokenObtainPairSerializer) and
+embeds the user's id, username, role and display name in the tokens; the
+same pass returns the user payload, so the SPA doesn't need a follow-up
+/auth/profile/ call. ClaimsJWTAuthentication then builds request.user from
+those claims instead of loading the user on every request, so role checks
+(RoleBasedPermission) cost no query.
+
+Claims are refreshed from the database whenever the refresh token is used,
+and refresh is refused for deactivated users. Role and active-flag changes
+also bump User.auth_version, which tokens carry: an access token whose
+version no longer matches is rejected, so the SPA has to refresh. The
+current version is cached per process for AUTH_VERSION_CACHE_TIMEOUT
+seconds (and dropped on change in the process that made it), so a
+revocation reaches every worker within that time at the cost of one
+indexed lookup per user per interval.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser
+
+# User fields copied into the token; everything else is loaded on demand
+CLAIM_FIELDS = ('username', 'role', 'first_name', 'last_name', 'email', 'auth_version')
+
+AUTH_VERSION_CACHE_KEY = 'auth_version:{}'
+
+
+def current_auth_version(user_id):
+    """The user's auth_version, or None if the user is inactive or gone"""
+    key = AUTH_VERSION_CACHE_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = get_user_model().objects.filter(pk=user_id, is_active=True).values_list(
+            'auth_version', flat=True
+        ).first()
+        # -1 caches "inactive or deleted" too
+        version = -1 if version is None else version
+        cache.set(key, version, getattr(settings, 'AUTH_VERSION_CACHE_TIMEOUT', 30))
+    return None if version < 0 else version
+
+
+def forget_auth_versions(user_ids):
+    """Drop cached versions once the change that bumped them has committed"""
+    keys = [AUTH_VERSION_CACHE_KEY.format(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def set_user_claims(token, user):
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    token['name'] = user.get_full_name() or user.username
+    return token
+
+
+def user_payload(user):
+    """User data returned alongside the tokens at login"""
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'name': user.get_full_name() or user.username,
+        'role': user.role,
+        'is_active': user.is_active,
+    }
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return set_user_claims(super().get_token(user), user)
+
+    def validate(self, attrs):
+        # super() authenticates exactly once and keeps the user on self.user
+        data = super().validate(attrs)
+        data['user'] = user_payload(self.user)
+        return data
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        # Access tokens inherit the refresh token's claims; bring them up to date
+        set_user_claims(refresh, user)
+        attrs['refresh'] = str(refresh)
+        return super().validate(attrs)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if any(field not in validated_token for field in CLAIM_FIELDS):
+            # Token issued before claims were added
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if current_auth_version(user_id) != validated_token['auth_version']:
+            # Deactivated, deleted, or role changed since the token was issued
+            raise AuthenticationFailed(_('Token is no longer valid'), code='token_not_valid')
+
+        claims = {field: validated_token[field] for field in CLAIM_FIELDS}
+        claims[api_settings.USER_ID_FIELD] = user_id
+        claims['is_active'] = True
+
+        # from_db() expects values in model field order
+        field_names = [f.attname for f in ClaimsUser._meta.concrete_fields if f.attname in claims]
+        return ClaimsUser.from_db('default', field_names, [claims[name] for name in field_names])
@@ -0,0 +1,93 @@
+"""
+Chart of accounts: the default accounts and the account tree with balances.
+
+Default accounts are created once by migration 0027 (and by
+ensure_default_accounts() for databases set up some other way) instead of
+being checked for on every request. account_tree() loads every account with
+its balance totals in one grouped query and rolls balances up to the parent
+accounts in Python.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+CASH = '1000'
+RECEIVABLE = '1200'
+PAYABLE = '2000'
+REVENUE = '4000'
+EXPENSES = '5000'
+
+DEFAULT_ACCOUNTS = (
+    (CASH, 'Cash', 'asset'),
+    (RECEIVABLE, 'Accounts Receivable', 'asset'),
+    (PAYABLE, 'Accounts Payable', 'liability'),
+    (REVENUE, 'Revenue', 'revenue'),
+    (EXPENSES, 'Expenses', 'expense'),
+)
+
+# Account types whose balance is debits minus credits; the others are credit-normal
+DEBIT_NORMAL_TYPES = ('asset', 'expense')
+
+
+def ensure_default_accounts():
+    """Create the default accounts if the chart of accounts is empty"""
+    from .financial_models import FinancialAccount
+
+    if FinancialAccount.objects.exists():
+        return []
+    return FinancialAccount.objects.bulk_create([
+        FinancialAccount(code=code, name=name, account_type=account_type, description=f"Default {name} account")
+        for code, name, account_type in DEFAULT_ACCOUNTS
+    ])
+
+
+def signed_balance(account_type, debit_total, credit_total):
+    """Balance on the account's normal side"""
+    if account_type in DEBIT_NORMAL_TYPES:
+        return debit_total - credit_total
+    return credit_total - debit_total
+
+
+def account_tree(include_inactive=False):
+    """
+    {'children': {parent_id: [accounts by code]}, 'balances': {account_id: {...}}}
+    for FinancialAccountSerializer. Each account's balance figures are its
+    own debit_total, credit_total and balance plus rolled_up_balance, which
+    adds the balances of all descendants.
+    """
+    from .financial_models import FinancialAccount
+
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=18, decimal_places=2))
+    accounts = list(
+        FinancialAccount.objects.annotate(
+            debits=Coalesce(Sum('balances__debit_total'), zero),
+            credits=Coalesce(Sum('balances__credit_total'), zero),
+        ).order_by('code')
+    )
+
+    balances = {}
+    for account in accounts:
+        balance = signed_balance(account.account_type, account.debits, account.credits)
+        balances[account.id] = {
+            'debit_total': account.debits,
+            'credit_total': account.credits,
+            'balance': balance,
+            'rolled_up_balance': balance,
+        }
+
+    parents = {account.id: account.parent_id for account in accounts}
+    for account in accounts:
+        seen = {account.id}
+        parent_id = account.parent_id
+        while parent_id is not None and parent_id not in seen:
+            balances[parent_id]['rolled_up_balance'] += balances[account.id]['balance']
+            seen.add(parent_id)
+            parent_id = parents.get(parent_id)
+
+    children = defaultdict(list)
+    for account in accounts:
+        if include_inactive or account.is_active:
+            children[account.parent_id].append(account)
+    return {'children': dict(children), 'balances': balances}
@@ -0,0 +1,233 @@
+"""
+Dunning runs: remind clients about overdue invoices in bulk.
+
+A run selects every overdue invoice in one query, groups them per client and
+queues one EmailOutbox row per client (document_type 'dunning') listing the
+invoice ids, then returns - nothing is rendered or sent inside the request.
+Rows carry a per-client, per-day dedupe key, so running again on the same
+day queues nothing new. The outbox worker renders the invoice PDFs in a
+thread pool, sends the reminder with the other outbox mail and records a
+follow-up Interaction against each invoice it covered. A reminder whose
+invoices were all paid before it went out is marked skipped, not failed.
+"""
+import logging
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import connections
+from django.utils import timezone
+
+from .events import publish
+from .models import EmailOutbox, Invoice, Interaction
+from .pdf_cache import get_or_render_pdf
+from .utils import format_currency
+
+logger = logging.getLogger(__name__)
+
+# Invoice statuses that can still be chased for payment
+OVERDUE_STATUSES = ('sent', 'approved', 'overdue')
+
+
+def overdue_invoices(as_of=None, client_ids=None):
+    """Invoices past their due date, served by the (status, due_date) index"""
+    as_of = as_of or timezone.now().date()
+    queryset = Invoice.objects.filter(
+        status__in=OVERDUE_STATUSES,
+        due_date__lt=as_of,
+    )
+    if client_ids:
+        queryset = queryset.filter(client_id__in=client_ids)
+    return (
+        queryset.select_related('client')
+        .prefetch_related('items__service')
+        .order_by('client_id', 'due_date', 'id')
+    )
+
+
+def group_by_client(invoices):
+    groups = OrderedDict()
+    for invoice in invoices:
+        groups.setdefault(invoice.client_id, []).append(invoice)
+    return groups
+
+
+def _render_invoice_pdf(invoice):
+    try:
+        return get_or_render_pdf('invoice', invoice)
+    finally:
+        # Database access in a worker thread opens a connection for that
+        # thread; close it rather than leaving it to the server to time out
+        connections.close_all()
+
+
+def render_pdfs(invoices, max_workers=None):
+    """Render invoice PDFs in parallel. Invoices must already be prefetched."""
+    max_workers = max_workers or settings.DUNNING_RENDER_WORKERS
+    if max_workers <= 1 or len(invoices) <= 1:
+        return {invoice.id: get_or_render_pdf('invoice', invoice) for invoice in invoices}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pdfs = executor.map(_render_invoice_pdf, invoices)
+        return {invoice.id: pdf for invoice, pdf in zip(invoices, pdfs)}
+
+
+def build_dunning_email(client, invoices, pdfs, as_of, connection=None):
+    """One reminder email listing every overdue invoice for a client"""
+    lines = []
+    for invoice in invoices:
+        days = (as_of - invoice.due_date).days
+        lines.append(
+            f"    - Invoice #{invoice.number}: {format_currency(invoice.total_amount, invoice.currency)}, "
+            f"due {invoice.due_date.strftime('%B %d, %Y')} ({days} day{'s' if days != 1 else ''} overdue)"
+        )
+
+    subject = f"Payment reminder: {len(invoices)} overdue invoice{'s' if len(invoices) != 1 else ''} from {settings.COMPANY_INFO['name']}"
+    email_body = f"""
+    Dear {client.name},
+
+    Our records show the following invoice{'s are' if len(invoices) != 1 else ' is'} past due:
+
+{chr(10).join(lines)}
+
+    Copies are attached for your reference. If payment has already been made, please disregard this reminder.
+
+    If you have any questions or need clarification, please don't hesitate to contact us.
+
+    Best regards,
+    {settings.COMPANY_INFO['name']}
+    {settings.COMPANY_INFO['phone']}
+    {settings.COMPANY_INFO['email']}
+    """
+
+    email = EmailMessage(
+        subject=subject,
+        body=email_body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[client.email],
+        connection=connection,
+    )
+    for invoice in invoices:
+        email.attach(f"invoice_{invoice.number}.pdf", pdfs[invoice.id], 'application/pdf')
+    return email
+
+
+def dedupe_key(client_id, as_of):
+    return f'dunning:{client_id}:{as_of.isoformat()}'
+
+
+def run_dunning(user, as_of=None, client_ids=None, dry_run=False):
+    """
+    Queue one reminder per client covering all of their overdue invoices.
+    Clients already reminded for `as_of` are skipped. Returns an aggregate
+    summary of the run.
+    """
+    as_of = as_of or timezone.now().date()
+    invoices = list(overdue_invoices(as_of, client_ids))
+    groups = group_by_client(invoices)
+
+    outstanding = defaultdict(Decimal)
+    for invoice in invoices:
+        outstanding[invoice.currency] += invoice.total_amount
+
+    summary = {
+        'as_of': as_of.isoformat(),
+        'dry_run': dry_run,
+        'clients': len(groups),
+        'invoices': len(invoices),
+        'outstanding': {currency: str(amount.quantize(Decimal('0.01'))) for currency, amount in outstanding.items()},
+        'reminders_queued': 0,
+        'already_queued': 0,
+        'skipped_no_email': [],
+    }
+
+    sendable = OrderedDict()
+    for client_id, client_invoices in groups.items():
+        client = client_invoices[0].client
+        if not client.email:
+            summary['skipped_no_email'].append({'client_id': client_id, 'client': client.name})
+            continue
+        sendable[client_id] = client_invoices
+
+    existing = set(
+        EmailOutbox.objects.filter(
+            dedupe_key__in=[dedupe_key(client_id, as_of) for client_id in sendable]
+        ).values_list('dedupe_key', flat=True)
+    )
+    rows = [
+        EmailOutbox(
+            document_type='dunning',
+            object_id=client_id,
+            recipient=client_invoices[0].client.email,
+            payload={'invoice_ids': [invoice.id for invoice in client_invoices], 'as_of': as_of.isoformat()},
+            dedupe_key=dedupe_key(client_id, as_of),
+            max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+            created_by=user if user and user.is_authenticated else None,
+        )
+        for client_id, client_invoices in sendable.items()
+        if dedupe_key(client_id, as_of) not in existing
+    ]
+    summary['already_queued'] = len(existing)
+    summary['reminders_queued'] = len(rows)
+    if dry_run or not rows:
+        return summary
+
+    # A concurrent run may have queued some of these since the check above
+    EmailOutbox.objects.bulk_create(rows, ignore_conflicts=True)
+
+    publish(
+        'invoice.reminded',
+        user=user,
+        object_id=0,
+        description=(
+            f"Dunning run: {len(rows)} reminder(s) queued for "
+            f"{sum(len(sendable[row.object_id]) for row in rows)} overdue invoice(s)"
+        )
+    )
+
+    return summary
+
+
+# Outbox delivery of queued reminders
+
+def reminder_invoices(entry, documents):
+    """The entry's invoices that are still overdue, from the outbox's loaded documents"""
+    invoices = [documents.get(('invoice', pk)) for pk in entry.payload.get('invoice_ids', [])]
+    return [invoice for invoice in invoices if invoice is not None and invoice.status in OVERDUE_STATUSES]
+
+
+def build_reminder_email(entry, invoices, connection=None):
+    pdfs = render_pdfs(invoices)
+    as_of = date.fromisoformat(entry.payload['as_of'])
+    return build_dunning_email(invoices[0].client, invoices, pdfs, as_of, connection=connection)
+
+
+def record_reminder(entry, invoices):
+    """
+    Log a follow-up Interaction against each invoice a sent reminder covered.
+    Reminders queued by the management command (or by a since-deleted user)
+    are recorded without a creator.
+    """
+    client = invoices[0].client
+    numbers = ', '.join(invoice.number for invoice in invoices)
+    now = timezone.now()
+    Interaction.objects.bulk_create([
+        Interaction(
+            client=client,
+            interaction_type='follow_up',
+            direction='outbound',
+            subject=f'Payment reminder for invoice {invoice.number}',
+            description=f'Overdue reminder emailed to {entry.recipient} covering {numbers}',
+            reference_number=invoice.number,
+            amount=invoice.total_amount,
+            currency=invoice.currency,
+            status='sent',
+            completed_date=now,
+            created_by_id=entry.created_by_id,
+            invoice=invoice,
+        )
+        for invoice in invoices
+    ])
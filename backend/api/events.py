@@ -0,0 +1,153 @@
+"""
+In-process domain event dispatcher.
+
+Views publish one event per business action (``quotation.created``,
+``invoice.paid``, ``expense.approved``, ...) and the handlers registered in
+api/subscribers.py fan it out to ActivityLog, FinancialAuditLog, the PDF
+cache and any other derived data. Event names are ``<entity>.<verb>``;
+the entity doubles as the ActivityLog/FinancialAuditLog content type.
+
+Handlers run synchronously in publish order unless subscribed with
+on_commit=True, in which case they run after the surrounding transaction
+commits (and not at all if it rolls back). A failing handler is logged and
+never breaks the request.
+"""
+import contextvars
+import fnmatch
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Event verb -> action string stored on audit rows (ActivityLog.action is max 20 chars)
+VERB_ACTIONS = {
+    'created': 'create',
+    'updated': 'update',
+    'deleted': 'delete',
+    'approved': 'approve',
+    'rejected': 'reject',
+    'paid': 'pay',
+    'exported': 'export',
+    'emailed': 'email',
+    'reminded': 'email',
+    'converted': 'convert',
+    'bulk_deleted': 'bulk_delete',
+    'logged_in': 'login',
+    'logged_out': 'logout',
+    'role_changed': 'update',
+}
+
+_subscribers = []  # (pattern, handler, on_commit)
+
+# Names of events published while handling the current request; None outside requests
+_request_events = contextvars.ContextVar('request_events', default=None)
+
+
+@dataclass
+class DomainEvent:
+    name: str
+    user: Any = None
+    instance: Any = None
+    object_id: int = None
+    description: str = ''
+    changes: dict = None
+    ip_address: str = None
+    user_agent: str = ''
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def entity(self):
+        return self.name.split('.', 1)[0]
+
+    @property
+    def verb(self):
+        return self.name.split('.', 1)[1] if '.' in self.name else self.name
+
+    @property
+    def content_type(self):
+        return self.entity
+
+    @property
+    def action(self):
+        return VERB_ACTIONS.get(self.verb, self.verb)[:20]
+
+
+def subscribe(pattern, on_commit=False):
+    """
+    Decorator registering a handler for events matching a glob pattern,
+    e.g. 'invoice.paid', 'invoice.*' or '*.deleted'.
+    """
+    def decorator(handler):
+        _subscribers.append((pattern, handler, on_commit))
+        return handler
+    return decorator
+
+
+def client_ip(request):
+    """Client IP, honouring X-Forwarded-For from the proxy"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def _dispatch(handler, event):
+    try:
+        handler(event)
+    except Exception:
+        logger.exception('Event handler %s failed for %s', getattr(handler, '__name__', handler), event.name)
+
+
+def publish(name, user=None, instance=None, object_id=None, description='', changes=None, request=None, **extra):
+    """Publish a domain event to every matching subscriber"""
+    if object_id is None and instance is not None:
+        object_id = instance.pk
+    event = DomainEvent(
+        name=name,
+        user=user,
+        instance=instance,
+        object_id=object_id or 0,
+        description=description,
+        changes=changes,
+        ip_address=client_ip(request) if request is not None else None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '') if request is not None else '',
+        extra=extra,
+    )
+
+    published = _request_events.get()
+    if published is not None:
+        published.append(name)
+
+    for pattern, handler, on_commit in _subscribers:
+        if not fnmatch.fnmatchcase(name, pattern):
+            continue
+        if on_commit:
+            transaction.on_commit(lambda handler=handler: _dispatch(handler, event))
+        else:
+            _dispatch(handler, event)
+    return event
+
+
+def mark_audited(name):
+    """
+    Note an event whose audit rows the caller wrote itself (bulk writers), so
+    the audit middleware doesn't add a generic row for the request
+    """
+    published = _request_events.get()
+    if published is not None:
+        published.append(name)
+
+
+def begin_request():
+    """Start tracking events for the current request; returns a token for end_request()"""
+    return _request_events.set([])
+
+
+def end_request(token):
+    """Stop tracking and return the names of events published during the request"""
+    published = _request_events.get() or []
+    _request_events.reset(token)
+    return published
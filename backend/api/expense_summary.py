@@ -0,0 +1,126 @@
+"""
+Project expense summaries shared by ProjectViewSet.expense_summary and
+ProjectExpenseViewSet.summary.
+
+Every status total and count comes from one conditional aggregate over the
+project's expenses, and the category breakdown from one grouped query, so a
+summary costs three queries (with the recent expenses) however many
+expenses the project has.
+
+category_tree() does the same for the expense category tree: one query for
+the categories and one aggregate grouped by category, rolled up to every
+ancestor along the materialized paths in Python.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+
+from .project_models import ProjectExpense, ProjectExpenseCategory
+
+STATUSES = ('pending', 'approved', 'paid', 'rejected')
+
+# Statuses counted as spent in category breakdowns, as in Project.total_expenses_amount
+SPENT_STATUSES = ('approved', 'paid')
+
+
+def currency_symbol(currency):
+    return next(
+        (symbol for code, name, symbol in getattr(settings, 'CURRENCY_CHOICES', []) if code == currency),
+        currency
+    )
+
+
+def expense_totals(expenses):
+    """
+    {'total_expenses', 'expenses_count', 'total_<status>', '<status>_count'}
+    for the expenses queryset, in a single aggregate query
+    """
+    aggregates = {
+        'total_expenses': Sum('total_amount'),
+        'expenses_count': Count('id'),
+    }
+    for status in STATUSES:
+        aggregates[f'total_{status}'] = Sum('total_amount', filter=Q(status=status))
+        aggregates[f'{status}_count'] = Count('id', filter=Q(status=status))
+
+    totals = expenses.order_by().aggregate(**aggregates)
+    for key, value in totals.items():
+        if value is None:
+            totals[key] = Decimal('0')
+    return totals
+
+
+def category_breakdown(expenses, statuses=SPENT_STATUSES):
+    """[{'category__name', 'total', 'count'}, ...] largest first"""
+    return list(
+        expenses.filter(status__in=statuses).order_by()
+        .values('category__name')
+        .annotate(total=Sum('total_amount'), count=Count('id'))
+        .order_by('-total')
+    )
+
+
+def recent_expenses(expenses, limit=10):
+    return expenses.select_related('category', 'created_by').order_by('-created_at')[:limit]
+
+
+def project_expense_summary(project, recent=10, top=5):
+    """Data for ProjectExpenseSummarySerializer"""
+    expenses = ProjectExpense.objects.filter(project=project)
+    categories = category_breakdown(expenses)
+    return {
+        'project_id': project.id,
+        'project_name': project.name,
+        **expense_totals(expenses),
+        'expenses_by_category': categories,
+        'top_categories': categories[:top],
+        'recent_expenses': recent_expenses(expenses, recent),
+        'currency': project.currency,
+        'currency_symbol': currency_symbol(project.currency),
+    }
+
+
+def category_tree(project=None):
+    """
+    {'children': {parent_id: [active categories by name]}, 'stats': {category_id: {...}}}
+    for ProjectExpenseCategorySerializer. Stats hold the category's own
+    total_expenses (approved/paid) and expenses_count (all statuses) plus
+    subtree_* figures that include every descendant, optionally for one project.
+    """
+    categories = list(ProjectExpenseCategory.objects.order_by('name'))
+
+    expenses = ProjectExpense.objects.all()
+    if project is not None:
+        expenses = expenses.filter(project=project)
+    own = {
+        row['category_id']: row
+        for row in expenses.order_by().values('category_id').annotate(
+            total=Sum('total_amount', filter=Q(status__in=SPENT_STATUSES)),
+            count=Count('id'),
+        )
+    }
+
+    stats = {}
+    for category in categories:
+        row = own.get(category.id, {})
+        total, count = row.get('total') or Decimal('0'), row.get('count', 0)
+        stats[category.id] = {
+            'total_expenses': total,
+            'expenses_count': count,
+            'subtree_total_expenses': total,
+            'subtree_expenses_count': count,
+        }
+    for category in categories:
+        for ancestor_id in category.ancestor_ids:
+            ancestor = stats.get(ancestor_id)
+            if ancestor is not None:
+                ancestor['subtree_total_expenses'] += stats[category.id]['total_expenses']
+                ancestor['subtree_expenses_count'] += stats[category.id]['expenses_count']
+
+    children = defaultdict(list)
+    for category in categories:
+        if category.is_active:
+            children[category.parent_category_id].append(category)
+    return {'children': dict(children), 'stats': stats}
@@ -3,13 +3,16 @@ Financial Models for BS Engineering System
 Advanced Project Expense and Financial Flow Tracking
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.utils import timezone
 from decimal import Decimal
+import json
 import os
 
+from .tracking import TrackedFieldsMixin
+
 User = get_user_model()
 
 
@@ -38,7 +41,30 @@ class FinancialAccount(models.Model):
         return f"{self.code} - {self.name}"
 
 
-class FinancialActivity(models.Model):
+class AccountBalance(models.Model):
+    """
+    Debit and credit totals of an account's journal lines for one month,
+    kept current by api.account_balances as lines are written. Balances and
+    trial balances sum these rows instead of the lines.
+    """
+    account = models.ForeignKey(FinancialAccount, on_delete=models.CASCADE, related_name='balances')
+    period = models.DateField(help_text="First day of the month")
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['account', 'period']
+        unique_together = ('account', 'period')
+        indexes = [
+            models.Index(fields=['period']),
+        ]
+    
+    def __str__(self):
+        return f"{self.account} {self.period:%Y-%m}: Dr {self.debit_total} / Cr {self.credit_total}"
+
+
+class FinancialActivity(TrackedFieldsMixin, models.Model):
     """Base model for all financial activities"""
     ACTIVITY_TYPES = (
         ('receivable', 'Receivable'),
@@ -229,14 +255,31 @@ class FinancialAttachment(models.Model):
         return f"{self.name} - {self.activity.reference_number}"
 
 
-class JournalEntry(models.Model):
+class JournalEntry(TrackedFieldsMixin, models.Model):
     """Double-entry journal entries for accounting compliance"""
+    SOURCE_TYPES = (
+        ('invoice', 'Invoice'),
+        ('financial_activity', 'Financial Activity'),
+        ('project_expense', 'Project Expense'),
+    )
+    
+    EVENTS = (
+        ('recognition', 'Recognition'),
+        ('settlement', 'Settlement'),
+    )
+    
     reference_number = models.CharField(max_length=50, unique=True)
     description = models.TextField()
     transaction_date = models.DateField()
     
-    # Relationships
-    financial_activity = models.ForeignKey(FinancialActivity, on_delete=models.CASCADE, related_name='journal_entries')
+    # Kept (unlinked) when the activity is deleted; its entries are reversed instead
+    financial_activity = models.ForeignKey(FinancialActivity, on_delete=models.SET_NULL, null=True, blank=True, related_name='journal_entries')
+    
+    # Document the entry was posted for (api.posting) and what it records
+    source_type = models.CharField(max_length=30, choices=SOURCE_TYPES, blank=True)
+    source_id = models.PositiveIntegerField(null=True, blank=True)
+    event = models.CharField(max_length=20, choices=EVENTS, blank=True)
+    reverses = models.OneToOneField('self', on_delete=models.CASCADE, null=True, blank=True, related_name='reversal')
     
     # Metadata
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -245,6 +288,9 @@ class JournalEntry(models.Model):
     class Meta:
         ordering = ['-transaction_date', '-created_at']
         verbose_name_plural = 'Journal Entries'
+        indexes = [
+            models.Index(fields=['source_type', 'source_id']),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.reference_number:
@@ -256,35 +302,56 @@ class JournalEntry(models.Model):
             self.reference_number = f"JE-{timestamp}-{unique_suffix}"
         super().save(*args, **kwargs)
     
+    def _line_totals(self):
+        """(debits, credits) - from prefetched lines if loaded, else one aggregate query"""
+        if 'lines' in getattr(self, '_prefetched_objects_cache', {}):
+            lines = self.lines.all()
+            return (
+                sum((line.debit_amount for line in lines), Decimal('0')),
+                sum((line.credit_amount for line in lines), Decimal('0')),
+            )
+        totals = self.lines.aggregate(debits=models.Sum('debit_amount'), credits=models.Sum('credit_amount'))
+        return totals['debits'] or Decimal('0'), totals['credits'] or Decimal('0')
+    
     @property
     def total_debits(self):
         """Calculate total debits"""
-        return sum(line.debit_amount for line in self.lines.all())
+        return self._line_totals()[0]
     
     @property
     def total_credits(self):
         """Calculate total credits"""
-        return sum(line.credit_amount for line in self.lines.all())
+        return self._line_totals()[1]
     
     @property
     def is_balanced(self):
         """Check if journal entry is balanced"""
-        return abs(self.total_debits - self.total_credits) < Decimal('0.01')
+        debits, credits = self._line_totals()
+        return abs(debits - credits) < Decimal('0.01')
     
     def __str__(self):
         return f"{self.reference_number} - {self.description[:50]}"
 
 
-class JournalEntryLine(models.Model):
+class JournalEntryLine(TrackedFieldsMixin, models.Model):
     """Individual lines in journal entries"""
     journal_entry = models.ForeignKey(JournalEntry, on_delete=models.CASCADE, related_name='lines')
     account = models.ForeignKey(FinancialAccount, on_delete=models.CASCADE)
     description = models.CharField(max_length=200)
     debit_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     credit_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    # Copy of journal_entry.transaction_date so an account's ledger is one index range scan
+    transaction_date = models.DateField(editable=False)
     
     class Meta:
         ordering = ['id']
+        indexes = [
+            models.Index(fields=['account', 'transaction_date', 'id']),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.transaction_date = self.journal_entry.transaction_date
+        super().save(*args, **kwargs)
     
     def __str__(self):
         if self.debit_amount > 0:
@@ -293,6 +360,27 @@ class JournalEntryLine(models.Model):
             return f"Cr. {self.account.name} - {self.credit_amount}"
 
 
+class PendingPosting(models.Model):
+    """
+    A document whose journal entries failed to sync after its transaction
+    committed (api.posting). `manage.py retry_postings` syncs it again; any
+    successful sync of the document removes the row.
+    """
+    source_type = models.CharField(max_length=30, choices=JournalEntry.SOURCE_TYPES)
+    source_id = models.PositiveIntegerField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        unique_together = ('source_type', 'source_id')
+
+    def __str__(self):
+        return f"{self.source_type} #{self.source_id} ({self.attempts} failed attempt(s))"
+
+
 class FinancialReport(models.Model):
     """Generated financial reports for caching and audit trail"""
     REPORT_TYPES = (
@@ -362,5 +450,64 @@ class FinancialAuditLog(models.Model):
         verbose_name = 'Financial Audit Log'
         verbose_name_plural = 'Financial Audit Logs'
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                FinancialAuditFieldChange.objects.bulk_create(FinancialAuditFieldChange.rows_for(self))
+
     def __str__(self):
         return f"{self.user.username} - {self.action} - {self.content_type} - {self.created_at}"
+
+
+class FinancialAuditFieldChange(models.Model):
+    """
+    One row per field in FinancialAuditLog.field_changes, written with the log
+    entry so field-level questions ("who changed the amount", "status changes
+    this month") use an index instead of scanning the JSON column.
+    """
+    audit_log = models.ForeignKey(FinancialAuditLog, on_delete=models.CASCADE, related_name='field_change_rows')
+    # Denormalized from the log entry so lookups never need the join
+    content_type = models.CharField(max_length=50)
+    object_id = models.IntegerField()
+    field_name = models.CharField(max_length=100)
+    old_value = models.TextField(null=True, blank=True)
+    new_value = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('audit_log', 'field_name')
+        indexes = [
+            models.Index(fields=['field_name', 'created_at']),
+            models.Index(fields=['content_type', 'object_id', 'field_name']),
+        ]
+
+    @staticmethod
+    def _as_text(value):
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value, sort_keys=True, default=str)
+
+    @classmethod
+    def rows_for(cls, audit_log):
+        """Unsaved rows for the {"field": {"old": ..., "new": ...}} entries of a log"""
+        changes = audit_log.field_changes
+        if not isinstance(changes, dict):
+            return []
+        return [
+            cls(
+                audit_log=audit_log,
+                content_type=audit_log.content_type,
+                object_id=audit_log.object_id,
+                field_name=field_name[:100],
+                old_value=cls._as_text(change.get('old')),
+                new_value=cls._as_text(change.get('new')),
+                created_at=audit_log.created_at,
+            )
+            for field_name, change in changes.items()
+            if isinstance(change, dict) and ('old' in change or 'new' in change)
+        ]
+
+    def __str__(self):
+        return f"{self.content_type} #{self.object_id} {self.field_name}: {self.old_value} -> {self.new_value}"
@@ -2,6 +2,8 @@
 Financial Serializers for BS Engineering System
 """
 
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .financial_models import (
@@ -19,24 +21,40 @@ User = get_user_model()
 
 
 class FinancialAccountSerializer(serializers.ModelSerializer):
+    """
+    Children and balances come from context['account_tree']
+    (api.chart_of_accounts.account_tree), loaded once per serialization.
+    """
     children = serializers.SerializerMethodField()
     balance = serializers.SerializerMethodField()
+    rolled_up_balance = serializers.SerializerMethodField()
     
     class Meta:
         model = FinancialAccount
         fields = '__all__'
         read_only_fields = ('created_at',)
     
+    def _tree(self):
+        tree = self.context.get('account_tree')
+        if tree is None:
+            from .chart_of_accounts import account_tree
+            tree = self.context['account_tree'] = account_tree()
+        return tree
+    
     def get_children(self, obj):
         """Get child accounts"""
-        children = obj.children.filter(is_active=True)
-        return FinancialAccountSerializer(children, many=True).data
+        children = self._tree()['children'].get(obj.id, [])
+        return FinancialAccountSerializer(children, many=True, context=self.context).data
     
     def get_balance(self, obj):
-        """Calculate account balance"""
-        # This would typically involve complex calculations
-        # For now, return a placeholder
-        return 0.0
+        """Balance of the account's own journal lines, on its normal side"""
+        balances = self._tree()['balances'].get(obj.id)
+        return balances['balance'] if balances else Decimal('0')
+    
+    def get_rolled_up_balance(self, obj):
+        """Own balance plus the balances of all descendant accounts"""
+        balances = self._tree()['balances'].get(obj.id)
+        return balances['rolled_up_balance'] if balances else Decimal('0')
 
 
 class FinancialAttachmentSerializer(serializers.ModelSerializer):
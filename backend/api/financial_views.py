@@ -6,6 +6,7 @@ Advanced Project Expense and Financial Flow Tracking
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from django.db.models import Q, Sum, Count, Avg
 from django.utils import timezone
 from django.http import HttpResponse
@@ -32,6 +33,7 @@ from .financial_models import (
     JournalEntryLine,
     FinancialReport,
     FinancialAuditLog,
+    FinancialAuditFieldChange,
 )
 from .financial_serializers import (
     FinancialAccountSerializer,
@@ -46,32 +48,13 @@ from .financial_serializers import (
     DashboardInsightsSerializer,
 )
 from .permissions import RoleBasedPermission
+from .events import publish
+from .transitions import bulk_transition_response
+from .chart_of_accounts import account_tree
+from . import ledger
 from .models import Client, Quotation, Invoice
 from .serializers import QuotationSerializer
 
-def ensure_default_accounts():
-    """Create basic financial accounts if none exist"""
-    if FinancialAccount.objects.exists():
-        return
-    
-    # Create minimal required accounts
-    accounts_data = [
-        {'code': '1000', 'name': 'Cash', 'type': 'asset'},
-        {'code': '1200', 'name': 'Accounts Receivable', 'type': 'asset'},
-        {'code': '2000', 'name': 'Accounts Payable', 'type': 'liability'},
-        {'code': '4000', 'name': 'Revenue', 'type': 'revenue'},
-        {'code': '5000', 'name': 'Expenses', 'type': 'expense'},
-    ]
-    
-    for account_data in accounts_data:
-        FinancialAccount.objects.create(
-            code=account_data['code'],
-            name=account_data['name'],
-            account_type=account_data['type'],
-            description=f"Default {account_data['name']} account"
-        )
-
-
 class FinancialAccountViewSet(viewsets.ModelViewSet):
     """ViewSet for managing financial accounts (Chart of Accounts)"""
     queryset = FinancialAccount.objects.all()
@@ -79,9 +62,6 @@ class FinancialAccountViewSet(viewsets.ModelViewSet):
     permission_classes = [RoleBasedPermission]
     
     def get_queryset(self):
-        # Ensure default accounts exist
-        ensure_default_accounts()
-        
         queryset = super().get_queryset()
         
         # Filter by account type
@@ -102,9 +82,11 @@ class FinancialAccountViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def hierarchy(self, request):
-        """Get account hierarchy"""
-        accounts = FinancialAccount.objects.filter(parent__isnull=True, is_active=True)
-        serializer = self.get_serializer(accounts, many=True)
+        """Get account hierarchy with own and rolled-up balances"""
+        tree = account_tree(include_inactive=request.query_params.get('include_inactive') == 'true')
+        serializer = self.get_serializer(
+            tree['children'].get(None, []), many=True, context={**self.get_serializer_context(), 'account_tree': tree}
+        )
         return Response(serializer.data)
 
 
@@ -122,9 +104,6 @@ class FinancialActivityViewSet(viewsets.ModelViewSet):
         return FinancialActivitySerializer
     
     def get_queryset(self):
-        # Ensure default accounts exist
-        ensure_default_accounts()
-        
         queryset = super().get_queryset()
         
         # Filter by activity type
@@ -173,48 +152,31 @@ class FinancialActivityViewSet(viewsets.ModelViewSet):
             )
         
         # Log the creation action
-        self._log_action('create', activity, serializer.data)
+        self._log_action('created', activity, serializer.data)
 
     def perform_update(self, serializer):
         """Update activity and log changes"""
-        instance = self.get_object()
-        
-        # Capture old data for logging
-        old_data = FinancialActivitySerializer(instance).data
-        
         updated_instance = serializer.save()
-        
-        # Capture new data
-        new_data = FinancialActivitySerializer(updated_instance).data
-        
-        # Compare and log changes
-        changes = {}
-        for key, value in old_data.items():
-            if new_data.get(key) != value:
-                changes[key] = {
-                    'old': value,
-                    'new': new_data.get(key)
-                }
-        
+
+        # Field diff captured by TrackedFieldsMixin from the loaded instance
+        changes = updated_instance.saved_changes
         if changes:
-            self._log_action('update', updated_instance, changes)
+            self._log_action('updated', updated_instance, changes)
 
     def perform_destroy(self, instance):
         """Delete activity and log action"""
-        self._log_action('delete', instance)
+        self._log_action('deleted', instance)
         instance.delete()
 
-    def _log_action(self, action, instance, changes=None):
-        """Helper to create audit log entries"""
-        FinancialAuditLog.objects.create(
+    def _log_action(self, verb, instance, changes=None):
+        """Publish a financial activity event; the audit subscriber writes the FinancialAuditLog row"""
+        publish(
+            f'financial_activity.{verb}',
             user=self.request.user,
-            action=action,
-            content_type=f'financial_activity',
-            object_id=instance.pk,
-            object_representation=str(instance),
-            field_changes=changes,
-            description=f"User {self.request.user.username} {action}d financial activity {instance.reference_number}.",
-            ip_address=self.request.META.get('REMOTE_ADDR')
+            instance=instance,
+            changes=changes,
+            description=f"User {self.request.user.username} {verb} financial activity {instance.reference_number}.",
+            request=self.request,
         )
 
     @action(detail=True, methods=['post'], permission_classes=[RoleBasedPermission])
@@ -239,16 +201,13 @@ class FinancialActivityViewSet(viewsets.ModelViewSet):
         activity.approved_at = timezone.now()
         activity.save()
         
-        # Create audit log
-        FinancialAuditLog.objects.create(
+        publish(
+            'financial_activity.approved',
             user=request.user,
-            action='approve',
-            content_type='financial_activity',
-            object_id=activity.id,
-            object_representation=str(activity),
+            instance=activity,
+            changes=activity.saved_changes,
             description=f"Approved financial activity: {activity.reference_number}",
-            ip_address=self.get_client_ip(),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+            request=request,
         )
         
         serializer = self.get_serializer(activity)
@@ -282,16 +241,13 @@ class FinancialActivityViewSet(viewsets.ModelViewSet):
         activity.rejection_reason = reason
         activity.save()
         
-        # Create audit log
-        FinancialAuditLog.objects.create(
+        publish(
+            'financial_activity.rejected',
             user=request.user,
-            action='reject',
-            content_type='financial_activity',
-            object_id=activity.id,
-            object_representation=str(activity),
+            instance=activity,
+            changes=activity.saved_changes,
             description=f"Rejected financial activity: {activity.reference_number}. Reason: {reason}",
-            ip_address=self.get_client_ip(),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+            request=request,
         )
         
         serializer = self.get_serializer(activity)
@@ -318,21 +274,28 @@ class FinancialActivityViewSet(viewsets.ModelViewSet):
         activity.paid_date = timezone.now().date()
         activity.save()
         
-        # Create audit log
-        FinancialAuditLog.objects.create(
+        publish(
+            'financial_activity.paid',
             user=request.user,
-            action='pay',
-            content_type='financial_activity',
-            object_id=activity.id,
-            object_representation=str(activity),
+            instance=activity,
+            changes=activity.saved_changes,
             description=f"Marked financial activity as paid: {activity.reference_number}",
-            ip_address=self.get_client_ip(),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+            request=request,
         )
         
         serializer = self.get_serializer(activity)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Approve, reject or mark paid many activities in one UPDATE (see api.transitions)"""
+        if request.user.role not in ['admin', 'accountant']:
+            return Response(
+                {'error': 'Only admin and accountant can approve, reject or pay activities'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return bulk_transition_response(request, 'financial_activity')
+    
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Get financial activities summary"""
@@ -364,15 +327,6 @@ class FinancialActivityViewSet(viewsets.ModelViewSet):
             }
         
         return Response(summary)
-    
-    def get_client_ip(self):
-        """Get client IP address"""
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
 
 
 class FinancialAttachmentViewSet(viewsets.ModelViewSet):
@@ -385,26 +339,13 @@ class FinancialAttachmentViewSet(viewsets.ModelViewSet):
         """Create attachment with audit trail"""
         attachment = serializer.save(uploaded_by=self.request.user)
         
-        # Create audit log
-        FinancialAuditLog.objects.create(
+        publish(
+            'financial_attachment.created',
             user=self.request.user,
-            action='create',
-            content_type='financial_attachment',
-            object_id=attachment.id,
-            object_representation=str(attachment),
+            instance=attachment,
             description=f"Uploaded attachment: {attachment.name} for activity {attachment.activity.reference_number}",
-            ip_address=self.get_client_ip(),
-            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+            request=self.request,
         )
-    
-    def get_client_ip(self):
-        """Get client IP address"""
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
 
 
 class FinancialAuditLogViewSet(viewsets.ReadOnlyModelViewSet):
@@ -442,7 +383,31 @@ class FinancialAuditLogViewSet(viewsets.ReadOnlyModelViewSet):
         content_type = self.request.query_params.get('content_type')
         if content_type:
             queryset = queryset.filter(content_type=content_type)
-        
+
+        # Filter by object
+        object_id = self.request.query_params.get('object_id')
+        if object_id:
+            queryset = queryset.filter(object_id=object_id)
+
+        # Filter by changed field (optionally by its old/new value) using the
+        # indexed FinancialAuditFieldChange rows instead of the JSON column
+        field = self.request.query_params.get('field')
+        if field:
+            changes = FinancialAuditFieldChange.objects.filter(field_name=field)
+            if content_type:
+                changes = changes.filter(content_type=content_type)
+            if object_id:
+                changes = changes.filter(object_id=object_id)
+            if date_from:
+                changes = changes.filter(created_at__gte=date_from)
+            if date_to:
+                changes = changes.filter(created_at__lte=date_to)
+            for param in ('old', 'new'):
+                value = self.request.query_params.get(param)
+                if value is not None:
+                    changes = changes.filter(**{f'{param}_value': value})
+            queryset = queryset.filter(id__in=changes.values('audit_log_id'))
+
         return queryset
 
 
@@ -962,6 +927,84 @@ def get_approved_quotations(request):
     return Response(serializer.data)
 
 
+def _query_date(request, name):
+    value = request.query_params.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def account_ledger(request, account_id):
+    """
+    General ledger of one account with running balances.
+    ?start=&end= (YYYY-MM-DD) bound the dates, ?limit= the page size; follow
+    `next` for the following page.
+    """
+    if request.user.role not in ['admin', 'accountant']:
+        return Response(
+            {'error': 'Only admin and accountant can view the ledger'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    try:
+        account = FinancialAccount.objects.get(pk=account_id)
+    except FinancialAccount.DoesNotExist:
+        return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        start = _query_date(request, 'start')
+        end = _query_date(request, 'end')
+    except ValueError:
+        return Response(
+            {'error': 'Invalid date format. Use YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = int(request.query_params.get('limit', ledger.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        page = ledger.account_ledger(
+            account, start=start, end=end, cursor=request.query_params.get('cursor'), limit=limit
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    next_cursor = page.pop('next_cursor')
+    return Response({
+        'account': {
+            'id': account.id,
+            'code': account.code,
+            'name': account.name,
+            'account_type': account.account_type,
+        },
+        'next': replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor) if next_cursor else None,
+        **page,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def trial_balance(request):
+    """Trial balance as of ?as_of= (YYYY-MM-DD, default today)"""
+    if request.user.role not in ['admin', 'accountant']:
+        return Response(
+            {'error': 'Only admin and accountant can view the trial balance'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    try:
+        as_of = _query_date(request, 'as_of') or timezone.localdate()
+    except ValueError:
+        return Response(
+            {'error': 'Invalid date format. Use YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(ledger.trial_balance(as_of))
+
+
 class FinancialReportViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing and generating financial reports"""
     queryset = FinancialReport.objects.all()
@@ -0,0 +1,174 @@
+"""
+General ledger and trial balance queries.
+
+Both start from AccountBalance: an account's totals before a date are its
+monthly rows for earlier months plus its lines from the first of that month
+up to the date, so the cost is bounded by one month of lines however many
+years of history precede it.
+
+account_ledger() pages an account's lines in (transaction_date, id) order,
+with the running balance from a ``SUM() OVER (ORDER BY transaction_date, id)``
+window over the page's rows. The balance before the page travels in the
+cursor, so every page is an index range scan on (account, transaction_date,
+id) - no OFFSET and no re-summing of earlier pages.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import F, Q, Sum, Window
+from django.db.models.expressions import RowRange
+
+from .account_balances import period_of
+from .chart_of_accounts import signed_balance
+from .financial_models import AccountBalance, FinancialAccount, JournalEntryLine
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+CURSOR_SALT = 'api.ledger'
+
+
+def account_totals(before, account_ids=None):
+    """{account_id: [debits, credits]} of the journal lines dated before `before`"""
+    period = period_of(before)
+    balances = AccountBalance.objects.filter(period__lt=period)
+    lines = JournalEntryLine.objects.filter(transaction_date__gte=period, transaction_date__lt=before)
+    if account_ids is not None:
+        balances = balances.filter(account_id__in=account_ids)
+        lines = lines.filter(account_id__in=account_ids)
+
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for account_id, debit, credit in balances.order_by().values('account_id').annotate(
+        debit=Sum('debit_total'), credit=Sum('credit_total')
+    ).values_list('account_id', 'debit', 'credit'):
+        totals[account_id][0] += debit or 0
+        totals[account_id][1] += credit or 0
+    for account_id, debit, credit in lines.order_by().values('account_id').annotate(
+        debit=Sum('debit_amount'), credit=Sum('credit_amount')
+    ).values_list('account_id', 'debit', 'credit'):
+        totals[account_id][0] += debit or 0
+        totals[account_id][1] += credit or 0
+    return dict(totals)
+
+
+def _encode_cursor(account, line_date, line_id, net):
+    return signing.dumps(
+        {'account': account.id, 'date': line_date.isoformat(), 'id': line_id, 'net': str(net)},
+        salt=CURSOR_SALT,
+    )
+
+
+def _decode_cursor(account, cursor):
+    try:
+        position = signing.loads(cursor, salt=CURSOR_SALT)
+        if position['account'] != account.id:
+            raise ValueError
+        return datetime.date.fromisoformat(position['date']), position['id'], Decimal(position['net'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def account_ledger(account, start=None, end=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of the account's ledger: {'opening_balance', 'closing_balance',
+    'results', 'next_cursor'}. Balances are on the account's normal side and
+    include all history before `start`. Raises ValueError for a bad cursor.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    lines = JournalEntryLine.objects.filter(account=account)
+    if start:
+        lines = lines.filter(transaction_date__gte=start)
+    if end:
+        lines = lines.filter(transaction_date__lte=end)
+
+    if cursor:
+        after_date, after_id, opening_net = _decode_cursor(account, cursor)
+        lines = lines.filter(Q(transaction_date__gt=after_date) | Q(transaction_date=after_date, id__gt=after_id))
+    elif start:
+        debit, credit = account_totals(start, [account.id]).get(account.id, (0, 0))
+        opening_net = Decimal(debit) - Decimal(credit)
+    else:
+        opening_net = Decimal('0')
+
+    rows = list(
+        lines.annotate(
+            running_net=Window(
+                Sum(F('debit_amount') - F('credit_amount')),
+                order_by=[F('transaction_date').asc(), F('id').asc()],
+                frame=RowRange(start=None, end=0),
+            )
+        )
+        .order_by('transaction_date', 'id')
+        .values(
+            'id', 'transaction_date', 'description', 'debit_amount', 'credit_amount', 'running_net',
+            'journal_entry_id', 'journal_entry__reference_number', 'journal_entry__source_type',
+            'journal_entry__source_id', 'journal_entry__event',
+        )[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results, net = [], opening_net
+    for row in rows:
+        net = opening_net + row['running_net']
+        results.append({
+            'id': row['id'],
+            'date': row['transaction_date'],
+            'journal_entry': row['journal_entry_id'],
+            'reference_number': row['journal_entry__reference_number'],
+            'description': row['description'],
+            'source_type': row['journal_entry__source_type'],
+            'source_id': row['journal_entry__source_id'],
+            'event': row['journal_entry__event'],
+            'debit': row['debit_amount'],
+            'credit': row['credit_amount'],
+            'balance': signed_balance(account.account_type, net, 0),
+        })
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = _encode_cursor(account, last['transaction_date'], last['id'], net)
+    return {
+        'opening_balance': signed_balance(account.account_type, opening_net, 0),
+        'closing_balance': signed_balance(account.account_type, net, 0),
+        'results': results,
+        'next_cursor': next_cursor,
+    }
+
+
+def trial_balance(as_of):
+    """
+    Net debit or credit of every account with lines dated on or before
+    `as_of`, by code, with the column totals.
+    """
+    totals = account_totals(as_of + datetime.timedelta(days=1))
+    rows = []
+    total_debit = total_credit = Decimal('0')
+    for account in FinancialAccount.objects.filter(id__in=totals.keys()).order_by('code'):
+        debits, credits = totals[account.id]
+        if not debits and not credits:
+            continue
+        net = debits - credits
+        rows.append({
+            'account_id': account.id,
+            'code': account.code,
+            'name': account.name,
+            'account_type': account.account_type,
+            'total_debits': debits,
+            'total_credits': credits,
+            'debit': net if net > 0 else Decimal('0'),
+            'credit': -net if net < 0 else Decimal('0'),
+            'balance': signed_balance(account.account_type, debits, credits),
+        })
+        total_debit += max(net, Decimal('0'))
+        total_credit += max(-net, Decimal('0'))
+    return {
+        'as_of': as_of,
+        'accounts': rows,
+        'total_debit': total_debit,
+        'total_credit': total_credit,
+        'is_balanced': total_debit == total_credit,
+    }
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.activity_archive import archive_activity_logs, archive_dir, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move activity log rows older than the retention window to gzipped monthly JSONL archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=None,
+            help='Keep this many whole months in the table (defaults to ACTIVITY_LOG_RETENTION_MONTHS)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Rows read, written and deleted per batch',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be archived without writing or deleting anything',
+        )
+
+    def handle(self, *args, **options):
+        months = options['months']
+        if months is None:
+            months = getattr(settings, 'ACTIVITY_LOG_RETENTION_MONTHS', 12)
+        if months < 1:
+            raise CommandError('--months must be at least 1')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        cutoff = retention_cutoff(months)
+        self.stdout.write(f'Archiving activity logs created before {cutoff:%Y-%m-%d} to {archive_dir()}')
+
+        archived = archive_activity_logs(cutoff, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        for (year, month), count in sorted(archived.items()):
+            self.stdout.write(f'  {year:04d}-{month:02d}: {count} row(s)')
+
+        total = sum(archived.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run complete - {total} row(s) would be archived'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Archived {total} activity log row(s)'))
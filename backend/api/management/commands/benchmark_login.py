@@ -0,0 +1,96 @@
+"""
+Login throughput benchmark.
+
+Drives the real login view (throttling disabled) from one or more threads
+and reports logins/s and latency percentiles. --compare also times the old
+flow, which verified the password a second time after issuing tokens.
+Finally it counts the queries JWT authentication costs per API request
+with and without the role/name claims.
+
+    python manage.py benchmark_login --requests 20 --workers 4 --compare
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.authentication import ClaimsJWTAuthentication
+from api.models import User
+from api.views import CustomTokenObtainPairView
+from api.management.commands.loadtest_create import percentile
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput and per-request authentication queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Logins per run')
+        parser.add_argument('--workers', type=int, default=1, help='Concurrent login threads')
+        parser.add_argument('--username', help='Existing user to log in as (a temporary user is created otherwise)')
+        parser.add_argument('--password', help='Password for --username')
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Also time the previous flow that checked the password twice per login',
+        )
+
+    def handle(self, *args, **options):
+        if options['username']:
+            if not options['password']:
+                raise CommandError('--password is required with --username')
+            username, password, temp_user = options['username'], options['password'], None
+        else:
+            username, password = f'benchmark-{uuid.uuid4().hex[:8]}', uuid.uuid4().hex
+            temp_user = User.objects.create_user(username=username, password=password, role='viewer')
+
+        try:
+            view = CustomTokenObtainPairView.as_view(throttle_classes=[])
+            factory = APIRequestFactory()
+            credentials = {'username': username, 'password': password}
+
+            def login(double_check):
+                close_old_connections()
+                started = time.perf_counter()
+                response = view(factory.post('/api/auth/login/', credentials, format='json'))
+                if double_check:
+                    authenticate(**credentials)
+                elapsed = time.perf_counter() - started
+                connection.close()
+                if response.status_code != 200:
+                    raise CommandError(f'Login failed with status {response.status_code}: {response.data}')
+                return elapsed, response.data
+
+            runs = [('single verification', False)]
+            if options['compare']:
+                runs.append(('double verification (previous)', True))
+
+            access = None
+            for label, double_check in runs:
+                workers = max(1, options['workers'])
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(lambda _: login(double_check), range(max(1, options['requests']))))
+                elapsed = time.perf_counter() - started
+                latencies = [latency for latency, _ in results]
+                access = access or results[0][1]['access']
+                self.stdout.write(
+                    f'{label}: {len(results) / elapsed:.2f} logins/s, '
+                    f'p50 {percentile(latencies, 50) * 1000:.0f} ms, p95 {percentile(latencies, 95) * 1000:.0f} ms'
+                )
+
+            request = factory.get('/api/clients/', HTTP_AUTHORIZATION=f'Bearer {access}')
+            for label, backend in (('claims', ClaimsJWTAuthentication()), ('user lookup', JWTAuthentication())):
+                with CaptureQueriesContext(connection) as ctx:
+                    user, _ = backend.authenticate(request)
+                    user.role
+                self.stdout.write(f'Authentication queries per request ({label}): {len(ctx.captured_queries)}')
+        finally:
+            if temp_user:
+                temp_user.delete()
+
+        self.stdout.write(self.style.SUCCESS('Login benchmark complete'))
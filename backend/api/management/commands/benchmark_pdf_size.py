@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import Quotation, Invoice
+from api.utils import generate_pdf
+
+
+class Command(BaseCommand):
+    help = 'Compare PDF size and render time of the legacy and optimized PDF output'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            choices=['quotation', 'invoice', 'all'],
+            default='all',
+            help='Document type to sample',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Number of most recent documents to render per type',
+        )
+
+    def handle(self, *args, **options):
+        doc_types = ['quotation', 'invoice'] if options['type'] == 'all' else [options['type']]
+        models = {'quotation': Quotation, 'invoice': Invoice}
+
+        totals = {'legacy': 0, 'optimized': 0, 'legacy_time': 0.0, 'optimized_time': 0.0, 'count': 0}
+
+        for doc_type in doc_types:
+            documents = (
+                models[doc_type].objects.select_related('client')
+                .prefetch_related('items__service')
+                .order_by('-created_at')[:options['limit']]
+            )
+            for instance in documents:
+                sizes = {}
+                for mode, optimize in (('legacy', False), ('optimized', True)):
+                    started = time.perf_counter()
+                    sizes[mode] = len(generate_pdf(doc_type, instance, optimize_assets=optimize))
+                    totals[f'{mode}_time'] += time.perf_counter() - started
+                    totals[mode] += sizes[mode]
+                totals['count'] += 1
+
+                self.stdout.write(
+                    f"{doc_type} {instance.number}: {sizes['legacy'] / 1024:.1f} KB -> "
+                    f"{sizes['optimized'] / 1024:.1f} KB ({self._reduction(sizes['legacy'], sizes['optimized'])})"
+                )
+
+        if not totals['count']:
+            self.stdout.write(self.style.WARNING('No documents found to benchmark'))
+            return
+
+        count = totals['count']
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} document(s): average {totals['legacy'] / count / 1024:.1f} KB -> "
+                f"{totals['optimized'] / count / 1024:.1f} KB "
+                f"({self._reduction(totals['legacy'], totals['optimized'])}), "
+                f"render {totals['legacy_time'] / count * 1000:.0f} ms -> "
+                f"{totals['optimized_time'] / count * 1000:.0f} ms"
+            )
+        )
+
+    def _reduction(self, before, after):
+        if not before:
+            return 'n/a'
+        return f'{(1 - after / before) * 100:.1f}% smaller'
@@ -1,75 +1,57 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from api.models import NumberSequence, Quotation, Invoice
-import re
+from api.project_models import Project, ProjectExpense
+from api.numbering import get_config, parse_number, period_key, reset_process_state
 from collections import defaultdict
 
 class Command(BaseCommand):
-    help = 'Initialize number sequences for existing quotations and invoices'
+    help = 'Initialize number sequences for existing quotations, invoices, projects and project expenses'
 
     def handle(self, *args, **options):
         self.stdout.write('Initializing number sequences...')
-        
+
+        # (document_type, (date, number[, scope]) rows, index of the scope column)
+        sources = [
+            ('quotation', Quotation.objects.values_list('date', 'number').order_by('date', 'id'), None),
+            ('invoice', Invoice.objects.values_list('date', 'number').order_by('date', 'id'), None),
+            ('project', Project.objects.values_list('start_date', 'project_number').order_by('start_date', 'id'), None),
+            ('project_expense', ProjectExpense.objects.values_list('expense_date', 'expense_number', 'project_id').order_by('expense_date', 'id'), 2),
+        ]
+
         with transaction.atomic():
             # Clear existing sequences
             NumberSequence.objects.all().delete()
-            
-            # Initialize sequences for quotations
-            quotation_sequences = defaultdict(int)
-            quotations = Quotation.objects.all().order_by('date', 'id')
-            
-            for quotation in quotations:
-                year = quotation.date.year
-                month = quotation.date.month
-                key = f"{year}-{month:02d}"
-                
-                # Extract number from existing quotation number if possible
-                match = re.search(r'QTN-(\d{6})-(\d+)', quotation.number)
-                if match:
-                    existing_number = int(match.group(2))
-                    quotation_sequences[key] = max(quotation_sequences[key], existing_number)
-                else:
-                    quotation_sequences[key] += 1
-            
-            # Create NumberSequence records for quotations
-            for key, last_number in quotation_sequences.items():
-                year, month = key.split('-')
-                NumberSequence.objects.create(
-                    document_type='quotation',
-                    year=int(year),
-                    month=int(month),
-                    last_number=last_number
-                )
-                self.stdout.write(f'Created quotation sequence: {key} -> {last_number}')
-            
-            # Initialize sequences for invoices
-            invoice_sequences = defaultdict(int)
-            invoices = Invoice.objects.all().order_by('date', 'id')
-            
-            for invoice in invoices:
-                year = invoice.date.year
-                month = invoice.date.month
-                key = f"{year}-{month:02d}"
-                
-                # Extract number from existing invoice number if possible
-                match = re.search(r'INV-(\d{6})-(\d+)', invoice.number)
-                if match:
-                    existing_number = int(match.group(2))
-                    invoice_sequences[key] = max(invoice_sequences[key], existing_number)
-                else:
-                    invoice_sequences[key] += 1
-            
-            # Create NumberSequence records for invoices
-            for key, last_number in invoice_sequences.items():
-                year, month = key.split('-')
-                NumberSequence.objects.create(
-                    document_type='invoice',
-                    year=int(year),
-                    month=int(month),
-                    last_number=last_number
-                )
-                self.stdout.write(f'Created invoice sequence: {key} -> {last_number}')
-        
+
+            sequences = defaultdict(int)
+            for document_type, rows, scope_index in sources:
+                config = get_config(document_type)
+                for row in rows:
+                    date, number = row[0], row[1]
+                    scope = str(row[scope_index]) if scope_index is not None else ''
+
+                    # Extract number from existing document number if possible
+                    parsed = parse_number(document_type, number)
+                    if parsed:
+                        year, month, existing_number = parsed
+                        key = (document_type, scope, year, month)
+                        sequences[key] = max(sequences[key], existing_number)
+                    else:
+                        year, month = period_key(config, date)
+                        sequences[(document_type, scope, year, month)] += 1
+
+            NumberSequence.objects.bulk_create([
+                NumberSequence(document_type=document_type, scope=scope, year=year, month=month, last_number=last_number)
+                for (document_type, scope, year, month), last_number in sorted(sequences.items())
+            ])
+            for (document_type, scope, year, month), last_number in sorted(sequences.items()):
+                label = f'{year}-{month:02d}' if month else str(year)
+                if scope:
+                    label = f'{scope}/{label}'
+                self.stdout.write(f'Created {document_type} sequence: {label} -> {last_number}')
+
+        reset_process_state()
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully initialized {NumberSequence.objects.count()} number sequences'
@@ -0,0 +1,312 @@
+"""
+Concurrent document-creation load test.
+
+Spawns worker threads or processes that create quotations, invoices,
+projects, project expenses and financial activities at the same time, to
+surface numbering collisions and lock waits that never show up with a
+single user. Everything is created by a dedicated 'loadtest' user so
+--cleanup can remove it afterwards.
+
+    python manage.py loadtest_create --workers 8 --per-worker 25
+    python manage.py loadtest_create --mode processes --types quotation,project
+    python manage.py loadtest_create --cleanup
+"""
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, DatabaseError, close_old_connections, connection, connections, transaction
+from django.utils import timezone
+
+from api import numbering
+from api.models import User, Client, Service, Quotation, QuotationItem, Invoice, InvoiceItem, FinancialAccount, FinancialActivity
+from api.project_models import Project, ProjectExpense, ProjectExpenseCategory
+
+LOADTEST_USERNAME = 'loadtest'
+LOADTEST_CLIENT = 'Load Test Client'
+LOADTEST_ACCOUNT = ('5999', 'Load Test Expenses')
+DOCUMENT_TYPES = ('quotation', 'invoice', 'project', 'expense', 'activity')
+
+# Document type -> (numbering type, number attribute) for fallback detection
+NUMBERED = {
+    'quotation': ('quotation', 'number'),
+    'invoice': ('invoice', 'number'),
+    'project': ('project', 'project_number'),
+    'expense': ('project_expense', 'expense_number'),
+}
+
+NUMBERED_MODELS = {
+    'quotation': Quotation,
+    'invoice': Invoice,
+    'project': Project,
+    'expense': ProjectExpense,
+}
+
+
+def _fixtures():
+    user, _ = User.objects.get_or_create(
+        username=LOADTEST_USERNAME,
+        defaults={'role': 'admin', 'email': 'loadtest@example.com', 'is_active': False},
+    )
+    client, _ = Client.objects.get_or_create(
+        name=LOADTEST_CLIENT,
+        defaults={'email': 'loadtest@example.com', 'phone': '0', 'address': 'Load test'},
+    )
+    service = Service.objects.filter(name='Load Test Service').first() or Service.objects.create(
+        name='Load Test Service', description='Load test', price=Decimal('100.00')
+    )
+    project = Project.objects.filter(client=client, created_by=user).order_by('id').first() or Project.objects.create(
+        name='Load Test Project', client=client, start_date=timezone.now().date(),
+        project_manager=user, created_by=user,
+    )
+    category = ProjectExpenseCategory.objects.filter(name='Load Test').first() or ProjectExpenseCategory.objects.create(
+        name='Load Test', description='Load test'
+    )
+    code, name = LOADTEST_ACCOUNT
+    account = FinancialAccount.objects.filter(account_type='expense').first() or FinancialAccount.objects.create(
+        code=code, name=name, account_type='expense'
+    )
+    return {
+        'user_id': user.id, 'client_id': client.id, 'service_id': service.id,
+        'project_id': project.id, 'category_id': category.id, 'account_id': account.id,
+    }
+
+
+def is_duplicate_number(doc_type, error):
+    """
+    Whether an IntegrityError is a collision on the document number's unique
+    constraint, rather than e.g. a foreign key or NOT NULL failure
+    """
+    if doc_type not in NUMBERED:
+        return False
+    column = NUMBERED_MODELS[doc_type]._meta.get_field(NUMBERED[doc_type][1]).column
+    # Postgres names the violated constraint; SQLite and MySQL only say it in the message
+    constraint = getattr(getattr(error.__cause__, 'diag', None), 'constraint_name', None)
+    if constraint:
+        return column in constraint
+    message = str(error).lower()
+    return ('unique' in message or 'duplicate' in message) and column in message
+
+
+def _create(doc_type, fx, today):
+    if doc_type == 'quotation':
+        obj = Quotation.objects.create(client_id=fx['client_id'], created_by_id=fx['user_id'], date=today)
+        QuotationItem.objects.create(quotation=obj, service_id=fx['service_id'], quantity=1, price=Decimal('100.00'))
+    elif doc_type == 'invoice':
+        obj = Invoice.objects.create(
+            client_id=fx['client_id'], created_by_id=fx['user_id'], date=today, due_date=today
+        )
+        InvoiceItem.objects.create(invoice=obj, service_id=fx['service_id'], quantity=1, price=Decimal('100.00'))
+    elif doc_type == 'project':
+        obj = Project.objects.create(
+            name='Load Test Project', client_id=fx['client_id'], start_date=today,
+            project_manager_id=fx['user_id'], created_by_id=fx['user_id'],
+        )
+    elif doc_type == 'expense':
+        project = Project.objects.only('id', 'project_number').get(id=fx['project_id'])
+        obj = ProjectExpense.objects.create(
+            project=project, category_id=fx['category_id'], description='Load test expense',
+            amount=Decimal('10.00'), expense_date=today, created_by_id=fx['user_id'],
+        )
+    else:
+        obj = FinancialActivity.objects.create(
+            activity_type='expense', amount=Decimal('10.00'), client_id=fx['client_id'],
+            account_id=fx['account_id'], description='Load test activity',
+            transaction_date=today, created_by_id=fx['user_id'],
+        )
+    return obj
+
+
+def run_worker(worker_id, doc_types, per_worker, fx):
+    """Create per_worker documents, cycling through doc_types. Returns raw measurements."""
+    close_old_connections()
+    today = timezone.now().date()
+    result = {
+        'latencies': defaultdict(list),
+        'duplicates': defaultdict(int),
+        'errors': defaultdict(int),
+        'fallbacks': defaultdict(int),
+        'error_samples': [],
+    }
+
+    try:
+        for i in range(per_worker):
+            doc_type = doc_types[(worker_id + i) % len(doc_types)]
+            started = time.perf_counter()
+            try:
+                # Mirror ATOMIC_REQUESTS: one transaction per create
+                with transaction.atomic():
+                    obj = _create(doc_type, fx, today)
+            except IntegrityError as e:
+                result['duplicates' if is_duplicate_number(doc_type, e) else 'errors'][doc_type] += 1
+                if len(result['error_samples']) < 5:
+                    result['error_samples'].append(f'{doc_type}: {e}')
+                continue
+            except DatabaseError as e:
+                result['errors'][doc_type] += 1
+                if len(result['error_samples']) < 5:
+                    result['error_samples'].append(f'{doc_type}: {e}')
+                continue
+            result['latencies'][doc_type].append(time.perf_counter() - started)
+
+            if doc_type in NUMBERED:
+                numbering_type, attr = NUMBERED[doc_type]
+                if numbering.parse_number(numbering_type, getattr(obj, attr)) is None:
+                    result['fallbacks'][doc_type] += 1
+    finally:
+        result['numbering'] = numbering.allocation_stats()
+        connection.close()
+
+    # Plain dicts so the result pickles back from worker processes
+    for key in ('latencies', 'duplicates', 'errors', 'fallbacks'):
+        result[key] = dict(result[key])
+    return result
+
+
+def _process_worker(args):
+    import django
+    from django.conf import settings
+    if not settings.configured or not django.apps.apps.ready:
+        django.setup()
+    numbering.reset_allocation_stats()
+    return run_worker(*args)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Create documents from many concurrent workers and report throughput, latency and numbering conflicts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Number of concurrent workers')
+        parser.add_argument('--per-worker', type=int, default=25, help='Documents created by each worker')
+        parser.add_argument(
+            '--mode', choices=['threads', 'processes'], default='threads',
+            help='Run workers as threads in this process or as separate processes',
+        )
+        parser.add_argument(
+            '--types', default=','.join(DOCUMENT_TYPES),
+            help=f"Comma-separated document types to create ({', '.join(DOCUMENT_TYPES)})",
+        )
+        parser.add_argument(
+            '--cleanup', action='store_true',
+            help='Delete everything created by previous load test runs and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self._cleanup()
+            return
+
+        doc_types = [t.strip() for t in options['types'].split(',') if t.strip()]
+        unknown = set(doc_types) - set(DOCUMENT_TYPES)
+        if unknown or not doc_types:
+            raise CommandError(f"Unknown document types: {', '.join(sorted(unknown)) or '(none)'}")
+
+        workers = max(1, options['workers'])
+        per_worker = max(1, options['per_worker'])
+        fx = _fixtures()
+        jobs = [(worker_id, doc_types, per_worker, fx) for worker_id in range(workers)]
+
+        self.stdout.write(
+            f"Creating {workers * per_worker} documents ({', '.join(doc_types)}) from {workers} "
+            f"{options['mode']} against {connection.vendor}..."
+        )
+
+        numbering.reset_allocation_stats()
+        started = time.perf_counter()
+        if options['mode'] == 'processes':
+            # Children must not inherit this process's open connection
+            connections.close_all()
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                results = list(executor.map(_process_worker, jobs))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda job: run_worker(*job), jobs))
+        elapsed = time.perf_counter() - started
+
+        self._report(results, doc_types, elapsed, options['mode'])
+
+    def _report(self, results, doc_types, elapsed, mode):
+        latencies = defaultdict(list)
+        totals = {'duplicates': defaultdict(int), 'errors': defaultdict(int), 'fallbacks': defaultdict(int)}
+        stats = defaultdict(float)
+        samples = []
+        for result in results:
+            for doc_type, values in result['latencies'].items():
+                latencies[doc_type].extend(values)
+            for key in totals:
+                for doc_type, count in result[key].items():
+                    totals[key][doc_type] += count
+            for key, value in result['numbering'].items():
+                stats[key] += value
+            samples.extend(result['error_samples'])
+
+        # Thread workers share one process, so read its counters once
+        if mode == 'threads':
+            stats = defaultdict(float, numbering.allocation_stats())
+
+        created = sum(len(values) for values in latencies.values())
+        self.stdout.write('')
+        self.stdout.write(f"{'type':<12}{'created':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'dupes':>7}{'errors':>8}{'fallback':>10}")
+        for doc_type in doc_types:
+            values = latencies.get(doc_type, [])
+            self.stdout.write(
+                f"{doc_type:<12}{len(values):>9}"
+                f"{percentile(values, 50) * 1000:>9.1f}{percentile(values, 95) * 1000:>9.1f}"
+                f"{(max(values) if values else 0) * 1000:>9.1f}"
+                f"{totals['duplicates'][doc_type]:>7}{totals['errors'][doc_type]:>8}{totals['fallbacks'][doc_type]:>10}"
+            )
+
+        all_latencies = [value for values in latencies.values() for value in values]
+        self.stdout.write('')
+        self.stdout.write(f'Throughput: {created / elapsed:.1f} creates/s over {elapsed:.2f}s')
+        self.stdout.write(f'Overall p95 latency: {percentile(all_latencies, 95) * 1000:.1f} ms')
+        self.stdout.write(
+            f"Numbering: {int(stats['allocations'])} allocations, {int(stats['round_trips'])} counter round-trips, "
+            f"{int(stats['blocks_reserved'])} blocks reserved, {stats['lock_wait'] * 1000:.1f} ms waiting on counters"
+        )
+        for sample in samples[:5]:
+            self.stdout.write(self.style.WARNING(f'  {sample}'))
+
+        failures = sum(sum(counts.values()) for counts in totals.values())
+        if failures:
+            self.stdout.write(self.style.ERROR(f'{failures} failed or non-standard creates'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No duplicate numbers, errors or fallback numbers'))
+
+    def _cleanup(self):
+        user = User.objects.filter(username=LOADTEST_USERNAME).first()
+        if not user:
+            self.stdout.write('Nothing to clean up')
+            return
+
+        with transaction.atomic():
+            counts = {
+                'financial activities': FinancialActivity.objects.filter(created_by=user).delete()[0],
+                'expenses': ProjectExpense.objects.filter(created_by=user).delete()[0],
+                'invoices': Invoice.objects.filter(created_by=user).delete()[0],
+                'quotations': Quotation.objects.filter(created_by=user).delete()[0],
+                'projects': Project.objects.filter(created_by=user).delete()[0],
+            }
+            Client.objects.filter(name=LOADTEST_CLIENT).delete()
+            Service.objects.filter(name='Load Test Service').delete()
+            ProjectExpenseCategory.objects.filter(name='Load Test').delete()
+            code, name = LOADTEST_ACCOUNT
+            FinancialAccount.objects.filter(code=code, name=name).delete()
+            user.delete()
+
+        summary = ', '.join(f'{count} {label}' for label, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Removed load test data ({summary} rows incl. related)'))
+        self.stdout.write('Number sequences are left advanced; run initialize_number_sequences to rewind them.')
@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued quotation and invoice emails from the email outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+            help='Number of emails to send per SMTP session',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting when it is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep between polls when --loop is set',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        totals = {'sent': 0, 'retrying': 0, 'failed': 0, 'skipped': 0}
+
+        while True:
+            close_old_connections()
+            result = drain_outbox(batch_size=batch_size)
+            for key in totals:
+                totals[key] += result[key]
+
+            if result['claimed']:
+                self.stdout.write(
+                    f"Sent {result['sent']}, retrying {result['retrying']}, failed {result['failed']}, "
+                    f"skipped {result['skipped']}"
+                )
+                # A full batch means more may be waiting - go again without sleeping
+                if result['claimed'] >= batch_size:
+                    continue
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Outbox drained: {totals['sent']} sent, {totals['retrying']} retrying, "
+                f"{totals['failed']} failed, {totals['skipped']} skipped"
+            )
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from api.account_balances import rebuild_balances
+from api.financial_models import JournalEntry
+from api.posting import SOURCES, sync_postings
+
+
+class Command(BaseCommand):
+    help = 'Recompute AccountBalance rows from the journal lines (optionally posting missing entries first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account',
+            type=int,
+            action='append',
+            dest='accounts',
+            help='Limit the rebuild to an account id (repeatable)',
+        )
+        parser.add_argument(
+            '--post',
+            action='store_true',
+            help='Sync the journal entries of every invoice, financial activity and project expense first',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Documents synced per batch with --post')
+
+    def handle(self, *args, **options):
+        if options['post']:
+            batch_size = max(1, options['batch_size'])
+            for source_type, (model, postings_for) in SOURCES.items():
+                # Documents deleted since their entries were posted get those reversed
+                ids = sorted(
+                    set(model.objects.values_list('id', flat=True))
+                    | set(JournalEntry.objects.filter(source_type=source_type).values_list('source_id', flat=True))
+                )
+                posted = reversed_count = 0
+                for start in range(0, len(ids), batch_size):
+                    outcome = sync_postings(source_type, ids[start:start + batch_size])
+                    posted += outcome['posted']
+                    reversed_count += outcome['reversed']
+                self.stdout.write(f'{source_type}: posted {posted} entries, reversed {reversed_count}')
+
+        rows = rebuild_balances(options['accounts'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} account balance row(s)'))
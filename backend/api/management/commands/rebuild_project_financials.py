@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.project_financials import refresh_project_financials
+from api.project_models import Project
+
+
+class Command(BaseCommand):
+    help = 'Recompute the ProjectFinancials rollup for every project (or the given ones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='projects',
+            help='Limit the rebuild to a project id (repeatable)',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Projects recomputed per batch')
+
+    def handle(self, *args, **options):
+        project_ids = options['projects'] or list(Project.objects.order_by('id').values_list('id', flat=True))
+        batch_size = max(1, options['batch_size'])
+
+        rebuilt = 0
+        for start in range(0, len(project_ids), batch_size):
+            rebuilt += len(refresh_project_financials(project_ids[start:start + batch_size]))
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt financials for {rebuilt} project(s)'))
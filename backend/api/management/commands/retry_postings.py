@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from api.financial_models import PendingPosting
+from api.posting import record_failure, sync_postings
+
+
+class Command(BaseCommand):
+    help = 'Sync the journal entries of documents whose posting failed after commit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Documents synced per batch')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        pending = defaultdict(list)
+        for source_type, source_id in PendingPosting.objects.values_list('source_type', 'source_id'):
+            pending[source_type].append(source_id)
+
+        synced = failed = 0
+        for source_type, ids in pending.items():
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                try:
+                    sync_postings(source_type, batch)
+                    synced += len(batch)
+                    continue
+                except Exception:
+                    pass
+                # One bad document shouldn't hold back the rest of its batch
+                for source_id in batch:
+                    try:
+                        sync_postings(source_type, [source_id])
+                        synced += 1
+                    except Exception as error:
+                        record_failure(source_type, [source_id], error)
+                        failed += 1
+                        self.stderr.write(f'{source_type} #{source_id}: {error!r}')
+
+        self.stdout.write(self.style.SUCCESS(f'Synced {synced} document(s), {failed} still pending'))
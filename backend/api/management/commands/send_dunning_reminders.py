@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dunning import run_dunning
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Queue one reminder per client covering all of their overdue invoices (sent by process_email_outbox)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Username recorded on the follow-up interactions (defaults to the first admin)',
+        )
+        parser.add_argument(
+            '--as-of',
+            help='Treat invoices due before this date (YYYY-MM-DD) as overdue; defaults to today',
+        )
+        parser.add_argument(
+            '--client',
+            type=int,
+            action='append',
+            dest='clients',
+            help='Limit the run to a client id (repeatable)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be queued without queuing anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if not user:
+                raise CommandError(f"User {options['user']} does not exist")
+        else:
+            user = User.objects.filter(role='admin', is_active=True).order_by('id').first()
+            if not user:
+                raise CommandError('No active admin user found; pass --user')
+
+        as_of = None
+        if options['as_of']:
+            try:
+                as_of = datetime.strptime(options['as_of'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--as-of must be in YYYY-MM-DD format')
+
+        summary = run_dunning(
+            user,
+            as_of=as_of,
+            client_ids=options['clients'],
+            dry_run=options['dry_run'],
+        )
+
+        self.stdout.write(
+            f"{summary['invoices']} overdue invoice(s) across {summary['clients']} client(s) as of {summary['as_of']}"
+        )
+        for currency, amount in summary['outstanding'].items():
+            self.stdout.write(f'  Outstanding {currency}: {amount}')
+        for skipped in summary['skipped_no_email']:
+            self.stdout.write(self.style.WARNING(f"  Skipped {skipped['client']}: no email address"))
+        if summary['already_queued']:
+            self.stdout.write(f"  {summary['already_queued']} client(s) already reminded for {summary['as_of']}")
+
+        if summary['dry_run']:
+            self.stdout.write(
+                self.style.SUCCESS(f"Dry run complete - {summary['reminders_queued']} reminder(s) would be queued")
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Queued {summary['reminders_queued']} reminder(s); run process_email_outbox to send them"
+                )
+            )
@@ -1,7 +1,7 @@
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth import get_user_model
-from .models import ActivityLog
-import json
+from .audit import record_activity
+from .events import begin_request, end_request
 
 User = get_user_model()
 
@@ -15,12 +15,16 @@ class AuditLogMiddleware(MiddlewareMixin):
         super().__init__(get_response)
     
     def process_request(self, request):
-        # Store the original request data for POST/PUT/PATCH requests
-        if request.method in ['POST', 'PUT', 'PATCH', 'DELETE']:
-            request._original_data = getattr(request, 'body', b'').decode('utf-8')
+        request._event_token = begin_request()
         return None
-    
+
     def process_response(self, request, response):
+        published = end_request(request._event_token) if hasattr(request, '_event_token') else []
+
+        # The view published a domain event, which is already audited by its subscribers
+        if published:
+            return response
+
         # Only log authenticated users
         if not hasattr(request, 'user') or not request.user.is_authenticated:
             return response
@@ -81,14 +85,8 @@ class AuditLogMiddleware(MiddlewareMixin):
             if action == 'view' and object_id is None:
                 return
             
-            # Create activity log entry
-            ActivityLog.objects.create(
-                user=request.user,
-                action=action,
-                content_type=content_type,
-                object_id=object_id or 0,
-                description=description
-            )
+            # Queue activity log entry - written in bulk by the audit writer thread
+            record_activity(request.user, action, content_type, object_id, description)
             
         except Exception as e:
             # Silently fail to avoid breaking the request
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'due_date'], name='api_invoice_status_4cbe4f_idx'),
+        ),
+    ]
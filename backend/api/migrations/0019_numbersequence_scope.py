@@ -0,0 +1,71 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:43
+
+import re
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def seed_project_sequences(apps, schema_editor):
+    """
+    Start the project and expense counters after the highest existing numbers,
+    which were previously derived by scanning the tables on every save.
+    """
+    NumberSequence = apps.get_model('api', 'NumberSequence')
+    Project = apps.get_model('api', 'Project')
+    ProjectExpense = apps.get_model('api', 'ProjectExpense')
+
+    # Rows left by from_quotation asking for a 'project' number (DOC- prefix); never used
+    NumberSequence.objects.filter(document_type='project').delete()
+
+    counters = defaultdict(int)
+    for number in Project.objects.values_list('project_number', flat=True):
+        match = re.match(r'^PROJ-(\d{4})-(\d+)$', number or '')
+        if match:
+            key = ('project', '', int(match.group(1)))
+            counters[key] = max(counters[key], int(match.group(2)))
+
+    for project_id, number in ProjectExpense.objects.values_list('project_id', 'expense_number'):
+        match = re.match(r'^EXP-.+-(\d{4})-(\d+)$', number or '')
+        if match:
+            key = ('project_expense', str(project_id), int(match.group(1)))
+            counters[key] = max(counters[key], int(match.group(2)))
+
+    NumberSequence.objects.bulk_create([
+        NumberSequence(document_type=doc_type, scope=scope, year=year, month=0, last_number=last_number)
+        for (doc_type, scope, year), last_number in counters.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_add_invoice_status_due_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='numbersequence',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='numbersequence',
+            name='scope',
+            field=models.CharField(blank=True, default='', help_text='Separate counter within a type, e.g. project id for expenses', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='numbersequence',
+            name='document_type',
+            field=models.CharField(choices=[('quotation', 'Quotation'), ('invoice', 'Invoice'), ('project', 'Project'), ('project_expense', 'Project Expense')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='numbersequence',
+            name='month',
+            field=models.IntegerField(help_text='0 for yearly counters'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='numbersequence',
+            unique_together={('document_type', 'scope', 'year', 'month')},
+        ),
+        migrations.RunPython(seed_project_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:50
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def backfill_field_changes(apps, schema_editor):
+    """Index the field_changes of audit rows written before the side table existed"""
+    FinancialAuditLog = apps.get_model('api', 'FinancialAuditLog')
+    FinancialAuditFieldChange = apps.get_model('api', 'FinancialAuditFieldChange')
+
+    batch = []
+    logs = FinancialAuditLog.objects.exclude(field_changes=None).only(
+        'id', 'content_type', 'object_id', 'field_changes', 'created_at'
+    )
+    for log in logs.iterator(chunk_size=2000):
+        if not isinstance(log.field_changes, dict):
+            continue
+        for field_name, change in log.field_changes.items():
+            if not isinstance(change, dict) or not ('old' in change or 'new' in change):
+                continue
+            batch.append(FinancialAuditFieldChange(
+                audit_log_id=log.id,
+                content_type=log.content_type,
+                object_id=log.object_id,
+                field_name=field_name[:100],
+                old_value=_as_text(change.get('old')),
+                new_value=_as_text(change.get('new')),
+                created_at=log.created_at,
+            ))
+        if len(batch) >= 2000:
+            FinancialAuditFieldChange.objects.bulk_create(batch)
+            batch = []
+    FinancialAuditFieldChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_activitylog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinancialAuditFieldChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_type', models.CharField(max_length=50)),
+                ('object_id', models.IntegerField()),
+                ('field_name', models.CharField(max_length=100)),
+                ('old_value', models.TextField(blank=True, null=True)),
+                ('new_value', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('audit_log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='field_change_rows', to='api.financialauditlog')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field_name', 'created_at'], name='api_financi_field_n_e37775_idx'), models.Index(fields=['content_type', 'object_id', 'field_name'], name='api_financi_content_41aa04_idx')],
+                'unique_together': {('audit_log', 'field_name')},
+            },
+        ),
+        migrations.RunPython(backfill_field_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:56
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+
+# Frozen copy of api.models.TAX_RATES as of this migration
+TAX_RATES = {
+    'gst_18': Decimal('0.18'),
+    'gst_17': Decimal('0.17'),
+    'srb_15': Decimal('0.15'),
+}
+
+MONEY_FIELDS = (
+    'quotations_total', 'invoiced_total', 'paid_total',
+    'expenses_pending', 'expenses_approved', 'expenses_paid',
+)
+COUNT_FIELDS = ('expenses_count', 'milestones_total', 'milestones_completed', 'team_size')
+
+
+def backfill_project_financials(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    ProjectFinancials = apps.get_model('api', 'ProjectFinancials')
+    InvoiceItem = apps.get_model('api', 'InvoiceItem')
+    QuotationItem = apps.get_model('api', 'QuotationItem')
+    ProjectExpense = apps.get_model('api', 'ProjectExpense')
+    ProjectMilestone = apps.get_model('api', 'ProjectMilestone')
+    ProjectAssignment = apps.get_model('api', 'ProjectAssignment')
+
+    line_total = ExpressionWrapper(
+        F('quantity') * F('price') * Case(
+            *[When(tax_type=tax_type, then=Value(1 + rate)) for tax_type, rate in TAX_RATES.items()],
+            default=Value(Decimal('1')),
+            output_field=DecimalField(max_digits=5, decimal_places=4),
+        ),
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
+
+    rollups = {
+        project_id: dict.fromkeys(MONEY_FIELDS + COUNT_FIELDS, 0)
+        for project_id in Project.objects.values_list('id', flat=True)
+    }
+
+    for row in (
+        InvoiceItem.objects.filter(invoice__project__isnull=False).order_by()
+        .values('invoice__project_id')
+        .annotate(total=Sum(line_total), paid=Sum(line_total, filter=Q(invoice__status='paid')))
+    ):
+        rollups[row['invoice__project_id']].update(invoiced_total=row['total'], paid_total=row['paid'])
+
+    for row in (
+        QuotationItem.objects.filter(quotation__project__isnull=False).order_by()
+        .values('quotation__project_id')
+        .annotate(total=Sum(line_total))
+    ):
+        rollups[row['quotation__project_id']]['quotations_total'] = row['total']
+
+    for row in (
+        ProjectExpense.objects.order_by().values('project_id').annotate(
+            pending=Sum('total_amount', filter=Q(status='pending')),
+            approved=Sum('total_amount', filter=Q(status='approved')),
+            paid=Sum('total_amount', filter=Q(status='paid')),
+            count=Count('id'),
+        )
+    ):
+        rollups[row['project_id']].update(
+            expenses_pending=row['pending'], expenses_approved=row['approved'],
+            expenses_paid=row['paid'], expenses_count=row['count'],
+        )
+
+    for row in (
+        ProjectMilestone.objects.order_by().values('project_id')
+        .annotate(total=Count('id'), completed=Count('id', filter=Q(status='completed')))
+    ):
+        rollups[row['project_id']].update(milestones_total=row['total'], milestones_completed=row['completed'])
+
+    for row in ProjectAssignment.objects.filter(is_active=True).order_by().values('project_id').annotate(count=Count('id')):
+        rollups[row['project_id']]['team_size'] = row['count']
+
+    rows = []
+    for project_id, values in rollups.items():
+        for field in MONEY_FIELDS:
+            values[field] = Decimal(values[field] or 0).quantize(Decimal('0.01'))
+        rows.append(ProjectFinancials(project_id=project_id, **values))
+    ProjectFinancials.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_claimsuser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectFinancials',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='financials', serialize=False, to='api.project')),
+                ('quotations_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('invoiced_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, help_text='Total of paid invoices', max_digits=15)),
+                ('expenses_pending', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expenses_approved', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expenses_paid', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expenses_count', models.IntegerField(default=0)),
+                ('milestones_total', models.IntegerField(default=0)),
+                ('milestones_completed', models.IntegerField(default=0)),
+                ('team_size', models.IntegerField(default=0, help_text='Active assignments')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Project financials',
+            },
+        ),
+        migrations.RunPython(backfill_project_financials, migrations.RunPython.noop),
+    ]
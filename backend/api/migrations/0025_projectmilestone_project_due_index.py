@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_projectfinancials'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='projectmilestone',
+            index=models.Index(fields=['project', 'due_date'], name='api_project_project_2871fa_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+def backfill_category_paths(apps, schema_editor):
+    ProjectExpenseCategory = apps.get_model('api', 'ProjectExpenseCategory')
+    parents = dict(ProjectExpenseCategory.objects.values_list('id', 'parent_category_id'))
+
+    paths = {}
+
+    def path_of(pk):
+        if pk not in paths:
+            parent_id = parents[pk]
+            paths[pk] = (path_of(parent_id) if parent_id else '') + f'{pk}/'
+        return paths[pk]
+
+    categories = []
+    for category in ProjectExpenseCategory.objects.all():
+        category.path = path_of(category.pk)
+        category.depth = category.path.count('/') - 1
+        categories.append(category)
+    ProjectExpenseCategory.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_projectmilestone_project_due_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectexpensecategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='projectexpensecategory',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
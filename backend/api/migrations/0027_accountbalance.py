@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:09
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Frozen copy of api.chart_of_accounts.DEFAULT_ACCOUNTS as of this migration
+DEFAULT_ACCOUNTS = (
+    ('1000', 'Cash', 'asset'),
+    ('1200', 'Accounts Receivable', 'asset'),
+    ('2000', 'Accounts Payable', 'liability'),
+    ('4000', 'Revenue', 'revenue'),
+    ('5000', 'Expenses', 'expense'),
+)
+
+
+def create_default_accounts(apps, schema_editor):
+    FinancialAccount = apps.get_model('api', 'FinancialAccount')
+    if FinancialAccount.objects.exists():
+        return
+    FinancialAccount.objects.bulk_create([
+        FinancialAccount(code=code, name=name, account_type=account_type, description=f"Default {name} account")
+        for code, name, account_type in DEFAULT_ACCOUNTS
+    ])
+
+
+def backfill_account_balances(apps, schema_editor):
+    JournalEntryLine = apps.get_model('api', 'JournalEntryLine')
+    AccountBalance = apps.get_model('api', 'AccountBalance')
+
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for line in JournalEntryLine.objects.values_list(
+        'account_id', 'journal_entry__transaction_date', 'debit_amount', 'credit_amount'
+    ).iterator():
+        account_id, day, debit, credit = line
+        totals[(account_id, day.replace(day=1))][0] += debit or 0
+        totals[(account_id, day.replace(day=1))][1] += credit or 0
+
+    AccountBalance.objects.bulk_create(
+        [
+            AccountBalance(account_id=account_id, period=period, debit_total=debit, credit_total=credit)
+            for (account_id, period), (debit, credit) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_projectexpensecategory_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the month')),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='api.financialaccount')),
+            ],
+            options={
+                'ordering': ['account', 'period'],
+                'indexes': [models.Index(fields=['period'], name='api_account_period_bedd72_idx')],
+                'unique_together': {('account', 'period')},
+            },
+        ),
+        migrations.RunPython(create_default_accounts, migrations.RunPython.noop),
+        migrations.RunPython(backfill_account_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_accountbalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalentry',
+            name='event',
+            field=models.CharField(blank=True, choices=[('recognition', 'Recognition'), ('settlement', 'Settlement')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='reverses',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reversal', to='api.journalentry'),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='source_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='source_type',
+            field=models.CharField(blank=True, choices=[('invoice', 'Invoice'), ('financial_activity', 'Financial Activity'), ('project_expense', 'Project Expense')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='financial_activity',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='journal_entries', to='api.financialactivity'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['source_type', 'source_id'], name='api_journal_source__69518b_idx'),
+        ),
+    ]
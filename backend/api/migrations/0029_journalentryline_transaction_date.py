@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_entry_dates(apps, schema_editor):
+    JournalEntry = apps.get_model('api', 'JournalEntry')
+    JournalEntryLine = apps.get_model('api', 'JournalEntryLine')
+    JournalEntryLine.objects.update(
+        transaction_date=Subquery(
+            JournalEntry.objects.filter(pk=OuterRef('journal_entry_id')).values('transaction_date')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_journalentry_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalentryline',
+            name='transaction_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(copy_entry_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='journalentryline',
+            name='transaction_date',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='journalentryline',
+            index=models.Index(fields=['account', 'transaction_date', 'id'], name='api_journal_account_d39433_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_journalentryline_transaction_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='dedupe_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='payload',
+            field=models.JSONField(blank=True, default=dict, help_text='Payment reminders: invoice_ids and as_of'),
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='document_type',
+            field=models.CharField(choices=[('quotation', 'Quotation'), ('invoice', 'Invoice'), ('dunning', 'Payment Reminder')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='object_id',
+            field=models.IntegerField(help_text='Quotation/invoice id, or the client id for payment reminders'),
+        ),
+    ]
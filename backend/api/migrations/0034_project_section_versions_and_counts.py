@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_document_counts(apps, schema_editor):
+    ProjectFinancials = apps.get_model('api', 'ProjectFinancials')
+    Quotation = apps.get_model('api', 'Quotation')
+    Invoice = apps.get_model('api', 'Invoice')
+    FinancialActivity = apps.get_model('api', 'FinancialActivity')
+
+    counts = {}
+    for field, queryset in (
+        ('quotations_count', Quotation.objects.filter(project__isnull=False)),
+        ('invoices_count', Invoice.objects.filter(project__isnull=False)),
+        ('financial_expenses_count', FinancialActivity.objects.filter(project__isnull=False, activity_type='expense')),
+    ):
+        for row in queryset.order_by().values('project_id').annotate(count=Count('id')):
+            counts.setdefault(row['project_id'], {})[field] = row['count']
+
+    rows = []
+    for financials in ProjectFinancials.objects.filter(project_id__in=counts):
+        for field, count in counts[financials.project_id].items():
+            setattr(financials, field, count)
+        rows.append(financials)
+    ProjectFinancials.objects.bulk_update(
+        rows, ['quotations_count', 'invoices_count', 'financial_expenses_count'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_user_auth_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectfinancials',
+            name='financial_expenses_count',
+            field=models.IntegerField(default=0, help_text='Expense-type financial activities'),
+        ),
+        migrations.AddField(
+            model_name='projectfinancials',
+            name='invoices_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projectfinancials',
+            name='quotations_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ProjectSectionVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(max_length=20)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='section_versions', to='api.project')),
+            ],
+            options={
+                'unique_together': {('project', 'section')},
+            },
+        ),
+        migrations.RunPython(backfill_document_counts, migrations.RunPython.noop),
+    ]
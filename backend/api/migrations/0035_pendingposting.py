@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_project_section_versions_and_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_type', models.CharField(choices=[('invoice', 'Invoice'), ('financial_activity', 'Financial Activity'), ('project_expense', 'Project Expense')], max_length=30)),
+                ('source_id', models.PositiveIntegerField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'unique_together': {('source_type', 'source_id')},
+            },
+        ),
+    ]
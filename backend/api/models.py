@@ -1,13 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from django.db import transaction
 from django.conf import settings
+from decimal import Decimal
 import logging
 
+from .tracking import TrackedFieldsMixin
+
 logger = logging.getLogger(__name__)
 
-class User(AbstractUser):
+class User(TrackedFieldsMixin, AbstractUser):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
         ('sales', 'Sales'),
@@ -20,79 +22,72 @@ class User(AbstractUser):
         default='viewer',
         db_index=True  # Add index for better query performance
     )
+    # Carried in access tokens; bumped on role or active changes so tokens
+    # issued before them stop working (api.authentication)
+    auth_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # Only role changes are logged; keep credentials out of the snapshot
+    TRACKING_EXCLUDE = ('password', 'last_login', 'date_joined')
+
+    # Changes that revoke the user's outstanding access tokens
+    REVOKING_FIELDS = ('role', 'is_active')
 
     def save(self, *args, **kwargs):
-        """Override save to ensure role persists correctly"""
-        # Store the intended role before saving
-        intended_role = self.role
-        
-        with transaction.atomic():
-            # Use select_for_update if updating existing user
-            if self.pk:
-                try:
-                    User.objects.select_for_update().get(pk=self.pk)
-                except User.DoesNotExist:
-                    pass
-            
-            super().save(*args, **kwargs)
-            
-            # Verify the role was saved correctly
-            if self.pk:
-                fresh_instance = User.objects.get(pk=self.pk)
-                if fresh_instance.role != intended_role:
-                    logger.error(f"Role mismatch after save for user {self.username}: Expected {intended_role}, got {fresh_instance.role}")
-                    # Force the role update with raw SQL
-                    from django.db import connection
-                    with connection.cursor() as cursor:
-                        cursor.execute(
-                            "UPDATE api_user SET role = %s WHERE id = %s",
-                            [intended_role, self.pk]
-                        )
-                    logger.info(f"Forced role update for user {self.username} to {intended_role}")
+        """Single UPDATE/INSERT; role changes are logged from the loaded snapshot"""
+        revoked = self.pk is not None and bool(self.get_changes().keys() & set(self.REVOKING_FIELDS))
+        if revoked:
+            self.auth_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'auth_version'}
+        super().save(*args, **kwargs)
+        if revoked:
+            from .authentication import forget_auth_versions
+            forget_auth_versions([self.pk])
+        role_change = self.saved_changes.get('role')
+        if role_change:
+            logger.info(f"User role change for {self.username}: {role_change['old']} -> {role_change['new']}")
+
+class ClaimsUser(User):
+    """
+    User built from JWT claims by api.authentication.ClaimsJWTAuthentication,
+    so authenticated requests don't query the user table. Fields that are
+    not in the token are deferred; the first access to any of them loads
+    all of them in one query.
+    """
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
 
 class NumberSequence(models.Model):
-    """Track number sequences for different document types"""
+    """Track number sequences for different document types (see api.numbering)"""
     DOCUMENT_TYPES = (
         ('quotation', 'Quotation'),
         ('invoice', 'Invoice'),
+        ('project', 'Project'),
+        ('project_expense', 'Project Expense'),
     )
     
     document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPES)
+    scope = models.CharField(max_length=50, blank=True, default='', help_text="Separate counter within a type, e.g. project id for expenses")
     year = models.IntegerField()
-    month = models.IntegerField()
+    month = models.IntegerField(help_text="0 for yearly counters")
     last_number = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = ['document_type', 'year', 'month']
+        unique_together = ['document_type', 'scope', 'year', 'month']
     
     @classmethod
-    def get_next_number(cls, document_type, date=None):
-        """Get next sequential number for a document type"""
-        if date is None:
-            date = timezone.now().date()
-        
-        with transaction.atomic():
-            sequence, created = cls.objects.select_for_update().get_or_create(
-                document_type=document_type,
-                year=date.year,
-                month=date.month,
-                defaults={'last_number': 0}
-            )
-            sequence.last_number += 1
-            sequence.save()
-            
-            # Generate formatted number based on document type
-            if document_type == 'quotation':
-                prefix = 'QTN'
-            elif document_type == 'invoice':
-                prefix = 'INV'
-            else:
-                prefix = 'DOC'
-            
-            number = f'{prefix}-{date.strftime("%Y%m")}-{str(sequence.last_number).zfill(4)}'
-            return number
+    def get_next_number(cls, document_type, date=None, scope='', **format_kwargs):
+        """Get next formatted number for a document type"""
+        from .numbering import allocate
+        return allocate(document_type, date, scope=scope, **format_kwargs)
 
 class Client(models.Model):
     STATUS_CHOICES = (
@@ -188,7 +183,8 @@ class Interaction(models.Model):
     status = models.CharField(max_length=50, blank=True)
     scheduled_date = models.DateTimeField(null=True, blank=True)
     completed_date = models.DateTimeField(null=True, blank=True)
-    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Empty for system-generated records, e.g. reminders queued by a command
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -238,7 +234,7 @@ class ClientAttachment(models.Model):
             self.file_type = os.path.splitext(self.file.name)[1].lower()
         super().save(*args, **kwargs)
 
-class Quotation(models.Model):
+class Quotation(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = (
         ('draft', 'Draft'),
         ('sent', 'Sent'),
@@ -270,22 +266,8 @@ class Quotation(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.number:
-            # Generate unique quotation number using NumberSequence
-            max_attempts = 10
-            for attempt in range(max_attempts):
-                try:
-                    self.number = NumberSequence.get_next_number('quotation', self.date)
-                    # Double-check uniqueness (shouldn't be needed with proper sequence, but safety first)
-                    if not Quotation.objects.filter(number=self.number).exists():
-                        break
-                except Exception as e:
-                    if attempt == max_attempts - 1:
-                        # Fallback to timestamp-based number if all else fails
-                        import time
-                        timestamp = str(int(time.time() * 1000))[-6:]
-                        self.number = f'QTN-{self.date.strftime("%Y%m")}-{timestamp}'
-                        break
-        
+            self.number = NumberSequence.get_next_number('quotation', self.date)
+
         super().save(*args, **kwargs)
     
     @property
@@ -320,6 +302,14 @@ class Quotation(models.Model):
     def __str__(self):
         return f'{self.number} - {self.client.name}'
 
+# Item tax_type -> rate; also used to total items in SQL (api.project_financials)
+TAX_RATES = {
+    'none': Decimal('0'),
+    'gst_18': Decimal('0.18'),
+    'gst_17': Decimal('0.17'),
+    'srb_15': Decimal('0.15'),
+}
+
 class QuotationItem(models.Model):
     TAX_CHOICES = (
         ('none', 'No Tax'),
@@ -343,14 +333,7 @@ class QuotationItem(models.Model):
     @property
     def tax_rate(self):
         """Get tax rate as decimal"""
-        from decimal import Decimal
-        tax_rates = {
-            'none': Decimal('0'),
-            'gst_18': Decimal('0.18'),
-            'gst_17': Decimal('0.17'),
-            'srb_15': Decimal('0.15'),
-        }
-        return tax_rates.get(self.tax_type, Decimal('0'))
+        return TAX_RATES.get(self.tax_type, Decimal('0'))
     
     @property
     def tax_amount(self):
@@ -362,7 +345,7 @@ class QuotationItem(models.Model):
         """Total including tax"""
         return self.subtotal + self.tax_amount
 
-class Invoice(models.Model):
+class Invoice(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = (
         ('draft', 'Draft'),
         ('sent', 'Sent'),
@@ -392,24 +375,15 @@ class Invoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'due_date']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.number:
-            # Generate unique invoice number using NumberSequence
-            max_attempts = 10
-            for attempt in range(max_attempts):
-                try:
-                    self.number = NumberSequence.get_next_number('invoice', self.date)
-                    # Double-check uniqueness (shouldn't be needed with proper sequence, but safety first)
-                    if not Invoice.objects.filter(number=self.number).exists():
-                        break
-                except Exception as e:
-                    if attempt == max_attempts - 1:
-                        # Fallback to timestamp-based number if all else fails
-                        import time
-                        timestamp = str(int(time.time() * 1000))[-6:]
-                        self.number = f'INV-{self.date.strftime("%Y%m")}-{timestamp}'
-                        break
-        
+            self.number = NumberSequence.get_next_number('invoice', self.date)
+
         super().save(*args, **kwargs)
     
     @property
@@ -467,14 +441,7 @@ class InvoiceItem(models.Model):
     @property
     def tax_rate(self):
         """Get tax rate as decimal"""
-        from decimal import Decimal
-        tax_rates = {
-            'none': Decimal('0'),
-            'gst_18': Decimal('0.18'),
-            'gst_17': Decimal('0.17'),
-            'srb_15': Decimal('0.15'),
-        }
-        return tax_rates.get(self.tax_type, Decimal('0'))
+        return TAX_RATES.get(self.tax_type, Decimal('0'))
     
     @property
     def tax_amount(self):
@@ -498,18 +465,72 @@ class ActivityLog(models.Model):
     content_type = models.CharField(max_length=50)  # e.g., 'quotation', 'invoice', etc.
     object_id = models.IntegerField()
     description = models.TextField()
+    # Not auto_now_add: rows written by the buffered audit writer keep the time of the event
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['content_type', 'object_id']),
+            models.Index(fields=['created_at']),
+        ]
+
+class EmailOutbox(models.Model):
+    """Queued quotation/invoice emails, delivered by the process_email_outbox command"""
+    DOCUMENT_TYPES = (
+        ('quotation', 'Quotation'),
+        ('invoice', 'Invoice'),
+        ('dunning', 'Payment Reminder'),
+    )
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),  # Nothing left to send, e.g. every reminded invoice was paid
+    )
+
+    document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPES)
+    object_id = models.IntegerField(help_text="Quotation/invoice id, or the client id for payment reminders")
+    recipient = models.EmailField()
+    message = models.TextField(blank=True)
+    payload = models.JSONField(default=dict, blank=True, help_text="Payment reminders: invoice_ids and as_of")
+    # Rows sharing a key are queued once (e.g. one payment reminder per client per day)
+    dedupe_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        verbose_name_plural = 'Email Outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_document_type_display()} #{self.object_id} to {self.recipient} ({self.status})"
 
 
 # Import financial models
 from .financial_models import (
     FinancialAccount,
+    AccountBalance,
     FinancialActivity,
     FinancialAttachment,
     JournalEntry,
     JournalEntryLine,
+    PendingPosting,
     FinancialReport,
     FinancialAuditLog,
+    FinancialAuditFieldChange,
 )
 
 # Import project models
@@ -519,4 +540,6 @@ from .project_models import (
     ProjectAttachment,
     ProjectMilestone,
     ProjectNote,
+    ProjectFinancials,
+    ProjectSectionVersion,
 )
@@ -0,0 +1,347 @@
+"""
+Document numbering service shared by quotations, invoices, projects and
+project expenses.
+
+Each document type has a format, a reset period and a mode, configured in
+settings.DOCUMENT_NUMBERING (merged over DEFAULT_NUMBERING below):
+
+- gapless:  one counter row per period, incremented with a single
+            UPDATE ... RETURNING inside the caller's transaction. The row
+            stays locked until that transaction ends, so a rollback gives
+            the number back and numbers never skip.
+- block:    each process reserves NUMBERING_BLOCK_SIZE numbers at a time in
+            its own short transaction and hands them out from memory.
+            Only one create in every block touches the counter row; numbers
+            are unique but may skip and are not strictly ordered across
+            processes. On SQLite inside a transaction the reservation has to
+            share the caller's transaction, so the rest of the block is only
+            kept once that transaction commits.
+- sequence: a native Postgres sequence per counter (nextval never blocks).
+            Falls back to block mode on other databases.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+DEFAULT_NUMBERING = {
+    'quotation': {
+        'format': 'QTN-{date:%Y%m}-{seq:04d}',
+        'parse': r'^QTN-(?P<year>\d{4})(?P<month>\d{2})-(?P<seq>\d+)$',
+        'period': 'month',
+        'mode': 'gapless',
+    },
+    'invoice': {
+        'format': 'INV-{date:%Y%m}-{seq:04d}',
+        'parse': r'^INV-(?P<year>\d{4})(?P<month>\d{2})-(?P<seq>\d+)$',
+        'period': 'month',
+        'mode': 'gapless',
+    },
+    'project': {
+        'format': 'PROJ-{date:%Y}-{seq:04d}',
+        'parse': r'^PROJ-(?P<year>\d{4})-(?P<seq>\d+)$',
+        'period': 'year',
+        'mode': 'gapless',
+    },
+    # Scoped per project; callers pass project_code for the format
+    'project_expense': {
+        'format': 'EXP-{project_code}-{date:%Y}-{seq:04d}',
+        'parse': r'^EXP-.+-(?P<year>\d{4})-(?P<seq>\d+)$',
+        'period': 'year',
+        'mode': 'gapless',
+    },
+}
+
+PERIODS = ('month', 'year', 'none')
+MODES = ('gapless', 'block', 'sequence')
+
+_block_lock = threading.Lock()
+_blocks = defaultdict(list)  # counter key -> reserved ranges, each [next number, last number]
+_refill_locks = defaultdict(threading.Lock)  # counter key -> lock held while reserving; guarded by _block_lock
+_known_sequences = set()
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(float)
+
+_side_executor = None
+_side_executor_lock = threading.Lock()
+
+
+def get_config(document_type):
+    config = dict(DEFAULT_NUMBERING.get(document_type, {}))
+    config.update(getattr(settings, 'DOCUMENT_NUMBERING', {}).get(document_type, {}))
+    if 'format' not in config:
+        raise ValueError(f'No numbering format configured for {document_type}')
+    if config.get('period', 'month') not in PERIODS:
+        raise ValueError(f"Unknown numbering period {config['period']!r} for {document_type}")
+    if config.get('mode', 'gapless') not in MODES:
+        raise ValueError(f"Unknown numbering mode {config['mode']!r} for {document_type}")
+    return config
+
+
+def period_key(config, date):
+    """(year, month) for the counter row; month is 0 for yearly counters"""
+    period = config.get('period', 'month')
+    if period == 'month':
+        return date.year, date.month
+    if period == 'year':
+        return date.year, 0
+    return 0, 0
+
+
+def _record(**values):
+    with _stats_lock:
+        for key, value in values.items():
+            _stats[key] += value
+
+
+def allocation_stats():
+    """Counters for the current process: allocations, DB round-trips and time spent waiting on them"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_allocation_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _table():
+    return apps.get_model('api', 'NumberSequence')._meta.db_table
+
+
+def _increment(document_type, scope, year, month, step):
+    """
+    Add step to a counter row and return the new value, creating the row on
+    first use. One statement when the database supports UPDATE ... RETURNING.
+    """
+    NumberSequence = apps.get_model('api', 'NumberSequence')
+    now = timezone.now()
+    params = [step, now, document_type, scope, year, month]
+
+    for _ in range(2):
+        with connection.cursor() as cursor:
+            if connection.features.can_return_columns_from_insert:
+                cursor.execute(
+                    f'UPDATE {_table()} SET last_number = last_number + %s, updated_at = %s '
+                    'WHERE document_type = %s AND scope = %s AND year = %s AND month = %s '
+                    'RETURNING last_number',
+                    params,
+                )
+                row = cursor.fetchone()
+                _record(round_trips=1)
+                if row:
+                    return row[0]
+            else:
+                cursor.execute(
+                    f'UPDATE {_table()} SET last_number = last_number + %s, updated_at = %s '
+                    'WHERE document_type = %s AND scope = %s AND year = %s AND month = %s',
+                    params,
+                )
+                _record(round_trips=1)
+                if cursor.rowcount:
+                    _record(round_trips=1)
+                    return NumberSequence.objects.filter(
+                        document_type=document_type, scope=scope, year=year, month=month
+                    ).values_list('last_number', flat=True).get()
+
+        # First number of the period - create the row. A concurrent creator
+        # wins the unique constraint and we loop back to the UPDATE.
+        try:
+            with transaction.atomic():
+                NumberSequence.objects.create(
+                    document_type=document_type, scope=scope, year=year, month=month, last_number=step
+                )
+            _record(round_trips=1)
+            return step
+        except IntegrityError:
+            _record(round_trips=1)
+
+    raise DatabaseError(f'Could not allocate a {document_type} number')
+
+
+def _run_outside_transaction(func, *args):
+    """
+    Run func in its own transaction, even when called inside an atomic block,
+    so a reserved block is committed straight away instead of holding the
+    counter row lock until the caller commits. SQLite allows one writer at a
+    time, so there the work simply runs inline.
+    """
+    global _side_executor
+    if not connection.in_atomic_block or connection.vendor == 'sqlite':
+        with transaction.atomic():
+            return func(*args)
+
+    with _side_executor_lock:
+        if _side_executor is None:
+            _side_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='numbering')
+
+    def run():
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                return func(*args)
+        finally:
+            close_old_connections()
+
+    return _side_executor.submit(run).result()
+
+
+def _take_from_block(key):
+    with _block_lock:
+        ranges = _blocks[key]
+        while ranges:
+            block = ranges[0]
+            if block[0] <= block[1]:
+                number = block[0]
+                block[0] += 1
+                return number
+            ranges.pop(0)
+    return None
+
+
+def _add_block(key, first, last):
+    if first <= last:
+        with _block_lock:
+            _blocks[key].append([first, last])
+
+
+def _next_from_block(document_type, scope, year, month):
+    key = (document_type, scope, year, month)
+    number = _take_from_block(key)
+    if number is not None:
+        return number
+
+    with _block_lock:
+        refill_lock = _refill_locks[key]
+    # One thread per counter reserves a block; the others wait here rather
+    # than on _block_lock, which is never held across a database call
+    with refill_lock:
+        number = _take_from_block(key)
+        if number is not None:
+            return number
+
+        block_size = max(1, getattr(settings, 'NUMBERING_BLOCK_SIZE', 20))
+        inline = connection.in_atomic_block and connection.vendor == 'sqlite'
+        started = time.perf_counter()
+        last = _run_outside_transaction(_increment, document_type, scope, year, month, block_size)
+        _record(lock_wait=time.perf_counter() - started, blocks_reserved=1)
+
+        first = last - block_size + 1
+        if inline:
+            # The reservation rolls back with the caller's transaction, so
+            # the rest of the block is only handed out once it has committed
+            transaction.on_commit(lambda: _add_block(key, first + 1, last))
+        else:
+            _add_block(key, first + 1, last)
+        return first
+
+
+def _sequence_name(document_type, scope, year, month):
+    name = f'api_docnum_{document_type}_{scope}_{year}_{month}'
+    return re.sub(r'[^a-z0-9_]', '_', name.lower())[:63]
+
+
+def _ensure_sequence(name, document_type, scope, year, month):
+    NumberSequence = apps.get_model('api', 'NumberSequence')
+    start = (NumberSequence.objects.filter(
+        document_type=document_type, scope=scope, year=year, month=month
+    ).values_list('last_number', flat=True).first() or 0) + 1
+    with connection.cursor() as cursor:
+        try:
+            with transaction.atomic():
+                cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {name} START WITH {int(start)}')
+        except (IntegrityError, DatabaseError):
+            # Another process created it between our check and the CREATE
+            pass
+
+
+def _next_from_sequence(document_type, scope, year, month):
+    name = _sequence_name(document_type, scope, year, month)
+    if name not in _known_sequences:
+        _run_outside_transaction(_ensure_sequence, name, document_type, scope, year, month)
+        _known_sequences.add(name)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [name])
+        _record(round_trips=1)
+        return cursor.fetchone()[0]
+
+
+def allocate(document_type, date=None, scope='', **format_kwargs):
+    """
+    Return the next formatted number for document_type.
+    scope separates counters within a type (e.g. one per project) and any
+    extra keyword arguments are passed to the format string.
+    """
+    config = get_config(document_type)
+    date = date or timezone.now().date()
+    year, month = period_key(config, date)
+    scope = str(scope or '')
+    mode = config.get('mode', 'gapless')
+
+    started = time.perf_counter()
+    if mode == 'sequence' and connection.vendor == 'postgresql':
+        seq = _next_from_sequence(document_type, scope, year, month)
+    elif mode in ('block', 'sequence'):
+        seq = _next_from_block(document_type, scope, year, month)
+    else:
+        seq = _increment(document_type, scope, year, month, 1)
+        _record(lock_wait=time.perf_counter() - started)
+    _record(allocations=1, allocation_time=time.perf_counter() - started)
+
+    return config['format'].format(date=date, seq=seq, **format_kwargs)
+
+
+def current_value(document_type, date=None, scope=''):
+    """Last number handed out (or reserved, in block mode) for the period containing date"""
+    config = get_config(document_type)
+    date = date or timezone.now().date()
+    year, month = period_key(config, date)
+    scope = str(scope or '')
+
+    if config.get('mode') == 'sequence' and connection.vendor == 'postgresql':
+        name = _sequence_name(document_type, scope, year, month)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'SELECT last_value, is_called FROM {name}')
+                last_value, is_called = cursor.fetchone()
+                return last_value if is_called else last_value - 1
+        except DatabaseError:
+            pass
+
+    NumberSequence = apps.get_model('api', 'NumberSequence')
+    return NumberSequence.objects.filter(
+        document_type=document_type, scope=scope, year=year, month=month
+    ).values_list('last_number', flat=True).first() or 0
+
+
+def parse_number(document_type, number):
+    """(year, month, seq) from an existing number, or None if it does not match the configured pattern"""
+    config = get_config(document_type)
+    pattern = config.get('parse')
+    if not pattern or not number:
+        return None
+    match = re.match(pattern, number)
+    if not match:
+        return None
+    groups = match.groupdict()
+    year = int(groups.get('year') or 0)
+    month = int(groups.get('month') or 0)
+    if config.get('period') == 'year':
+        month = 0
+    elif config.get('period') == 'none':
+        year = month = 0
+    return year, month, int(groups['seq'])
+
+
+def reset_process_state():
+    """Forget reserved blocks and known sequences (after rebuilding counters)"""
+    with _block_lock:
+        _blocks.clear()
+        _known_sequences.clear()
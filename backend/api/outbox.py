@@ -0,0 +1,189 @@
+"""
+Email outbox for quotation and invoice emails and payment reminders.
+
+Views queue a row with queue_document_email() (or api.dunning.run_dunning()
+for reminders) and return straight away;
+the process_email_outbox command drains pending rows in batches over a
+single SMTP connection, retrying failures with exponential backoff.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import dunning
+from .models import EmailOutbox, Quotation, Invoice
+from .pdf_cache import get_or_render_pdf
+from .utils import build_document_email
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_MODELS = {
+    'quotation': Quotation,
+    'invoice': Invoice,
+}
+
+
+def queue_document_email(doc_type, instance, recipient, message='', user=None):
+    """Queue a quotation/invoice email for delivery by the outbox worker"""
+    return EmailOutbox.objects.create(
+        document_type=doc_type,
+        object_id=instance.pk,
+        recipient=recipient,
+        message=message or '',
+        max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+        created_by=user if user and user.is_authenticated else None,
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, doubling per failure up to the configured cap"""
+    delay = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+
+def claim_batch(batch_size=None):
+    """
+    Mark up to batch_size due rows as 'sending' and return them.
+    Rows stuck in 'sending' past the lock timeout are picked up again so a
+    crashed worker does not strand them. Every claim counts as an attempt,
+    so a row that keeps crashing the worker is marked failed once its
+    attempts are used up instead of being reclaimed forever. skip_locked
+    lets several workers drain the outbox concurrently on Postgres.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.EMAIL_OUTBOX_LOCK_TIMEOUT_SECONDS)
+
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', next_attempt_at__lte=now) |
+                Q(status='sending', locked_at__lt=stale)
+            )
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        EmailOutbox.objects.filter(id__in=ids).update(
+            status='sending', locked_at=now, attempts=F('attempts') + 1
+        )
+        EmailOutbox.objects.filter(id__in=ids, attempts__gt=F('max_attempts')).update(
+            status='failed', locked_at=None, attempts=F('max_attempts'),
+            last_error='Abandoned while sending after the last allowed attempt',
+        )
+
+    return list(EmailOutbox.objects.filter(id__in=ids, status='sending').order_by('next_attempt_at', 'id'))
+
+
+def _load_documents(entries):
+    """Fetch the documents for a batch with one query per document type"""
+    wanted = defaultdict(set)
+    for entry in entries:
+        if entry.document_type == 'dunning':
+            wanted['invoice'].update(entry.payload.get('invoice_ids', []))
+        else:
+            wanted[entry.document_type].add(entry.object_id)
+
+    documents = {}
+    for doc_type, ids in wanted.items():
+        model = DOCUMENT_MODELS[doc_type]
+        queryset = model.objects.filter(id__in=ids).select_related('client').prefetch_related('items__service')
+        for obj in queryset:
+            documents[(doc_type, obj.id)] = obj
+    return documents
+
+
+def _mark_failed(entry, error, retry=True):
+    # attempts was already counted when the row was claimed
+    entry.last_error = str(error)
+    entry.locked_at = None
+    if not retry or entry.attempts >= entry.max_attempts:
+        entry.status = 'failed'
+    else:
+        entry.status = 'pending'
+        entry.next_attempt_at = timezone.now() + retry_delay(entry.attempts)
+    entry.save(update_fields=['last_error', 'locked_at', 'status', 'next_attempt_at'])
+
+
+def _mark_skipped(entry, reason):
+    entry.status = 'skipped'
+    entry.last_error = reason
+    entry.locked_at = None
+    entry.save(update_fields=['status', 'last_error', 'locked_at'])
+
+
+def drain_outbox(batch_size=None, connection=None):
+    """
+    Send one batch of due outbox rows over a single mail connection.
+    Returns a dict with sent/failed/retrying/skipped counts.
+    """
+    entries = claim_batch(batch_size)
+    result = {'claimed': len(entries), 'sent': 0, 'retrying': 0, 'failed': 0, 'skipped': 0}
+    if not entries:
+        return result
+
+    documents = _load_documents(entries)
+    connection = connection or get_connection(fail_silently=False)
+
+    try:
+        for entry in entries:
+            if entry.document_type == 'dunning':
+                instance = dunning.reminder_invoices(entry, documents)
+                if not instance:
+                    # Paid (or cancelled) since the run - not a delivery failure
+                    _mark_skipped(entry, f'No invoices left overdue for client #{entry.object_id}')
+                    result['skipped'] += 1
+                    continue
+            else:
+                instance = documents.get((entry.document_type, entry.object_id))
+                if instance is None:
+                    _mark_failed(entry, f'{entry.document_type} #{entry.object_id} no longer exists', retry=False)
+                    result['failed'] += 1
+                    continue
+
+            try:
+                # open() is a no-op while the session is alive, and reconnects
+                # after a previous failure closed it
+                connection.open()
+                if entry.document_type == 'dunning':
+                    email = dunning.build_reminder_email(entry, instance, connection=connection)
+                else:
+                    email = build_document_email(
+                        entry.document_type, instance, entry.recipient, entry.message,
+                        pdf_content=get_or_render_pdf(entry.document_type, instance),
+                        connection=connection,
+                    )
+                email.send()
+            except Exception as e:
+                logger.warning('Outbox email %s to %s failed: %s', entry.id, entry.recipient, e)
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+                _mark_failed(entry, e)
+                result['failed' if entry.status == 'failed' else 'retrying'] += 1
+                continue
+
+            entry.status = 'sent'
+            entry.sent_at = timezone.now()
+            entry.locked_at = None
+            entry.last_error = ''
+            entry.save(update_fields=['status', 'sent_at', 'locked_at', 'last_error'])
+            if entry.document_type == 'dunning':
+                dunning.record_reminder(entry, instance)
+            result['sent'] += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    return result
@@ -0,0 +1,141 @@
+"""
+On-disk cache of rendered quotation/invoice PDFs.
+
+Files are keyed by a fingerprint of everything that ends up on the page, so
+an edit to the document, its items, their services or its client produces a
+new key and the stale file is replaced on the next render. schedule_prerender() renders in a
+background thread once the surrounding transaction commits, so the PDF is
+usually ready by the time it is downloaded or emailed.
+"""
+import glob
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .utils import generate_pdf
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a document is usually downloaded or emailed soon
+PRERENDER_STATUSES = {
+    'quotation': ('approved',),
+    'invoice': ('sent', 'approved'),
+}
+
+# Bump when generate_pdf output changes so old renders are not served
+RENDER_VERSION = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def cache_dir():
+    return str(getattr(settings, 'PDF_CACHE_PATH', settings.PDF_STORAGE_PATH / 'cache'))
+
+
+def fingerprint(doc_type, instance):
+    """Hash of the fields that affect the rendered PDF"""
+    parts = [
+        str(RENDER_VERSION),
+        doc_type,
+        str(instance.pk),
+        instance.number,
+        str(getattr(instance, 'updated_at', '')),
+        str(getattr(instance.client, 'updated_at', '')),
+    ]
+    # Items render their service's name and description; callers prefetch items__service
+    for item in instance.items.all():
+        service = item.service
+        parts.append(
+            f'{item.pk}:{item.quantity}:{item.price}:{item.tax_type}:{item.description}'
+            f':{service.pk}:{service.updated_at}:{service.name}:{service.description}'
+        )
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_path(doc_type, instance):
+    return os.path.join(cache_dir(), f'{doc_type}_{instance.pk}_{fingerprint(doc_type, instance)}.pdf')
+
+
+def _write(path, doc_type, pk, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+    # Drop renders of older versions of the same document
+    for old_path in glob.glob(os.path.join(os.path.dirname(path), f'{doc_type}_{pk}_*.pdf')):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def get_or_render_pdf(doc_type, instance):
+    """Return the PDF bytes for a document, rendering and caching on a miss"""
+    path = cache_path(doc_type, instance)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    content = generate_pdf(doc_type, instance)
+    try:
+        _write(path, doc_type, instance.pk, content)
+    except OSError as e:
+        logger.warning('Could not cache PDF for %s #%s: %s', doc_type, instance.pk, e)
+    return content
+
+
+def invalidate(doc_type, pk):
+    """Remove every cached render of a document"""
+    for path in glob.glob(os.path.join(cache_dir(), f'{doc_type}_{pk}_*.pdf')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-prerender')
+        return _executor
+
+
+def prerender(doc_type, pk):
+    """Load a document and make sure its current PDF is in the cache"""
+    from .models import Quotation, Invoice
+
+    model = {'quotation': Quotation, 'invoice': Invoice}[doc_type]
+    close_old_connections()
+    try:
+        instance = (
+            model.objects.select_related('client')
+            .prefetch_related('items__service')
+            .filter(pk=pk)
+            .first()
+        )
+        if instance is not None:
+            get_or_render_pdf(doc_type, instance)
+    except Exception:
+        logger.exception('Background PDF render failed for %s #%s', doc_type, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_prerender(doc_type, instance):
+    """Render the document's PDF in the background once the current transaction commits"""
+    if not getattr(settings, 'PDF_PRERENDER_ENABLED', True):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: _get_executor().submit(prerender, doc_type, pk))
@@ -0,0 +1,370 @@
+"""
+Posting engine: journal entries for invoices, financial activities and
+project expenses.
+
+A document has at most two active entries, derived from its status:
+recognition (invoice issued, activity or expense approved) and settlement
+(paid). Saving a document or an invoice item marks it for posting; once the
+transaction commits, sync_postings() compares the lines each document should
+have with its active entries and in one batch reverses the entries that no
+longer match and posts the missing ones. Posted entries are never edited - a
+corrected amount or date shows up as a reversal plus a new entry.
+
+post_entries() is the only writer: it rejects unbalanced or malformed
+entries before inserting anything, bulk-inserts entries and lines, and adds
+their totals to AccountBalance with apply_deltas() in the same transaction.
+bulk_create() skips the JournalEntryLine signals, so nothing is counted twice.
+
+Postings use the default accounts (api.chart_of_accounts); a financial
+activity's own account takes the revenue or expense side. Amounts are posted
+in the document's currency without conversion. Queryset.update() bypasses the
+signals, so bulk writers call queue_postings() themselves;
+`manage.py rebuild_account_balances --post` syncs every document.
+
+The documents are already committed when their sync runs, so a failed sync
+can't undo them; it leaves a PendingPosting row per document instead, and
+`manage.py retry_postings` (run it from cron) syncs those again. A
+successful sync deletes the document's row.
+"""
+import logging
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import chart_of_accounts
+from .account_balances import apply_deltas, new_deltas, period_of
+from .financial_models import FinancialAccount, FinancialActivity, JournalEntry, JournalEntryLine, PendingPosting
+from .models import Invoice, InvoiceItem
+from .project_financials import item_total_expression
+from .project_models import ProjectExpense
+
+logger = logging.getLogger(__name__)
+
+TWO_PLACES = Decimal('0.01')
+
+# Statuses in which a document's recognition entry is posted
+RECOGNIZED_STATUSES = {
+    'invoice': ('sent', 'approved', 'paid', 'overdue'),
+    'financial_activity': ('approved', 'paid', 'overdue'),
+    'project_expense': ('approved', 'paid'),
+}
+
+SETTLED_STATUS = 'paid'
+
+# Financial activity types that bring money in; the others pay it out
+INFLOW_ACTIVITY_TYPES = ('income', 'receivable')
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(TWO_PLACES)
+
+
+def default_account_ids():
+    """{code: id} for the default accounts postings are made to"""
+    codes = [code for code, name, account_type in chart_of_accounts.DEFAULT_ACCOUNTS]
+    accounts = dict(FinancialAccount.objects.filter(code__in=codes).values_list('code', 'id'))
+    missing = [code for code in codes if code not in accounts]
+    if missing:
+        raise ValueError(f"Default accounts missing from the chart of accounts: {', '.join(missing)}")
+    return accounts
+
+
+def _posting(date, description, user_id, debit_account, credit_account, amount, **extra):
+    """A two-line entry spec, or None for a zero amount"""
+    amount = _money(amount)
+    if amount <= 0:
+        return None
+    return {
+        'date': date,
+        'description': description,
+        'user_id': user_id,
+        'lines': [(debit_account, amount, Decimal('0')), (credit_account, Decimal('0'), amount)],
+        **extra,
+    }
+
+
+# Posting rules - each yields (document id, {event: entry spec}) for the given
+# documents. A spec date of None means "the date already posted, else today".
+
+def _invoice_postings(invoices, accounts):
+    totals = dict(
+        InvoiceItem.objects.filter(invoice_id__in=[invoice.id for invoice in invoices]).order_by()
+        .values('invoice_id').annotate(total=Sum(item_total_expression()))
+        .values_list('invoice_id', 'total')
+    )
+    for invoice in invoices:
+        amount = totals.get(invoice.id)
+        user_id = invoice.approved_by_id or invoice.created_by_id
+        postings = {}
+        if invoice.status in RECOGNIZED_STATUSES['invoice']:
+            postings['recognition'] = _posting(
+                invoice.date, f'Invoice {invoice.number} issued', user_id,
+                accounts[chart_of_accounts.RECEIVABLE], accounts[chart_of_accounts.REVENUE], amount,
+            )
+        if invoice.status == SETTLED_STATUS:
+            postings['settlement'] = _posting(
+                None, f'Payment received for invoice {invoice.number}', user_id,
+                accounts[chart_of_accounts.CASH], accounts[chart_of_accounts.RECEIVABLE], amount,
+            )
+        yield invoice.id, postings
+
+
+def _activity_postings(activities, accounts):
+    for activity in activities:
+        user_id = activity.approved_by_id or activity.created_by_id
+        inflow = activity.activity_type in INFLOW_ACTIVITY_TYPES
+        extra = {'financial_activity_id': activity.id}
+        postings = {}
+        if activity.status in RECOGNIZED_STATUSES['financial_activity']:
+            if inflow:
+                debit, credit = accounts[chart_of_accounts.RECEIVABLE], activity.account_id
+            else:
+                debit, credit = activity.account_id, accounts[chart_of_accounts.PAYABLE]
+            postings['recognition'] = _posting(
+                activity.transaction_date, f'{activity.get_activity_type_display()} {activity.reference_number}',
+                user_id, debit, credit, activity.amount, **extra,
+            )
+        if activity.status == SETTLED_STATUS:
+            if inflow:
+                debit, credit = accounts[chart_of_accounts.CASH], accounts[chart_of_accounts.RECEIVABLE]
+            else:
+                debit, credit = accounts[chart_of_accounts.PAYABLE], accounts[chart_of_accounts.CASH]
+            postings['settlement'] = _posting(
+                activity.paid_date, f'Payment for {activity.reference_number}',
+                user_id, debit, credit, activity.amount, **extra,
+            )
+        yield activity.id, postings
+
+
+def _expense_postings(expenses, accounts):
+    for expense in expenses:
+        user_id = expense.approved_by_id or expense.created_by_id
+        postings = {}
+        if expense.status in RECOGNIZED_STATUSES['project_expense']:
+            postings['recognition'] = _posting(
+                expense.expense_date, f'Project expense {expense.expense_number} approved', user_id,
+                accounts[chart_of_accounts.EXPENSES], accounts[chart_of_accounts.PAYABLE], expense.total_amount,
+            )
+        if expense.status == SETTLED_STATUS:
+            postings['settlement'] = _posting(
+                expense.payment_date, f'Project expense {expense.expense_number} paid', user_id,
+                accounts[chart_of_accounts.PAYABLE], accounts[chart_of_accounts.CASH], expense.total_amount,
+            )
+        yield expense.id, postings
+
+
+SOURCES = {
+    'invoice': (Invoice, _invoice_postings),
+    'financial_activity': (FinancialActivity, _activity_postings),
+    'project_expense': (ProjectExpense, _expense_postings),
+}
+
+
+def _reference():
+    timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    return f"JE-{timestamp}-{uuid.uuid4().hex[:12].upper()}"
+
+
+def post_entries(entries):
+    """
+    Insert [(JournalEntry, [JournalEntryLine, ...]), ...] and add the lines
+    to AccountBalance. Entries and lines are unsaved; the lines' journal_entry
+    is set here. Raises ValueError, before writing anything, if an entry has
+    no lines, a line is not strictly one-sided, or debits and credits differ.
+    """
+    for entry, lines in entries:
+        if not lines:
+            raise ValueError(f'Journal entry "{entry.description}" has no lines')
+        for line in lines:
+            if line.debit_amount < 0 or line.credit_amount < 0 or bool(line.debit_amount) == bool(line.credit_amount):
+                raise ValueError(f'Journal entry "{entry.description}" has a line that is not a single debit or credit')
+        debits = sum((line.debit_amount for line in lines), Decimal('0'))
+        credits = sum((line.credit_amount for line in lines), Decimal('0'))
+        if debits != credits:
+            raise ValueError(f'Journal entry "{entry.description}" is unbalanced: debits {debits}, credits {credits}')
+    if not entries:
+        return []
+
+    with transaction.atomic():
+        created = JournalEntry.objects.bulk_create([entry for entry, lines in entries], batch_size=500)
+        deltas = new_deltas()
+        all_lines = []
+        for entry, (_, lines) in zip(created, entries):
+            period = period_of(entry.transaction_date)
+            for line in lines:
+                line.journal_entry = entry
+                line.transaction_date = entry.transaction_date
+                deltas[(line.account_id, period)][0] += line.debit_amount
+                deltas[(line.account_id, period)][1] += line.credit_amount
+                all_lines.append(line)
+        JournalEntryLine.objects.bulk_create(all_lines, batch_size=1000)
+        apply_deltas(deltas)
+    return created
+
+
+def _entry_from_spec(source_type, source_id, event, spec, date):
+    entry = JournalEntry(
+        reference_number=_reference(),
+        description=spec['description'],
+        transaction_date=date,
+        financial_activity_id=spec.get('financial_activity_id'),
+        source_type=source_type,
+        source_id=source_id,
+        event=event,
+        created_by_id=spec['user_id'],
+    )
+    lines = [
+        JournalEntryLine(account_id=account_id, description=spec['description'][:200],
+                         debit_amount=debit, credit_amount=credit)
+        for account_id, debit, credit in spec['lines']
+    ]
+    return entry, lines
+
+
+def _reversal_of(entry, date):
+    description = f'Reversal of {entry.reference_number}: {entry.description}'
+    reversal = JournalEntry(
+        reference_number=_reference(),
+        description=description,
+        transaction_date=date,
+        financial_activity_id=entry.financial_activity_id,
+        source_type=entry.source_type,
+        source_id=entry.source_id,
+        event=entry.event,
+        reverses=entry,
+        created_by_id=entry.created_by_id,
+    )
+    lines = [
+        JournalEntryLine(account_id=line.account_id, description=description[:200],
+                         debit_amount=line.credit_amount, credit_amount=line.debit_amount)
+        for line in entry.lines.all()
+    ]
+    return reversal, lines
+
+
+def _matches(entry, spec):
+    if spec['date'] is not None and entry.transaction_date != spec['date']:
+        return False
+    posted = sorted((line.account_id, line.debit_amount, line.credit_amount) for line in entry.lines.all())
+    return posted == sorted(spec['lines'])
+
+
+def sync_postings(source_type, ids):
+    """
+    Bring the journal entries of the given documents in line with their
+    current state (deleted documents have theirs reversed). Returns
+    {'posted': n, 'reversed': n}.
+    """
+    model, postings_for = SOURCES[source_type]
+    ids = sorted({pk for pk in ids if pk})
+    if not ids:
+        return {'posted': 0, 'reversed': 0}
+
+    with transaction.atomic():
+        # Locking the documents serializes concurrent syncs of the same document
+        documents = list(model.objects.select_for_update().filter(id__in=ids).order_by('id'))
+        wanted = dict(postings_for(documents, default_account_ids())) if documents else {}
+
+        active = defaultdict(list)
+        for entry in JournalEntry.objects.filter(
+            source_type=source_type, source_id__in=ids, reverses__isnull=True, reversal__isnull=True
+        ).prefetch_related('lines'):
+            active[(entry.source_id, entry.event)].append(entry)
+
+        today = timezone.localdate()
+        entries, reversed_count = [], 0
+        for source_id in ids:
+            for event, _ in JournalEntry.EVENTS:
+                spec = wanted.get(source_id, {}).get(event)
+                current = active.get((source_id, event), [])
+                if spec and len(current) == 1 and _matches(current[0], spec):
+                    continue
+                for entry in current:
+                    entries.append(_reversal_of(entry, today))
+                    reversed_count += 1
+                if spec:
+                    date = spec['date'] or (current[0].transaction_date if current else today)
+                    entries.append(_entry_from_spec(source_type, source_id, event, spec, date))
+
+        post_entries(entries)
+        PendingPosting.objects.filter(source_type=source_type, source_id__in=ids).delete()
+    return {'posted': len(entries) - reversed_count, 'reversed': reversed_count}
+
+
+def record_failure(source_type, ids, error):
+    """Leave (or update) a PendingPosting row for each document whose sync failed"""
+    ids = {pk for pk in ids if pk}
+    # Rows start at 0 attempts and are always incremented, so concurrent failures all count
+    PendingPosting.objects.bulk_create(
+        [PendingPosting(source_type=source_type, source_id=pk) for pk in ids],
+        ignore_conflicts=True,
+    )
+    PendingPosting.objects.filter(source_type=source_type, source_id__in=ids).update(
+        attempts=F('attempts') + 1, last_error=repr(error), updated_at=timezone.now(),
+    )
+
+
+# Pending documents - one sync per source type per transaction
+
+def _flush_pending():
+    connection = transaction.get_connection()
+    pending = connection.__dict__.pop('_postings_pending', None)
+    for source_type, ids in (pending or {}).items():
+        try:
+            sync_postings(source_type, ids)
+        except Exception as error:
+            logger.exception('Posting journal entries for %s %s failed', source_type, sorted(ids))
+            try:
+                record_failure(source_type, ids, error)
+            except Exception:
+                # Only `rebuild_account_balances --post` catches these up
+                logger.exception('Recording pending postings for %s %s failed', source_type, sorted(ids))
+
+
+def queue_postings(source_type, ids):
+    """Sync the postings of the given documents after commit"""
+    connection = transaction.get_connection()
+    pending = connection.__dict__.get('_postings_pending')
+    # A rolled-back transaction drops our callback; start over in that case
+    new = pending is None or not any(callback is _flush_pending for _, callback, _ in connection.run_on_commit)
+    if new:
+        pending = connection._postings_pending = defaultdict(set)
+
+    pending[source_type].update(pk for pk in ids if pk)
+
+    if new:
+        # Runs immediately outside a transaction
+        transaction.on_commit(_flush_pending)
+
+
+def _source_type(model):
+    return next(source_type for source_type, (source_model, _) in SOURCES.items() if source_model is model)
+
+
+@receiver(post_save, sender='api.Invoice')
+@receiver(post_save, sender='api.FinancialActivity')
+@receiver(post_save, sender='api.ProjectExpense')
+def document_saved(sender, instance, **kwargs):
+    source_type = _source_type(sender)
+    # Documents that never reached a posted status have nothing to post or reverse
+    if instance.status in RECOGNIZED_STATUSES[source_type] or 'status' in instance.get_changes():
+        queue_postings(source_type, [instance.pk])
+
+
+@receiver(post_delete, sender='api.Invoice')
+@receiver(post_delete, sender='api.FinancialActivity')
+@receiver(post_delete, sender='api.ProjectExpense')
+def document_deleted(sender, instance, **kwargs):
+    queue_postings(_source_type(sender), [instance.pk])
+
+
+@receiver(post_save, sender='api.InvoiceItem')
+@receiver(post_delete, sender='api.InvoiceItem')
+def invoice_item_changed(sender, instance, **kwargs):
+    queue_postings('invoice', [instance.invoice_id])
@@ -0,0 +1,61 @@
+"""
+Project visibility for users who only see the projects they belong to.
+
+A user is a member of a project if they manage it, created it or have a
+ProjectAssignment on it. The member ids are collected with a UNION of
+three indexed lookups (no OR across the M2M join, no DISTINCT) and cached
+on the request, so every project-scoped view and action handling the same
+request shares one query. Single-project checks skip the set and test
+existence directly unless it was already loaded.
+"""
+from django.db.models import Q
+
+from .project_models import Project, ProjectAssignment
+
+
+def _http_request(request):
+    # DRF wraps the same HttpRequest in a new Request per view; cache on the inner one
+    return getattr(request, '_request', request)
+
+
+def member_project_ids(request):
+    """Set of ids of the projects request.user is a member of"""
+    http_request = _http_request(request)
+    cached = getattr(http_request, '_member_project_ids', None)
+    if cached is not None:
+        return cached
+
+    user = request.user
+    # order_by() drops Meta.ordering, which compound statements don't allow
+    ids = set(
+        Project.objects.filter(project_manager=user).order_by().values_list('id', flat=True).union(
+            Project.objects.filter(created_by=user).order_by().values_list('id', flat=True),
+            ProjectAssignment.objects.filter(user=user).order_by().values_list('project_id', flat=True),
+        )
+    )
+    http_request._member_project_ids = ids
+    return ids
+
+
+def member_projects(request, queryset=None, field='id'):
+    """Restrict queryset (projects by default) to request.user's projects; `field` holds the project id"""
+    if queryset is None:
+        queryset = Project.objects.all()
+    return queryset.filter(**{f'{field}__in': member_project_ids(request)})
+
+
+def is_project_member(request, project_id):
+    """
+    Membership test for a single project: uses the cached member set if this
+    request already built it, otherwise two indexed existence checks
+    """
+    project_id = int(project_id)
+    cached = getattr(_http_request(request), '_member_project_ids', None)
+    if cached is not None:
+        return project_id in cached
+
+    user = request.user
+    return (
+        Project.objects.filter(Q(project_manager=user) | Q(created_by=user), pk=project_id).exists()
+        or ProjectAssignment.objects.filter(project_id=project_id, user=user).exists()
+    )
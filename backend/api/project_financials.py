@@ -0,0 +1,247 @@
+"""
+ProjectFinancials maintenance.
+
+Writes to invoices, quotations, their items, project expenses, expense
+financial activities, milestones and assignments mark the affected projects dirty; once the transaction
+commits, each dirty project's row is recomputed with one grouped aggregate
+query per source (items are totalled in SQL, tax included), however many
+rows the transaction touched. Queryset.update() bypasses the signals, so
+code that bulk-updates these tables calls refresh_project_financials()
+itself; `manage.py rebuild_project_financials` recomputes everything.
+"""
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import TAX_RATES
+from .project_models import ProjectFinancials
+
+TWO_PLACES = Decimal('0.01')
+
+MONEY_FIELDS = (
+    'quotations_total', 'invoiced_total', 'paid_total',
+    'expenses_pending', 'expenses_approved', 'expenses_paid',
+)
+COUNT_FIELDS = (
+    'quotations_count', 'invoices_count', 'expenses_count', 'financial_expenses_count',
+    'milestones_total', 'milestones_completed', 'team_size',
+)
+ROLLUP_FIELDS = MONEY_FIELDS + COUNT_FIELDS
+
+
+def item_total_expression():
+    """quantity * price * (1 + tax rate) for QuotationItem/InvoiceItem rows"""
+    multiplier = Case(
+        *[When(tax_type=tax_type, then=Value(1 + rate)) for tax_type, rate in TAX_RATES.items() if rate],
+        default=Value(Decimal('1')),
+        output_field=DecimalField(max_digits=5, decimal_places=4),
+    )
+    return ExpressionWrapper(
+        F('quantity') * F('price') * multiplier,
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(TWO_PLACES)
+
+
+def compute_rollups(project_ids):
+    """{project_id: {field: value}} for the given projects"""
+    Invoice = global_apps.get_model('api', 'Invoice')
+    Quotation = global_apps.get_model('api', 'Quotation')
+    InvoiceItem = global_apps.get_model('api', 'InvoiceItem')
+    QuotationItem = global_apps.get_model('api', 'QuotationItem')
+    ProjectExpense = global_apps.get_model('api', 'ProjectExpense')
+    ProjectMilestone = global_apps.get_model('api', 'ProjectMilestone')
+    ProjectAssignment = global_apps.get_model('api', 'ProjectAssignment')
+    FinancialActivity = global_apps.get_model('api', 'FinancialActivity')
+
+    rollups = {project_id: {field: 0 for field in ROLLUP_FIELDS} for project_id in project_ids}
+    line_total = item_total_expression()
+
+    for row in (
+        InvoiceItem.objects.filter(invoice__project_id__in=project_ids).order_by()
+        .values('invoice__project_id')
+        .annotate(total=Sum(line_total), paid=Sum(line_total, filter=Q(invoice__status='paid')))
+    ):
+        rollups[row['invoice__project_id']].update(invoiced_total=row['total'], paid_total=row['paid'])
+
+    for row in (
+        QuotationItem.objects.filter(quotation__project_id__in=project_ids).order_by()
+        .values('quotation__project_id')
+        .annotate(total=Sum(line_total))
+    ):
+        rollups[row['quotation__project_id']]['quotations_total'] = row['total']
+
+    # Documents without items count too, so these can't ride on the item queries
+    for model, field in ((Invoice, 'invoices_count'), (Quotation, 'quotations_count')):
+        for row in (
+            model.objects.filter(project_id__in=project_ids).order_by()
+            .values('project_id')
+            .annotate(count=Count('id'))
+        ):
+            rollups[row['project_id']][field] = row['count']
+
+    for row in (
+        ProjectExpense.objects.filter(project_id__in=project_ids).order_by()
+        .values('project_id')
+        .annotate(
+            pending=Sum('total_amount', filter=Q(status='pending')),
+            approved=Sum('total_amount', filter=Q(status='approved')),
+            paid=Sum('total_amount', filter=Q(status='paid')),
+            count=Count('id'),
+        )
+    ):
+        rollups[row['project_id']].update(
+            expenses_pending=row['pending'], expenses_approved=row['approved'],
+            expenses_paid=row['paid'], expenses_count=row['count'],
+        )
+
+    for row in (
+        ProjectMilestone.objects.filter(project_id__in=project_ids).order_by()
+        .values('project_id')
+        .annotate(total=Count('id'), completed=Count('id', filter=Q(status='completed')))
+    ):
+        rollups[row['project_id']].update(milestones_total=row['total'], milestones_completed=row['completed'])
+
+    for row in (
+        ProjectAssignment.objects.filter(project_id__in=project_ids, is_active=True).order_by()
+        .values('project_id')
+        .annotate(count=Count('id'))
+    ):
+        rollups[row['project_id']]['team_size'] = row['count']
+
+    for row in (
+        FinancialActivity.objects.filter(project_id__in=project_ids, activity_type='expense').order_by()
+        .values('project_id')
+        .annotate(count=Count('id'))
+    ):
+        rollups[row['project_id']]['financial_expenses_count'] = row['count']
+
+    for values in rollups.values():
+        for field in MONEY_FIELDS:
+            values[field] = _money(values[field])
+    return rollups
+
+
+def refresh_project_financials(project_ids):
+    """Recompute and upsert the ProjectFinancials rows of the given projects"""
+    Project = global_apps.get_model('api', 'Project')
+
+    # Skip ids of projects deleted in the meantime
+    project_ids = list(Project.objects.filter(id__in=set(project_ids)).values_list('id', flat=True))
+    if not project_ids:
+        return []
+
+    rows = [
+        ProjectFinancials(project_id=project_id, **values)
+        for project_id, values in compute_rollups(project_ids).items()
+    ]
+    rows = ProjectFinancials.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['project'],
+        update_fields=list(ROLLUP_FIELDS) + ['updated_at'],
+    )
+
+    from .project_sections import invalidate
+    invalidate(project_ids, ('financials',))
+    return rows
+
+
+def get_financials(project):
+    """The project's rollup row, computed on the spot if it doesn't exist yet"""
+    try:
+        return project.financials
+    except ProjectFinancials.DoesNotExist:
+        refresh_project_financials([project.id])
+        project.financials = ProjectFinancials.objects.get(project_id=project.id)
+        return project.financials
+
+
+# Dirty tracking - one refresh per transaction
+
+def _flush_pending():
+    connection = transaction.get_connection()
+    pending = connection.__dict__.pop('_project_financials_pending', None)
+    if not pending:
+        return
+
+    Invoice = global_apps.get_model('api', 'Invoice')
+    Quotation = global_apps.get_model('api', 'Quotation')
+    project_ids = set(pending['projects'])
+    # Item writes only know their document; deleted documents report their project themselves
+    if pending['invoices']:
+        project_ids.update(Invoice.objects.filter(id__in=pending['invoices']).values_list('project_id', flat=True))
+    if pending['quotations']:
+        project_ids.update(Quotation.objects.filter(id__in=pending['quotations']).values_list('project_id', flat=True))
+    project_ids.discard(None)
+    if project_ids:
+        refresh_project_financials(project_ids)
+
+
+def mark_dirty(projects=(), invoices=(), quotations=()):
+    """Recompute the given projects (or those of the given documents) after commit"""
+    connection = transaction.get_connection()
+    pending = connection.__dict__.get('_project_financials_pending')
+    # A rolled-back transaction drops our callback; start over in that case
+    new = pending is None or not any(callback is _flush_pending for _, callback, _ in connection.run_on_commit)
+    if new:
+        pending = connection._project_financials_pending = {'projects': set(), 'invoices': set(), 'quotations': set()}
+
+    pending['projects'].update(pk for pk in projects if pk)
+    pending['invoices'].update(pk for pk in invoices if pk)
+    pending['quotations'].update(pk for pk in quotations if pk)
+
+    if new:
+        # Runs immediately outside a transaction
+        transaction.on_commit(_flush_pending)
+
+
+def projects_of(instance):
+    """Current project id plus the previous one if the instance was moved"""
+    ids = [instance.project_id]
+    if hasattr(instance, 'get_changes'):
+        moved = instance.get_changes().get('project')
+        if moved:
+            ids.append(moved['old'])
+    return ids
+
+
+@receiver(post_save, sender='api.Invoice')
+@receiver(post_delete, sender='api.Invoice')
+@receiver(post_save, sender='api.Quotation')
+@receiver(post_delete, sender='api.Quotation')
+@receiver(post_save, sender='api.ProjectExpense')
+@receiver(post_delete, sender='api.ProjectExpense')
+@receiver(post_save, sender='api.ProjectMilestone')
+@receiver(post_delete, sender='api.ProjectMilestone')
+@receiver(post_save, sender='api.ProjectAssignment')
+@receiver(post_delete, sender='api.ProjectAssignment')
+@receiver(post_save, sender='api.FinancialActivity')
+@receiver(post_delete, sender='api.FinancialActivity')
+def document_changed(sender, instance, **kwargs):
+    mark_dirty(projects=projects_of(instance))
+
+
+@receiver(post_save, sender='api.InvoiceItem')
+@receiver(post_delete, sender='api.InvoiceItem')
+def invoice_item_changed(sender, instance, **kwargs):
+    mark_dirty(invoices=[instance.invoice_id])
+
+
+@receiver(post_save, sender='api.QuotationItem')
+@receiver(post_delete, sender='api.QuotationItem')
+def quotation_item_changed(sender, instance, **kwargs):
+    mark_dirty(quotations=[instance.quotation_id])
+
+
+@receiver(post_save, sender='api.Project')
+def project_created(sender, instance, created, **kwargs):
+    if created:
+        mark_dirty(projects=[instance.id])
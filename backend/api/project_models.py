@@ -10,6 +10,8 @@ from django.utils import timezone
 from decimal import Decimal
 import os
 
+from .tracking import TrackedFieldsMixin
+
 User = get_user_model()
 
 
@@ -104,19 +106,9 @@ class Project(models.Model):
         """Auto-generate project code if not provided"""
         if not self.project_number:
             # Generate project code: PROJ-YYYY-NNNN
-            year = self.start_date.year if self.start_date else timezone.now().year
-            last_project = Project.objects.filter(
-                project_number__startswith=f'PROJ-{year}-'
-            ).order_by('project_number').last()
-            
-            if last_project:
-                last_num = int(last_project.project_number.split('-')[-1])
-                new_num = str(last_num + 1).zfill(4)
-            else:
-                new_num = '0001'
-            
-            self.project_number = f'PROJ-{year}-{new_num}'
-        
+            from .numbering import allocate
+            self.project_number = allocate('project', self.start_date)
+
         super().save(*args, **kwargs)
     
     @property
@@ -306,6 +298,13 @@ class ProjectMilestone(models.Model):
         ('completed', 'Completed'),
         ('delayed', 'Delayed'),
     )
+    # Status-based completion, like Project.progress_percentage
+    COMPLETION_PERCENTAGES = {
+        'pending': 0,
+        'in_progress': 50,
+        'delayed': 50,
+        'completed': 100,
+    }
     
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='milestones')
     title = models.CharField(max_length=200)
@@ -327,6 +326,10 @@ class ProjectMilestone(models.Model):
     
     class Meta:
         ordering = ['order', 'due_date']
+        indexes = [
+            # Timeline windowing: milestones of given projects due within a date range
+            models.Index(fields=['project', 'due_date']),
+        ]
     
     def __str__(self):
         return f"{self.project.name} - {self.title}"
@@ -337,6 +340,10 @@ class ProjectMilestone(models.Model):
         if self.status not in ['completed'] and self.due_date:
             return timezone.now().date() > self.due_date
         return False
+    
+    @property
+    def completion_percentage(self):
+        return self.COMPLETION_PERCENTAGES.get(self.status, 0)
 
 
 class ProjectNote(models.Model):
@@ -358,11 +365,16 @@ class ProjectNote(models.Model):
 
 class ProjectExpenseCategory(models.Model):
     """Predefined and custom expense categories for projects"""
+    PATH_SEPARATOR = '/'
+    
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     is_predefined = models.BooleanField(default=False, help_text="System predefined category")
     is_active = models.BooleanField(default=True)
     parent_category = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories')
+    # Materialized path of ids from the root, e.g. "3/17/"; a subtree is path__startswith
+    path = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -373,6 +385,34 @@ class ProjectExpenseCategory(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        """Save, then set the materialized path and move the subtree along if the parent changed"""
+        parent = self.parent_category
+        if parent is not None and self.path and parent.path.startswith(self.path):
+            raise ValueError("A category can't be moved under itself or one of its subcategories")
+        
+        super().save(*args, **kwargs)
+        
+        old_path = self.path
+        new_path = f"{parent.path if parent is not None else ''}{self.pk}{self.PATH_SEPARATOR}"
+        if new_path == old_path:
+            return
+        
+        new_depth = new_path.count(self.PATH_SEPARATOR) - 1
+        ProjectExpenseCategory.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            from django.db.models.functions import Concat, Substr
+            ProjectExpenseCategory.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=models.F('depth') + (new_depth - self.depth),
+            )
+        self.path, self.depth = new_path, new_depth
+    
+    @property
+    def ancestor_ids(self):
+        """Ids from the root down to the parent"""
+        return [int(pk) for pk in self.path.split(self.PATH_SEPARATOR) if pk][:-1]
+    
     @classmethod
     def get_default_categories(cls):
         """Create default expense categories if they don't exist"""
@@ -405,7 +445,7 @@ class ProjectExpenseCategory(models.Model):
         return created_categories
 
 
-class ProjectExpense(models.Model):
+class ProjectExpense(TrackedFieldsMixin, models.Model):
     """Detailed expense tracking for projects"""
     PAYMENT_METHODS = (
         ('cash', 'Cash'),
@@ -496,21 +536,12 @@ class ProjectExpense(models.Model):
     def save(self, *args, **kwargs):
         """Auto-generate expense number and calculate totals"""
         if not self.expense_number:
-            # Generate expense number: EXP-PROJ-YYYY-NNNN
-            year = self.expense_date.year if self.expense_date else timezone.now().year
+            # Generate expense number: EXP-PROJ-YYYY-NNNN, counted per project
+            from .numbering import allocate
             project_code = self.project.project_number.replace('PROJ-', '') if self.project.project_number else 'UNKN'
-            last_expense = ProjectExpense.objects.filter(
-                project=self.project,
-                expense_number__startswith=f'EXP-{project_code}-{year}-'
-            ).order_by('expense_number').last()
-            
-            if last_expense:
-                last_num = int(last_expense.expense_number.split('-')[-1])
-                new_num = str(last_num + 1).zfill(4)
-            else:
-                new_num = '0001'
-            
-            self.expense_number = f'EXP-{project_code}-{year}-{new_num}'
+            self.expense_number = allocate(
+                'project_expense', self.expense_date, scope=self.project_id, project_code=project_code
+            )
         
         # Calculate tax amount and total
         if self.amount and self.tax_rate:
@@ -553,3 +584,63 @@ class ProjectExpense(models.Model):
         """Reject the expense"""
         self.status = 'rejected'
         self.save()
+
+
+class ProjectFinancials(models.Model):
+    """
+    Per-project rollup of invoice, quotation, expense, milestone and team
+    figures and document counts, kept current by api.project_financials so list cards and the
+    dashboard render without per-row aggregate queries.
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='financials')
+
+    quotations_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    invoiced_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    paid_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="Total of paid invoices")
+    quotations_count = models.IntegerField(default=0)
+    invoices_count = models.IntegerField(default=0)
+
+    expenses_pending = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expenses_approved = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expenses_paid = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expenses_count = models.IntegerField(default=0)
+    financial_expenses_count = models.IntegerField(default=0, help_text="Expense-type financial activities")
+
+    milestones_total = models.IntegerField(default=0)
+    milestones_completed = models.IntegerField(default=0)
+    team_size = models.IntegerField(default=0, help_text="Active assignments")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Project financials'
+
+    def __str__(self):
+        return f"Financials for project #{self.project_id}"
+
+    @property
+    def total_expenses(self):
+        """Approved and paid expenses (Project.total_expenses_amount)"""
+        return self.expenses_approved + self.expenses_paid
+
+    @property
+    def profitability(self):
+        return self.paid_total - self.total_expenses
+
+
+
+class ProjectSectionVersion(models.Model):
+    """
+    Version counter of one cached project detail section (api.project_sections).
+    Cache keys include it, so a bump after a write retires the cached entry in
+    every worker process, whatever cache backend is configured.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='section_versions')
+    section = models.CharField(max_length=20)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['project', 'section']
+
+    def __str__(self):
+        return f"Project #{self.project_id} {self.section} v{self.version}"
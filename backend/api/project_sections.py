@@ -0,0 +1,185 @@
+"""
+Sectioned project detail.
+
+GET /projects/{id}/sections/?include=header,team,... serves each section
+from its own cache entry, so the UI can render the header straight away
+and load heavy sections (attachments, milestones) separately. Writes to a
+project's assignments, attachments, milestones, notes or financial data
+retire only the sections they affect, once the transaction commits.
+
+Retiring a section bumps its ProjectSectionVersion row rather than deleting
+cache keys: keys carry the version read from the database, so every worker
+process stops serving the old entry at once even with a per-process
+LocMemCache, and the orphaned entry simply expires. Keys also carry the
+current date because several fields (is_overdue, days_remaining,
+days_until_due) depend on it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .project_financials import get_financials
+
+SECTIONS = ('header', 'team', 'milestones', 'attachments', 'notes', 'financials')
+
+RECENT_NOTES_COUNT = 5
+
+
+def cache_key(project_id, section, version, day=None):
+    day = day or timezone.localdate()
+    return f'project_section:{project_id}:{section}:{version}:{day.isoformat()}'
+
+
+def _timeout():
+    return getattr(settings, 'PROJECT_SECTION_CACHE_TIMEOUT', 300)
+
+
+# Section builders - each returns plain serialized data for one project
+
+def _header(project):
+    from .project_serializers import ProjectHeaderSerializer
+    return ProjectHeaderSerializer(project).data
+
+
+def _team(project):
+    from .project_serializers import ProjectAssignmentSerializer
+    assignments = project.projectassignment_set.select_related('user', 'assigned_by')
+    return ProjectAssignmentSerializer(assignments, many=True).data
+
+
+def _milestones(project):
+    from .project_serializers import ProjectMilestoneSerializer
+    milestones = project.milestones.select_related('assigned_to', 'created_by')
+    return ProjectMilestoneSerializer(milestones, many=True).data
+
+
+def _attachments(project):
+    # Serialized without a request: file_url is relative and made absolute per response
+    from .project_serializers import ProjectAttachmentSerializer
+    attachments = project.attachments.select_related('uploaded_by')
+    return ProjectAttachmentSerializer(attachments, many=True).data
+
+
+def _notes(project):
+    from .project_serializers import ProjectNoteSerializer
+    notes = project.notes.select_related('created_by').order_by('-created_at')[:RECENT_NOTES_COUNT]
+    return ProjectNoteSerializer(notes, many=True).data
+
+
+def _financials(project):
+    financials = get_financials(project)
+    budget_utilization = 0
+    if project.budget and project.budget > 0:
+        total_spent = financials.total_expenses + financials.invoiced_total
+        budget_utilization = min(100, (total_spent / project.budget) * 100)
+    return {
+        'total_quotations_amount': financials.quotations_total,
+        'total_invoices_amount': financials.invoiced_total,
+        'total_expenses_amount': financials.total_expenses,
+        'total_revenue': financials.paid_total,
+        'profitability': financials.profitability,
+        'budget_utilization_percentage': budget_utilization,
+        'quotations_count': financials.quotations_count,
+        'invoices_count': financials.invoices_count,
+        'expenses_count': financials.financial_expenses_count,
+        'milestones_completed_count': financials.milestones_completed,
+        'milestones_total_count': financials.milestones_total,
+    }
+
+
+BUILDERS = {
+    'header': _header,
+    'team': _team,
+    'milestones': _milestones,
+    'attachments': _attachments,
+    'notes': _notes,
+    'financials': _financials,
+}
+
+
+def get_sections(project, sections):
+    """{section: data} for the requested sections, building and caching the missing ones"""
+    from .project_models import ProjectSectionVersion
+    versions = dict(
+        ProjectSectionVersion.objects.filter(project_id=project.pk, section__in=sections)
+        .values_list('section', 'version')
+    )
+    keys = {section: cache_key(project.pk, section, versions.get(section, 0)) for section in sections}
+    cached = cache.get_many(keys.values())
+
+    result, missing = {}, {}
+    for section, key in keys.items():
+        if key in cached:
+            result[section] = cached[key]
+        else:
+            result[section] = missing[key] = BUILDERS[section](project)
+    if missing:
+        cache.set_many(missing, _timeout())
+    return result
+
+
+def bump_versions(project_ids, sections=SECTIONS):
+    """Move the given sections of the given projects to a new version"""
+    from .project_models import Project, ProjectSectionVersion
+    # Skip projects deleted in the meantime; their version rows went with them
+    project_ids = list(Project.objects.filter(id__in=set(project_ids)).values_list('id', flat=True))
+    if not project_ids:
+        return
+    # Rows start at 0 and are always incremented, so concurrent first writes can't lose a bump
+    ProjectSectionVersion.objects.bulk_create(
+        [
+            ProjectSectionVersion(project_id=project_id, section=section)
+            for project_id in project_ids for section in sections
+        ],
+        ignore_conflicts=True,
+    )
+    ProjectSectionVersion.objects.filter(project_id__in=project_ids, section__in=sections).update(
+        version=F('version') + 1
+    )
+
+
+def invalidate(project_ids, sections=SECTIONS):
+    """Retire the cached sections of the given projects once the transaction commits"""
+    project_ids = {project_id for project_id in project_ids if project_id}
+    if project_ids:
+        transaction.on_commit(lambda: bump_versions(project_ids, sections))
+
+
+@receiver(post_save, sender='api.Project')
+def project_saved(sender, instance, **kwargs):
+    # Budget feeds budget utilization
+    invalidate([instance.pk], ('header', 'financials'))
+
+
+@receiver(post_save, sender='api.Client')
+def client_saved(sender, instance, **kwargs):
+    from .project_models import Project
+    invalidate(Project.objects.filter(client=instance).values_list('id', flat=True), ('header',))
+
+
+@receiver(post_save, sender='api.ProjectAssignment')
+@receiver(post_delete, sender='api.ProjectAssignment')
+def assignment_changed(sender, instance, **kwargs):
+    invalidate([instance.project_id], ('team',))
+
+
+@receiver(post_save, sender='api.ProjectAttachment')
+@receiver(post_delete, sender='api.ProjectAttachment')
+def attachment_changed(sender, instance, **kwargs):
+    invalidate([instance.project_id], ('attachments',))
+
+
+@receiver(post_save, sender='api.ProjectMilestone')
+@receiver(post_delete, sender='api.ProjectMilestone')
+def milestone_changed(sender, instance, **kwargs):
+    invalidate([instance.project_id], ('milestones', 'financials'))
+
+
+@receiver(post_save, sender='api.ProjectNote')
+@receiver(post_delete, sender='api.ProjectNote')
+def note_changed(sender, instance, **kwargs):
+    invalidate([instance.project_id], ('notes',))
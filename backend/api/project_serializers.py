@@ -17,6 +17,7 @@ from .project_models import (
 )
 from .serializers import ClientSerializer, UserSerializer
 from .financial_serializers import FinancialActivitySerializer
+from .project_financials import get_financials
 
 User = get_user_model()
 
@@ -110,9 +111,10 @@ class ProjectListSerializer(serializers.ModelSerializer):
     progress_percentage = serializers.ReadOnlyField()
     is_overdue = serializers.ReadOnlyField()
     days_remaining = serializers.ReadOnlyField()
-    total_expenses_amount = serializers.ReadOnlyField()
-    total_revenue = serializers.ReadOnlyField()
-    profitability = serializers.ReadOnlyField()
+    # Read from the ProjectFinancials rollup (select_related('financials'))
+    total_expenses_amount = serializers.SerializerMethodField()
+    total_revenue = serializers.SerializerMethodField()
+    profitability = serializers.SerializerMethodField()
     assigned_users_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -125,8 +127,39 @@ class ProjectListSerializer(serializers.ModelSerializer):
             'profitability', 'assigned_users_count', 'created_at', 'updated_at'
         ]
     
+    def get_total_expenses_amount(self, obj):
+        return get_financials(obj).total_expenses
+
+    def get_total_revenue(self, obj):
+        return get_financials(obj).paid_total
+
+    def get_profitability(self, obj):
+        return get_financials(obj).profitability
+
     def get_assigned_users_count(self, obj):
-        return obj.assigned_users.filter(projectassignment__is_active=True).count()
+        return get_financials(obj).team_size
+
+
+class ProjectHeaderSerializer(serializers.ModelSerializer):
+    """Header section of the sectioned project detail (api.project_sections)"""
+    client_details = ClientSerializer(source='client', read_only=True)
+    project_manager_details = UserSerializer(source='project_manager', read_only=True)
+    created_by_details = UserSerializer(source='created_by', read_only=True)
+    duration_days = serializers.ReadOnlyField()
+    progress_percentage = serializers.ReadOnlyField()
+    is_overdue = serializers.ReadOnlyField()
+    days_remaining = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = Project
+        fields = [
+            'id', 'name', 'project_number', 'client', 'client_details', 'project_type',
+            'start_date', 'end_date', 'estimated_completion_date', 'actual_completion_date',
+            'description', 'location', 'status', 'priority', 'budget', 'currency',
+            'project_manager', 'project_manager_details', 'created_by', 'created_by_details',
+            'created_at', 'updated_at', 'duration_days', 'progress_percentage',
+            'is_overdue', 'days_remaining'
+        ]
 
 
 class ProjectDetailSerializer(serializers.ModelSerializer):
@@ -138,12 +171,13 @@ class ProjectDetailSerializer(serializers.ModelSerializer):
     # Calculated fields
     duration_days = serializers.ReadOnlyField()
     progress_percentage = serializers.ReadOnlyField()
-    total_quotations_amount = serializers.ReadOnlyField()
-    total_invoices_amount = serializers.ReadOnlyField()
-    total_expenses_amount = serializers.ReadOnlyField()
-    total_revenue = serializers.ReadOnlyField()
-    profitability = serializers.ReadOnlyField()
-    budget_utilization_percentage = serializers.ReadOnlyField()
+    # Read from the ProjectFinancials rollup (select_related('financials'))
+    total_quotations_amount = serializers.SerializerMethodField()
+    total_invoices_amount = serializers.SerializerMethodField()
+    total_expenses_amount = serializers.SerializerMethodField()
+    total_revenue = serializers.SerializerMethodField()
+    profitability = serializers.SerializerMethodField()
+    budget_utilization_percentage = serializers.SerializerMethodField()
     is_overdue = serializers.ReadOnlyField()
     days_remaining = serializers.ReadOnlyField()
     
@@ -181,20 +215,55 @@ class ProjectDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['project_number', 'created_by', 'created_at', 'updated_at']
     
+    def get_total_quotations_amount(self, obj):
+        return get_financials(obj).quotations_total
+    
+    def get_total_invoices_amount(self, obj):
+        return get_financials(obj).invoiced_total
+    
+    def get_total_expenses_amount(self, obj):
+        return get_financials(obj).total_expenses
+    
+    def get_total_revenue(self, obj):
+        return get_financials(obj).paid_total
+    
+    def get_profitability(self, obj):
+        return get_financials(obj).profitability
+    
+    def get_budget_utilization_percentage(self, obj):
+        if obj.budget and obj.budget > 0:
+            financials = get_financials(obj)
+            total_spent = financials.total_expenses + financials.invoiced_total
+            return min(100, (total_spent / obj.budget) * 100)
+        return 0
+    
+    # ProjectViewSet.retrieve prefetches/annotates these; other callers fall back to queries
+    
     def get_recent_notes(self, obj):
-        recent_notes = obj.notes.order_by('-created_at')[:5]
+        recent_notes = getattr(obj, 'recent_notes_list', None)
+        if recent_notes is None:
+            recent_notes = obj.notes.select_related('created_by').order_by('-created_at')[:5]
         return ProjectNoteSerializer(recent_notes, many=True, context=self.context).data
     
     def get_quotations_count(self, obj):
+        if hasattr(obj, 'quotations_count'):
+            return obj.quotations_count
         return obj.quotations.count()
     
     def get_invoices_count(self, obj):
+        if hasattr(obj, 'invoices_count'):
+            return obj.invoices_count
         return obj.invoices.count()
     
     def get_expenses_count(self, obj):
+        # Project.expenses_count (a property) counts ProjectExpense rows, hence the distinct name
+        if hasattr(obj, 'financial_expenses_count'):
+            return obj.financial_expenses_count
         return obj.financial_activities.filter(activity_type='expense').count()
     
     def get_milestones_completed_count(self, obj):
+        if hasattr(obj, 'milestones_completed_count'):
+            return obj.milestones_completed_count
         return obj.milestones.filter(status='completed').count()
 
 
@@ -266,30 +335,33 @@ class ProjectDashboardSerializer(serializers.ModelSerializer):
             'team_size'
         ]
     
+    # Financial, milestone and team figures come from the ProjectFinancials rollup
+
     def get_total_spent(self, obj):
-        return float(obj.total_expenses_amount)
+        return float(get_financials(obj).total_expenses)
     
     def get_total_billed(self, obj):
-        return float(obj.total_invoices_amount)
+        return float(get_financials(obj).invoiced_total)
     
     def get_remaining_budget(self, obj):
         if obj.budget:
-            return float(obj.budget - obj.total_expenses_amount)
+            return float(obj.budget - get_financials(obj).total_expenses)
         return 0
     
     def get_profit_margin(self, obj):
-        if obj.total_invoices_amount > 0:
-            return float((obj.profitability / obj.total_invoices_amount) * 100)
+        financials = get_financials(obj)
+        if financials.invoiced_total > 0:
+            return float((financials.profitability / financials.invoiced_total) * 100)
         return 0
     
     def get_milestones_completed(self, obj):
-        return obj.milestones.filter(status='completed').count()
+        return get_financials(obj).milestones_completed
     
     def get_milestones_total(self, obj):
-        return obj.milestones.count()
+        return get_financials(obj).milestones_total
     
     def get_team_size(self, obj):
-        return obj.assigned_users.filter(projectassignment__is_active=True).count()
+        return get_financials(obj).team_size
 
 
 class ProjectFinancialSummarySerializer(serializers.Serializer):
@@ -316,42 +388,58 @@ class ProjectFinancialSummarySerializer(serializers.Serializer):
 
 
 class ProjectExpenseCategorySerializer(serializers.ModelSerializer):
-    """Serializer for project expense categories"""
+    """
+    Serializer for project expense categories. Subcategories and totals come
+    from context['category_tree'] (api.expense_summary.category_tree), loaded
+    once per serialization, so nodes cost no queries of their own.
+    """
     subcategories = serializers.SerializerMethodField()
     total_expenses = serializers.SerializerMethodField()
     expenses_count = serializers.SerializerMethodField()
+    subtree_total_expenses = serializers.SerializerMethodField()
+    subtree_expenses_count = serializers.SerializerMethodField()
     
     class Meta:
         model = ProjectExpenseCategory
         fields = [
             'id', 'name', 'description', 'is_predefined', 'is_active', 
-            'parent_category', 'subcategories', 'total_expenses', 'expenses_count',
-            'created_at'
+            'parent_category', 'path', 'depth', 'subcategories', 'total_expenses', 'expenses_count',
+            'subtree_total_expenses', 'subtree_expenses_count', 'created_at'
         ]
-        read_only_fields = ['created_at', 'is_predefined']
+        read_only_fields = ['created_at', 'is_predefined', 'path', 'depth']
+    
+    def validate_parent_category(self, value):
+        if value is not None and self.instance is not None and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category can't be moved under itself or one of its subcategories")
+        return value
+    
+    def _tree(self):
+        tree = self.context.get('category_tree')
+        if tree is None:
+            # Built on first use and kept in the (root serializer's) context for the other nodes
+            from .expense_summary import category_tree
+            tree = self.context['category_tree'] = category_tree(self.context.get('project'))
+        return tree
     
     def get_subcategories(self, obj):
-        if obj.subcategories.exists():
-            return ProjectExpenseCategorySerializer(obj.subcategories.filter(is_active=True), many=True).data
-        return []
+        children = self._tree()['children'].get(obj.id, [])
+        return ProjectExpenseCategorySerializer(children, many=True, context=self.context).data
+    
+    def _stat(self, obj, key):
+        stats = self._tree()['stats'].get(obj.id)
+        return stats[key] if stats else 0
     
     def get_total_expenses(self, obj):
-        # Get project from context if available for filtering
-        project = self.context.get('project')
-        if project:
-            return obj.expenses.filter(
-                project=project,
-                status__in=['approved', 'paid']
-            ).aggregate(total=models.Sum('total_amount'))['total'] or 0
-        return obj.expenses.filter(status__in=['approved', 'paid']).aggregate(
-            total=models.Sum('total_amount')
-        )['total'] or 0
+        return self._stat(obj, 'total_expenses')
     
     def get_expenses_count(self, obj):
-        project = self.context.get('project')
-        if project:
-            return obj.expenses.filter(project=project).count()
-        return obj.expenses.count()
+        return self._stat(obj, 'expenses_count')
+    
+    def get_subtree_total_expenses(self, obj):
+        return self._stat(obj, 'subtree_total_expenses')
+    
+    def get_subtree_expenses_count(self, obj):
+        return self._stat(obj, 'subtree_expenses_count')
 
 
 class ProjectExpenseSerializer(serializers.ModelSerializer):
@@ -5,8 +5,14 @@ Project Management Views for BS Engineering System
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Sum, Count, Avg, F
+from rest_framework.pagination import PageNumberPagination
+from django.db.models import (
+    Q, Sum, Count, Avg, F, Case, When, Value, OuterRef, Subquery, Prefetch,
+    BooleanField, DateField, DecimalField, DurationField, ExpressionWrapper
+)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
@@ -37,11 +43,26 @@ from .project_serializers import (
     ProjectExpenseSummarySerializer
 )
 from .permissions import RoleBasedPermission
+from .events import publish
+from .project_access import member_projects, is_project_member
 from .financial_models import FinancialActivity
-from .models import Quotation, Invoice
+from .models import Quotation, Invoice, QuotationItem, InvoiceItem
+from .project_financials import item_total_expression
+from .project_sections import SECTIONS, get_sections
+from .expense_summary import category_tree, project_expense_summary
+from .transitions import bulk_transition_response
 from decimal import Decimal
 
 
+def _related_count(queryset, field='project'):
+    """Correlated COUNT of queryset rows pointing at the outer project"""
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('pk')).values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
 class ProjectViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing projects with comprehensive project management features
@@ -57,7 +78,9 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter projects based on user role and permissions"""
         user = self.request.user
-        queryset = Project.objects.select_related('client', 'project_manager', 'created_by')
+        queryset = Project.objects.select_related('client', 'project_manager', 'created_by', 'financials')
+        if self.action == 'retrieve':
+            queryset = self._with_detail_data(queryset)
         
         # Role-based filtering
         if user.role == 'admin':
@@ -66,9 +89,26 @@ class ProjectViewSet(viewsets.ModelViewSet):
             return queryset  # Sales and accountants can see all projects
         else:
             # Viewers and other roles can only see projects they're assigned to
-            return queryset.filter(
-                Q(assigned_users=user) | Q(project_manager=user) | Q(created_by=user)
-            ).distinct()
+            return member_projects(self.request, queryset)
+    
+    @staticmethod
+    def _with_detail_data(queryset):
+        """Counts and related rows ProjectDetailSerializer renders, loaded up front"""
+        return queryset.annotate(
+            quotations_count=_related_count(Quotation.objects.all()),
+            invoices_count=_related_count(Invoice.objects.all()),
+            financial_expenses_count=_related_count(FinancialActivity.objects.filter(activity_type='expense')),
+            milestones_completed_count=_related_count(ProjectMilestone.objects.filter(status='completed')),
+        ).prefetch_related(
+            Prefetch('projectassignment_set', queryset=ProjectAssignment.objects.select_related('user', 'assigned_by')),
+            Prefetch('attachments', queryset=ProjectAttachment.objects.select_related('uploaded_by')),
+            Prefetch('milestones', queryset=ProjectMilestone.objects.select_related('assigned_to', 'created_by')),
+            Prefetch(
+                'notes',
+                queryset=ProjectNote.objects.select_related('created_by').order_by('-created_at')[:5],
+                to_attr='recent_notes_list',
+            ),
+        )
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
@@ -97,6 +137,102 @@ class ProjectViewSet(viewsets.ModelViewSet):
         serializer = ProjectDashboardSerializer(projects, many=True, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def timeline(self, request):
+        """
+        Gantt data for every visible project: dates, overdue flags, days
+        remaining and milestones. ?start=/?end= (YYYY-MM-DD) limit it to projects
+        running in that window and milestones due in it; the usual project
+        filters (?status=, ?client=, ...) apply.
+        """
+        window = {}
+        for name in ('start', 'end'):
+            value = request.query_params.get(name)
+            try:
+                window[name] = parse_date(value) if value else None
+            except ValueError:
+                window[name] = None
+            if value and window[name] is None:
+                return Response({'error': f'{name} must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        window_start, window_end = window['start'], window['end']
+        if window_start and window_end and window_end < window_start:
+            return Response({'error': 'end must not be before start'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        today = timezone.now().date()
+        today_value = Value(today, output_field=DateField())
+        closed = ['completed', 'cancelled']
+        
+        milestones = ProjectMilestone.objects.only(
+            'id', 'project_id', 'title', 'due_date', 'completed_date', 'status', 'order'
+        ).annotate(
+            overdue=Case(
+                When(Q(due_date__lt=today) & ~Q(status='completed'), then=Value(True)),
+                default=Value(False), output_field=BooleanField()
+            ),
+            days_left=Case(
+                When(~Q(status='completed'), then=ExpressionWrapper(F('due_date') - today_value, output_field=DurationField())),
+                default=None, output_field=DurationField()
+            ),
+        )
+        projects = self.filter_queryset(self.get_queryset()).select_related(None).select_related('client').only(
+            'id', 'name', 'project_number', 'status', 'priority', 'start_date', 'end_date', 'client__name'
+        ).annotate(
+            overdue=Case(
+                When(Q(end_date__lt=today) & ~Q(status__in=closed), then=Value(True)),
+                default=Value(False), output_field=BooleanField()
+            ),
+            days_left=Case(
+                When(Q(end_date__isnull=False) & ~Q(status__in=closed),
+                     then=ExpressionWrapper(F('end_date') - today_value, output_field=DurationField())),
+                default=None, output_field=DurationField()
+            ),
+        ).order_by('start_date', 'id')
+        
+        if window_start:
+            projects = projects.filter(Q(end_date__isnull=True) | Q(end_date__gte=window_start))
+            milestones = milestones.filter(due_date__gte=window_start)
+        if window_end:
+            projects = projects.filter(start_date__lte=window_end)
+            milestones = milestones.filter(due_date__lte=window_end)
+        projects = projects.prefetch_related(Prefetch('milestones', queryset=milestones, to_attr='timeline_milestones'))
+        
+        def days(duration, floor=None):
+            if duration is None:
+                return None
+            return max(floor, duration.days) if floor is not None else duration.days
+        
+        return Response({
+            'window': {'start': window_start, 'end': window_end},
+            'today': today,
+            'projects': [
+                {
+                    'id': project.id,
+                    'name': project.name,
+                    'project_number': project.project_number,
+                    'client_name': project.client.name,
+                    'status': project.status,
+                    'priority': project.priority,
+                    'start_date': project.start_date,
+                    'end_date': project.end_date,
+                    'is_overdue': project.overdue,
+                    'days_remaining': days(project.days_left, floor=0),
+                    'milestones': [
+                        {
+                            'id': milestone.id,
+                            'title': milestone.title,
+                            'due_date': milestone.due_date,
+                            'completed_date': milestone.completed_date,
+                            'status': milestone.status,
+                            'order': milestone.order,
+                            'completion_percentage': milestone.completion_percentage,
+                            'is_overdue': milestone.overdue,
+                            'days_until_due': days(milestone.days_left),
+                        } for milestone in project.timeline_milestones
+                    ],
+                } for project in projects
+            ],
+        })
+    
     @action(detail=True, methods=['get'], url_path='dashboard')
     def project_dashboard(self, request, pk=None):
         """Get detailed dashboard for a specific project"""
@@ -190,6 +326,28 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=True, methods=['get'])
+    def sections(self, request, pk=None):
+        """Project detail split into independently cached sections (?include=header,team,...)"""
+        include = request.query_params.get('include')
+        sections = [name.strip() for name in include.split(',') if name.strip()] if include else list(SECTIONS)
+        unknown = [name for name in sections if name not in SECTIONS]
+        if unknown:
+            return Response(
+                {'error': f"Unknown sections: {', '.join(unknown)}. Valid sections: {', '.join(SECTIONS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        project = self.get_object()
+        data = get_sections(project, sections)
+        if 'attachments' in data:
+            data['attachments'] = [
+                {**attachment, 'file_url': request.build_absolute_uri(attachment['file_url'])}
+                if attachment['file_url'] else attachment
+                for attachment in data['attachments']
+            ]
+        return Response({'id': project.id, 'sections': data})
+    
     @action(detail=True, methods=['get'])
     def financial_summary(self, request, pk=None):
         """Get detailed financial summary for a project"""
@@ -356,36 +514,16 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def expense_summary(self, request, pk=None):
         """Get expense summary for a project"""
         project = self.get_object()
-        
-        # Calculate totals
-        expenses = project.expenses.all()
-        total_expenses = expenses.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        pending_expenses = expenses.filter(status='pending').aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        # Category breakdown
-        category_breakdown = expenses.filter(status__in=['approved', 'paid']).values(
-            'category__name'
-        ).annotate(
-            total=Sum('total_amount'),
-            count=Count('id')
-        ).order_by('-total')
-        
-        # Recent expenses
-        recent_expenses = expenses.order_by('-created_at')[:5]
+        summary = project_expense_summary(project, recent=5)
         
         return Response({
             'project_id': project.id,
             'project_name': project.name,
-            'total_expenses': float(total_expenses),
-            'pending_expenses': float(pending_expenses),
-            'expenses_count': expenses.count(),
-            'category_breakdown': list(category_breakdown),
-            'recent_expenses': ProjectExpenseListSerializer(recent_expenses, many=True).data,
+            'total_expenses': float(summary['total_expenses']),
+            'pending_expenses': float(summary['total_pending']),
+            'expenses_count': summary['expenses_count'],
+            'category_breakdown': summary['expenses_by_category'],
+            'recent_expenses': ProjectExpenseListSerializer(summary['recent_expenses'], many=True).data,
             'currency': project.currency,
         })
     
@@ -428,14 +566,9 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Generate project number
-        from .models import NumberSequence
-        project_number = NumberSequence.get_next_number('project', timezone.now().date())
-        
-        # Create project from quotation
+        # Create project from quotation - Project.save assigns the project number
         project_data = {
             'name': f"Project for {quotation.client.name} - {quotation.number}",
-            'project_number': project_number,
             'client': quotation.client.id,
             'description': quotation.description or f"Project created from quotation {quotation.number}",
             'start_date': timezone.now().date(),
@@ -457,14 +590,12 @@ class ProjectViewSet(viewsets.ModelViewSet):
             quotation.project = project
             quotation.save()
             
-            # Log activity
-            from .models import ActivityLog
-            ActivityLog.objects.create(
+            publish(
+                'project.created',
                 user=request.user,
-                action='create_from_quotation',
-                content_type='project',
-                object_id=project.id,
-                description=f'Created project {project.project_number} from quotation {quotation.number}'
+                instance=project,
+                description=f'Created project {project.project_number} from quotation {quotation.number}',
+                quotation=quotation,
             )
             
             # Return project details
@@ -482,8 +613,25 @@ class ProjectAssignmentViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['project', 'user', 'role', 'is_active']
     
+    def _publish(self, verb, instance):
+        publish(
+            f'assignment.{verb}',
+            user=self.request.user,
+            instance=instance,
+            description=f'{verb.capitalize()} assignment of {instance.user.username} to project {instance.project.project_number}',
+        )
+    
     def perform_create(self, serializer):
         serializer.save(assigned_by=self.request.user)
+        self._publish('created', serializer.instance)
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        self._publish('updated', serializer.instance)
+    
+    def perform_destroy(self, instance):
+        self._publish('deleted', instance)
+        instance.delete()
 
 
 class ProjectAttachmentViewSet(viewsets.ModelViewSet):
@@ -508,8 +656,30 @@ class ProjectMilestoneViewSet(viewsets.ModelViewSet):
     ordering_fields = ['due_date', 'order', 'created_at']
     ordering = ['order', 'due_date']
     
+    def _publish(self, verb, instance, changes=None):
+        publish(
+            f'milestone.{verb}',
+            user=self.request.user,
+            instance=instance,
+            description=f'{verb.capitalize()} milestone {instance.title} of project {instance.project.project_number}',
+            changes=changes,
+        )
+    
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+        self._publish('created', serializer.instance)
+    
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        serializer.save()
+        changes = None
+        if serializer.instance.status != previous_status:
+            changes = {'status': {'old': previous_status, 'new': serializer.instance.status}}
+        self._publish('updated', serializer.instance, changes=changes)
+    
+    def perform_destroy(self, instance):
+        self._publish('deleted', instance)
+        instance.delete()
 
 
 class ProjectNoteViewSet(viewsets.ModelViewSet):
@@ -526,66 +696,111 @@ class ProjectNoteViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 
+class PerformancePagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 class ProjectAnalyticsViewSet(viewsets.ViewSet):
     """ViewSet for project analytics and reporting"""
     permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
     
+    # Orderings accepted by financial_performance (?ordering=-profitability)
+    PERFORMANCE_ORDERING = (
+        'profitability', 'profit_margin', 'revenue_total', 'invoices_total',
+        'quotations_total', 'expenses_total', 'name', 'project_number',
+    )
+
+    def _visible_projects(self, request):
+        if request.user.role in ['admin', 'sales', 'accountant']:
+            return Project.objects.all()
+        return member_projects(request)
+
+    @staticmethod
+    def _with_financials(projects):
+        """
+        Annotate projects with quotation/invoice/paid totals (items incl. tax),
+        expense totals (FinancialActivity) and profitability, all as
+        correlated subqueries so the database does the grouping.
+        """
+        money = DecimalField(max_digits=20, decimal_places=4)
+        zero = Value(Decimal('0'), output_field=money)
+        line_total = item_total_expression()
+
+        def total(queryset, group_by, expression):
+            return Coalesce(
+                Subquery(
+                    queryset.order_by().values(group_by).annotate(total=Sum(expression)).values('total')[:1],
+                    output_field=money,
+                ),
+                zero,
+            )
+
+        invoice_items = InvoiceItem.objects.filter(invoice__project=OuterRef('pk'))
+        projects = projects.order_by().annotate(
+            quotations_total=total(
+                QuotationItem.objects.filter(quotation__project=OuterRef('pk')), 'quotation__project', line_total
+            ),
+            invoices_total=total(invoice_items, 'invoice__project', line_total),
+            revenue_total=total(invoice_items.filter(invoice__status='paid'), 'invoice__project', line_total),
+            expenses_total=total(
+                FinancialActivity.objects.filter(project=OuterRef('pk'), activity_type='expense'), 'project', F('amount')
+            ),
+        )
+        return projects.annotate(
+            profitability=ExpressionWrapper(F('revenue_total') - F('expenses_total'), output_field=money),
+            profit_margin=Case(
+                When(revenue_total__gt=0, then=F('profitability') * 100 / F('revenue_total')),
+                default=zero,
+                output_field=money,
+            ),
+        )
+
     @action(detail=False, methods=['get'])
     def overview(self, request):
         """Get overall project analytics"""
-        user = request.user
-        
-        # Get base queryset based on user permissions
-        if user.role == 'admin':
-            projects = Project.objects.all()
-        elif user.role in ['sales', 'accountant']:
-            projects = Project.objects.all()
-        else:
-            projects = Project.objects.filter(
-                Q(assigned_users=user) | Q(project_manager=user) | Q(created_by=user)
-            ).distinct()
-        
-        # Calculate statistics
-        total_projects = projects.count()
-        active_projects = projects.filter(status='in_progress').count()
-        completed_projects = projects.filter(status='completed').count()
-        overdue_projects = projects.filter(
-            end_date__lt=timezone.now().date(),
-            status__in=['planned', 'in_progress']
-        ).count()
-        
-        # Financial statistics
-        total_budget = projects.aggregate(
-            total=Sum('estimated_budget')
-        )['total'] or 0
+        projects = self._visible_projects(request)
+        today = timezone.now().date()
+        
+        # Counts and budget in one pass
+        stats = projects.aggregate(
+            total_projects=Count('id'),
+            active_projects=Count('id', filter=Q(status='active')),
+            completed_projects=Count('id', filter=Q(status='completed')),
+            overdue_projects=Count('id', filter=Q(end_date__lt=today) & ~Q(status__in=['completed', 'cancelled'])),
+            total_budget=Sum('budget'),
+        )
         
         total_expenses = FinancialActivity.objects.filter(
             project__in=projects,
             activity_type='expense'
         ).aggregate(total=Sum('amount'))['total'] or 0
         
-        total_revenue = projects.aggregate(
-            revenue=Sum('invoices__total_amount', filter=Q(invoices__status='paid'))
-        )['revenue'] or 0
+        # Paid invoices, totalled from their items (tax included)
+        total_revenue = InvoiceItem.objects.filter(
+            invoice__project__in=projects,
+            invoice__status='paid'
+        ).aggregate(total=Sum(item_total_expression()))['total'] or 0
         
         # Project type distribution
-        project_types = projects.values('project_type').annotate(
+        project_types = projects.order_by().values('project_type').annotate(
             count=Count('id'),
-            total_budget=Sum('estimated_budget')
+            total_budget=Sum('budget')
         ).order_by('-count')
         
         # Status distribution
-        status_distribution = projects.values('status').annotate(
+        status_distribution = projects.order_by().values('status').annotate(
             count=Count('id')
         ).order_by('-count')
         
         return Response({
             'summary': {
-                'total_projects': total_projects,
-                'active_projects': active_projects,
-                'completed_projects': completed_projects,
-                'overdue_projects': overdue_projects,
-                'total_budget': float(total_budget),
+                'total_projects': stats['total_projects'],
+                'active_projects': stats['active_projects'],
+                'completed_projects': stats['completed_projects'],
+                'overdue_projects': stats['overdue_projects'],
+                'total_budget': float(stats['total_budget'] or 0),
                 'total_expenses': float(total_expenses),
                 'total_revenue': float(total_revenue),
                 'profitability': float(total_revenue - total_expenses),
@@ -596,68 +811,71 @@ class ProjectAnalyticsViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def financial_performance(self, request):
-        """Get financial performance analytics across projects"""
-        user = request.user
-        
-        # Get base queryset based on user permissions
-        if user.role == 'admin':
-            projects = Project.objects.all()
-        elif user.role in ['sales', 'accountant']:
-            projects = Project.objects.all()
+        """
+        Financial performance per project, sorted and paginated in the database.
+        ?ordering= one of PERFORMANCE_ORDERING (prefix '-' for descending,
+        default -profitability), ?limit=N for a top-N list, otherwise ?page= /
+        ?page_size=. The summary covers every visible project.
+        """
+        projects = self._with_financials(self._visible_projects(request))
+
+        ordering = request.query_params.get('ordering', '-profitability')
+        if ordering.lstrip('-') not in self.PERFORMANCE_ORDERING:
+            return Response({'error': f'Invalid ordering: {ordering}'}, status=status.HTTP_400_BAD_REQUEST)
+        projects = projects.order_by(ordering, 'id')
+
+        summary = projects.aggregate(
+            total_quotations=Sum('quotations_total'),
+            total_invoices=Sum('invoices_total'),
+            total_expenses=Sum('expenses_total'),
+            total_revenue=Sum('revenue_total'),
+            total_profitability=Sum('profitability'),
+            average_profit_margin=Avg('profit_margin'),
+        )
+
+        rows = projects.values(
+            'id', 'name', 'project_number', 'status', 'quotations_total', 'invoices_total',
+            'expenses_total', 'revenue_total', 'profitability', 'profit_margin',
+        )
+        pagination = None
+        limit = request.query_params.get('limit')
+        if limit:
+            try:
+                rows = rows[:max(0, int(limit))]
+            except ValueError:
+                return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         else:
-            projects = Project.objects.filter(
-                Q(assigned_users=user) | Q(project_manager=user) | Q(created_by=user)
-            ).distinct()
-        
-        project_performance = []
-        
-        for project in projects:
-            quotations_total = project.quotations.aggregate(
-                total=Sum('items__total')
-            )['total'] or 0
-            
-            invoices_total = project.invoices.aggregate(
-                total=Sum('items__total')
-            )['total'] or 0
-            
-            expenses_total = project.financial_activities.filter(
-                activity_type='expense'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            revenue_total = project.invoices.filter(
-                status='paid'
-            ).aggregate(total=Sum('items__total'))['total'] or 0
-            
-            profitability = revenue_total - expenses_total
-            profit_margin = (profitability / revenue_total * 100) if revenue_total > 0 else 0
-            
-            project_performance.append({
-                'project_id': project.id,
-                'project_name': project.name,
-                'project_number': project.project_number,
-                'quotations_total': float(quotations_total),
-                'invoices_total': float(invoices_total),
-                'expenses_total': float(expenses_total),
-                'revenue_total': float(revenue_total),
-                'profitability': float(profitability),
-                'profit_margin': float(profit_margin),
-                'status': project.status,
-            })
-        
-        # Sort by profitability
-        project_performance.sort(key=lambda x: x['profitability'], reverse=True)
-        
-        return Response({
-            'projects': project_performance,
-            'summary': {
-                'total_quotations': sum(p['quotations_total'] for p in project_performance),
-                'total_invoices': sum(p['invoices_total'] for p in project_performance),
-                'total_expenses': sum(p['expenses_total'] for p in project_performance),
-                'total_revenue': sum(p['revenue_total'] for p in project_performance),
-                'total_profitability': sum(p['profitability'] for p in project_performance),
-                'average_profit_margin': sum(p['profit_margin'] for p in project_performance) / len(project_performance) if project_performance else 0,
+            paginator = PerformancePagination()
+            rows = paginator.paginate_queryset(rows, request, view=self)
+            pagination = {
+                'count': paginator.page.paginator.count,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
             }
-        })
+
+        project_performance = [
+            {
+                'project_id': row['id'],
+                'project_name': row['name'],
+                'project_number': row['project_number'],
+                'quotations_total': float(row['quotations_total']),
+                'invoices_total': float(row['invoices_total']),
+                'expenses_total': float(row['expenses_total']),
+                'revenue_total': float(row['revenue_total']),
+                'profitability': float(row['profitability']),
+                'profit_margin': float(row['profit_margin']),
+                'status': row['status'],
+            }
+            for row in rows
+        ]
+
+        response = {
+            'projects': project_performance,
+            'summary': {key: float(value or 0) for key, value in summary.items()},
+        }
+        if pagination:
+            response['pagination'] = pagination
+        return Response(response)
 
 
 class ProjectExpenseCategoryViewSet(viewsets.ModelViewSet):
@@ -674,6 +892,30 @@ class ProjectExpenseCategoryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
     
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """Active categories as a tree with own and subtree totals (?project= limits them to one project)"""
+        project = None
+        project_id = request.query_params.get('project')
+        if project_id:
+            try:
+                project = Project.objects.only('id').get(id=project_id)
+            except (Project.DoesNotExist, ValueError):
+                return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
+            if request.user.role not in ['admin', 'accountant'] and not is_project_member(request, project.id):
+                return Response(
+                    {'error': 'You do not have access to this project'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        
+        tree = category_tree(project)
+        serializer = self.get_serializer(
+            tree['children'].get(None, []),
+            many=True,
+            context={**self.get_serializer_context(), 'category_tree': tree, 'project': project}
+        )
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['post'])
     def create_defaults(self, request):
         """Create default expense categories"""
@@ -713,15 +955,34 @@ class ProjectExpenseViewSet(viewsets.ModelViewSet):
         # Apply user-based filtering
         if user.role not in ['admin', 'accountant']:
             # Users can only see expenses from projects they're associated with
-            accessible_projects = Project.objects.filter(
-                Q(assigned_users=user) | Q(project_manager=user) | Q(created_by=user)
-            ).distinct()
-            queryset = queryset.filter(project__in=accessible_projects)
+            queryset = member_projects(self.request, queryset, field='project_id')
         
         return queryset
     
+    def _publish(self, verb, instance, changes=None):
+        publish(
+            f'expense.{verb}',
+            user=self.request.user,
+            instance=instance,
+            description=f'{verb.capitalize()} expense {instance.expense_number}',
+            changes=changes,
+        )
+    
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+        self._publish('created', serializer.instance)
+    
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        serializer.save()
+        changes = None
+        if serializer.instance.status != previous_status:
+            changes = {'status': {'old': previous_status, 'new': serializer.instance.status}}
+        self._publish('updated', serializer.instance, changes=changes)
+    
+    def perform_destroy(self, instance):
+        self._publish('deleted', instance)
+        instance.delete()
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -742,6 +1003,7 @@ class ProjectExpenseViewSet(viewsets.ModelViewSet):
             )
         
         expense.approve(request.user)
+        self._publish('approved', expense, changes={'status': {'old': 'pending', 'new': expense.status}})
         serializer = self.get_serializer(expense)
         return Response({
             'message': 'Expense approved successfully',
@@ -767,6 +1029,7 @@ class ProjectExpenseViewSet(viewsets.ModelViewSet):
             )
         
         expense.reject()
+        self._publish('rejected', expense, changes={'status': {'old': 'pending', 'new': expense.status}})
         serializer = self.get_serializer(expense)
         return Response({
             'message': 'Expense rejected',
@@ -797,6 +1060,7 @@ class ProjectExpenseViewSet(viewsets.ModelViewSet):
                 from datetime import datetime
                 payment_date = datetime.strptime(payment_date, '%Y-%m-%d').date()
             expense.mark_as_paid(payment_date)
+            self._publish('paid', expense, changes={'status': {'old': 'approved', 'new': expense.status}})
             
             serializer = self.get_serializer(expense)
             return Response({
@@ -809,6 +1073,16 @@ class ProjectExpenseViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Approve, reject or mark paid many expenses in one UPDATE (see api.transitions)"""
+        if request.user.role not in ['admin', 'accountant']:
+            return Response(
+                {'error': 'You do not have permission to approve, reject or pay expenses'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return bulk_transition_response(request, 'project_expense')
+    
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Get expense summary for a project or all projects"""
@@ -816,83 +1090,21 @@ class ProjectExpenseViewSet(viewsets.ModelViewSet):
         
         if project_id:
             try:
-                project = Project.objects.get(id=project_id)
+                project = Project.objects.only('id', 'name', 'currency').get(id=project_id)
                 
                 # Check access permissions
                 user = request.user
                 if user.role not in ['admin', 'accountant']:
-                    accessible_projects = Project.objects.filter(
-                        Q(assigned_users=user) | Q(project_manager=user) | Q(created_by=user)
-                    ).distinct()
-                    if project not in accessible_projects:
+                    if not is_project_member(request, project.id):
                         return Response(
                             {'error': 'You do not have access to this project'},
                             status=status.HTTP_403_FORBIDDEN
                         )
                 
-                # Get expenses for the project
-                expenses = project.expenses.all()
-                
-                # Calculate totals
-                total_expenses = expenses.aggregate(
-                    total=Sum('total_amount')
-                )['total'] or 0
-                
-                total_pending = expenses.filter(status='pending').aggregate(
-                    total=Sum('total_amount')
-                )['total'] or 0
-                
-                total_approved = expenses.filter(status='approved').aggregate(
-                    total=Sum('total_amount')
-                )['total'] or 0
-                
-                total_paid = expenses.filter(status='paid').aggregate(
-                    total=Sum('total_amount')
-                )['total'] or 0
-                
-                # Get category breakdown
-                expenses_by_category = expenses.filter(status__in=['approved', 'paid']).values(
-                    'category__name'
-                ).annotate(
-                    total=Sum('total_amount'),
-                    count=Count('id')
-                ).order_by('-total')
-                
-                # Get top categories
-                top_categories = list(expenses_by_category[:5])
-                
-                # Get recent expenses
-                recent_expenses = expenses.order_by('-created_at')[:10]
-                
-                # Get currency info
-                currency = project.currency
-                currency_symbol = next(
-                    (symbol for code, name, symbol in getattr(settings, 'CURRENCY_CHOICES', []) if code == currency),
-                    currency
-                )
-                
-                summary_data = {
-                    'project_id': project.id,
-                    'project_name': project.name,
-                    'total_expenses': total_expenses,
-                    'total_pending': total_pending,
-                    'total_approved': total_approved,
-                    'total_paid': total_paid,
-                    'expenses_count': expenses.count(),
-                    'pending_count': expenses.filter(status='pending').count(),
-                    'approved_count': expenses.filter(status='approved').count(),
-                    'paid_count': expenses.filter(status='paid').count(),
-                    'expenses_by_category': list(expenses_by_category),
-                    'top_categories': top_categories,
-                    'recent_expenses': ProjectExpenseListSerializer(recent_expenses, many=True).data,
-                    'currency': currency,
-                    'currency_symbol': currency_symbol,
-                }
-                
-                serializer = ProjectExpenseSummarySerializer(summary_data)
+                serializer = ProjectExpenseSummarySerializer(project_expense_summary(project))
                 return Response(serializer.data)
                 
-            except Project.DoesNotExist:
+            except (Project.DoesNotExist, ValueError):
                 return Response(
                     {'error': 'Project not found'},
                     status=status.HTTP_404_NOT_FOUND
@@ -912,9 +1124,7 @@ class ProjectExpenseViewSet(viewsets.ModelViewSet):
         if user.role in ['admin', 'accountant']:
             projects = Project.objects.all()
         else:
-            projects = Project.objects.filter(
-                Q(assigned_users=user) | Q(project_manager=user) | Q(created_by=user)
-            ).distinct()
+            projects = member_projects(request)
         
         # Get all expenses from accessible projects
         expenses = ProjectExpense.objects.filter(project__in=projects)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
+from django.db import transaction
 from .models import Client, Service, Quotation, QuotationItem, Invoice, InvoiceItem, ActivityLog, NumberSequence, Interaction, ClientAttachment
 
 # Import financial serializers
@@ -230,6 +231,7 @@ class QuotationSerializer(serializers.ModelSerializer):
         from django.conf import settings
         return getattr(settings, 'CURRENCY_CHOICES', [('PKR', 'Pakistani Rupee', 'Rs')])
 
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         quotation = Quotation.objects.create(**validated_data)
@@ -237,6 +239,7 @@ class QuotationSerializer(serializers.ModelSerializer):
             QuotationItem.objects.create(quotation=quotation, **item_data)
         return quotation
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', [])
         
@@ -309,6 +312,10 @@ class InvoiceSerializer(serializers.ModelSerializer):
         from django.conf import settings
         return getattr(settings, 'CURRENCY_CHOICES', [('PKR', 'Pakistani Rupee', 'Rs')])
 
+    # One transaction per write, so the rollups and journal postings the
+    # document and item saves queue are computed once, after commit, even
+    # when the request itself runs in autocommit
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         invoice = Invoice.objects.create(**validated_data)
@@ -316,6 +323,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
             InvoiceItem.objects.create(invoice=invoice, **item_data)
         return invoice
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', [])
         
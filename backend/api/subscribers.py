@@ -0,0 +1,65 @@
+"""
+Domain event handlers. Imported from ApiConfig.ready() so they are
+registered before the first request.
+"""
+from .audit import record_activity
+from .events import subscribe
+from .pdf_cache import PRERENDER_STATUSES, invalidate, schedule_prerender
+
+# Entities audited in FinancialAuditLog rather than ActivityLog
+FINANCIAL_ENTITIES = ('financial_activity', 'financial_attachment', 'financial_account', 'journal_entry')
+
+PDF_DOCUMENTS = ('quotation', 'invoice')
+
+
+@subscribe('*')
+def write_audit_log(event):
+    if event.user is None or not getattr(event.user, 'pk', None):
+        return
+    # Bulk transitions write their audit rows in bulk themselves
+    if event.extra.get('bulk'):
+        return
+
+    if event.entity in FINANCIAL_ENTITIES:
+        from .models import FinancialAuditLog
+        instance = event.instance
+        FinancialAuditLog.objects.create(
+            user=event.user,
+            action=event.action,
+            content_type=event.content_type,
+            object_id=event.object_id,
+            object_representation=str(instance)[:200] if instance is not None else '',
+            field_changes=event.changes,
+            description=event.description,
+            ip_address=event.ip_address,
+            user_agent=event.user_agent or '',
+        )
+        return
+
+    record_activity(event.user, event.action, event.content_type, event.object_id, event.description)
+
+
+# PDF cache: warm it when a document reaches a status it is usually sent in,
+# or is queued for email, and drop stale renders when it is deleted
+
+@subscribe('quotation.*')
+@subscribe('invoice.*')
+def maintain_pdf_cache(event):
+    if event.instance is None:
+        return
+
+    if event.verb == 'deleted':
+        invalidate(event.entity, event.object_id)
+        return
+
+    # Bulk approvals aren't pre-rendered; the stale render is skipped by its fingerprint
+    if event.extra.get('bulk'):
+        return
+
+    if event.verb in ('approved', 'emailed'):
+        schedule_prerender(event.entity, event.instance)
+        return
+
+    status_change = (event.changes or {}).get('status')
+    if event.verb == 'updated' and status_change and status_change['new'] in PRERENDER_STATUSES[event.entity]:
+        schedule_prerender(event.entity, event.instance)
@@ -1,3 +1,553 @@
-from django.test import TestCase
+import datetime
+import io
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import chart_of_accounts, numbering
+from .authentication import ClaimsTokenObtainPairSerializer
+from .account_balances import period_of, rebuild_balances
+from .financial_models import (
+    AccountBalance, FinancialAccount, FinancialActivity, JournalEntry, JournalEntryLine, PendingPosting,
+)
+from .ledger import account_ledger, trial_balance
+from .models import ActivityLog, Client, Invoice, InvoiceItem, Service, User
+from .posting import default_account_ids, post_entries, sync_postings
+from .project_models import Project, ProjectNote
+from .project_sections import get_sections
+from .transitions import MAX_BATCH_SIZE, bulk_transition
+
+BLOCK_NUMBERING = {'invoice': {'mode': 'block'}}
+INVOICE_DATE = datetime.date(2030, 1, 15)
+
+
+def setUpModule():
+    # Keep PDFs rendered by event subscribers out of the real media directory
+    global _pdf_cache_dir, _pdf_cache_settings
+    _pdf_cache_dir = tempfile.TemporaryDirectory()
+    _pdf_cache_settings = override_settings(PDF_CACHE_PATH=_pdf_cache_dir.name)
+    _pdf_cache_settings.enable()
+
+
+def tearDownModule():
+    _pdf_cache_settings.disable()
+    _pdf_cache_dir.cleanup()
+
+
+class Rollback(Exception):
+    pass
+
+
+class NumberingRollbackTests(TestCase):
+    def setUp(self):
+        numbering.reset_process_state()
+        self.addCleanup(numbering.reset_process_state)
+
+    def allocate_and_roll_back(self):
+        try:
+            with transaction.atomic():
+                number = numbering.allocate('invoice', INVOICE_DATE)
+                raise Rollback
+        except Rollback:
+            pass
+        return number
+
+    def test_gapless_rollback_gives_the_number_back(self):
+        self.assertEqual(self.allocate_and_roll_back(), 'INV-203001-0001')
+        self.assertEqual(numbering.current_value('invoice', INVOICE_DATE), 0)
+        self.assertEqual(numbering.allocate('invoice', INVOICE_DATE), 'INV-203001-0001')
+        self.assertEqual(numbering.allocate('invoice', INVOICE_DATE), 'INV-203001-0002')
+
+    @override_settings(DOCUMENT_NUMBERING=BLOCK_NUMBERING, NUMBERING_BLOCK_SIZE=5)
+    def test_block_rolled_back_with_the_transaction_is_not_reused(self):
+        # SQLite reserves inside the caller's transaction, so the block rolls back with it
+        self.assertEqual(self.allocate_and_roll_back(), 'INV-203001-0001')
+        self.assertEqual(numbering.current_value('invoice', INVOICE_DATE), 0)
+
+        numbers = []
+        for _ in range(7):
+            with self.captureOnCommitCallbacks(execute=True):
+                numbers.append(numbering.allocate('invoice', INVOICE_DATE))
+
+        self.assertEqual(numbers, [f'INV-203001-{seq:04d}' for seq in range(1, 8)])
+        self.assertEqual(numbering.current_value('invoice', INVOICE_DATE), 10)
+
+    @override_settings(DOCUMENT_NUMBERING=BLOCK_NUMBERING, NUMBERING_BLOCK_SIZE=5)
+    def test_block_is_not_cached_before_commit(self):
+        numbers = [numbering.allocate('invoice', INVOICE_DATE) for _ in range(2)]
+
+        # Each allocation in the still-open transaction reserved a block of its own
+        self.assertEqual(numbers, ['INV-203001-0001', 'INV-203001-0006'])
+        self.assertEqual(numbering.current_value('invoice', INVOICE_DATE), 10)
+
+
+@override_settings(DOCUMENT_NUMBERING=BLOCK_NUMBERING, NUMBERING_BLOCK_SIZE=5)
+class NumberingConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        numbering.reset_process_state()
+        self.addCleanup(numbering.reset_process_state)
+
+    def run_threads(self, target, count):
+        errors = []
+
+        def run():
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertFalse(any(thread.is_alive() for thread in threads), 'allocation deadlocked')
+        self.assertEqual(errors, [])
+
+    def test_concurrent_block_allocation_hands_out_unique_numbers(self):
+        numbers = []
+        lock = threading.Lock()
+
+        def allocate_many():
+            allocated = [numbering.allocate('invoice', INVOICE_DATE) for _ in range(12)]
+            with lock:
+                numbers.extend(allocated)
+
+        self.run_threads(allocate_many, 4)
+
+        self.assertEqual(len(numbers), 48)
+        self.assertEqual(len(set(numbers)), 48)
+        self.assertEqual(numbering.current_value('invoice', INVOICE_DATE), 50)
+
+    def test_block_refill_inside_a_transaction_does_not_deadlock(self):
+        numbers = []
+
+        def allocate_in_transaction():
+            # Take the side-connection path used on Postgres and MySQL
+            with mock.patch.object(connections['default'], 'vendor', 'postgresql'), transaction.atomic():
+                numbers.extend(numbering.allocate('invoice', INVOICE_DATE) for _ in range(7))
+
+        self.run_threads(allocate_in_transaction, 1)
+
+        self.assertEqual(numbers, [f'INV-203001-{seq:04d}' for seq in range(1, 8)])
+
+
+class BulkTransitionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('accounts', password='x', role='admin')
+        self.client_record = Client.objects.create(name='Acme', email='acme@example.com', phone='1', address='Street 1')
+        self.invoices = {
+            status: Invoice.objects.create(
+                client=self.client_record, date=INVOICE_DATE, due_date=INVOICE_DATE, status=status, created_by=self.user,
+            )
+            for status in ('draft', 'sent', 'paid')
+        }
+
+    def test_results_per_id(self):
+        draft, sent, paid = self.invoices['draft'], self.invoices['sent'], self.invoices['paid']
+
+        with mock.patch('api.transitions.publish') as publish:
+            outcome = bulk_transition('invoice', 'approve', [draft.pk, sent.pk, paid.pk, draft.pk, 0], self.user)
+
+        self.assertEqual(outcome['updated'], 2)
+        self.assertEqual(outcome['results'], [
+            {'id': draft.pk, 'result': 'updated', 'from': 'draft', 'to': 'approved'},
+            {'id': sent.pk, 'result': 'updated', 'from': 'sent', 'to': 'approved'},
+            {'id': paid.pk, 'result': 'invalid_state', 'status': 'paid'},
+            {'id': 0, 'result': 'not_found'},
+        ])
+        self.assertEqual(
+            dict(Invoice.objects.values_list('pk', 'status')),
+            {draft.pk: 'approved', sent.pk: 'approved', paid.pk: 'paid'},
+        )
+        self.assertEqual(Invoice.objects.get(pk=draft.pk).approved_by, self.user)
+        self.assertEqual(
+            sorted(ActivityLog.objects.filter(content_type='invoice', action='approve').values_list('object_id', flat=True)),
+            [draft.pk, sent.pk],
+        )
+
+        self.assertEqual([call.args[0] for call in publish.call_args_list], ['invoice.approved', 'invoice.approved'])
+        events = {call.kwargs['instance'].pk: call.kwargs for call in publish.call_args_list}
+        self.assertEqual(set(events), {draft.pk, sent.pk})
+        self.assertEqual(events[sent.pk]['instance'].status, 'approved')
+        self.assertEqual(events[sent.pk]['changes']['status'], {'old': 'sent', 'new': 'approved'})
+        self.assertTrue(events[sent.pk]['bulk'])
+
+    @override_settings(AUDIT_LOG_ASYNC=False)
+    def test_bulk_events_are_not_audited_twice(self):
+        bulk_transition('invoice', 'mark_paid', [self.invoices['sent'].pk], self.user)
+
+        self.assertEqual(ActivityLog.objects.filter(object_id=self.invoices['sent'].pk).count(), 1)
+
+    def test_invalid_requests(self):
+        ids = [self.invoices['draft'].pk]
+        for entity, name, ids, message in (
+            ('invoice', 'archive', ids, "Unknown transition 'archive'"),
+            ('financial_activity', 'reject', ids, 'A reason is required'),
+            ('invoice', 'approve', [], 'ids must be a non-empty list'),
+            ('invoice', 'approve', ['x'], 'ids must be integers'),
+            ('invoice', 'approve', list(range(MAX_BATCH_SIZE + 1)), f'At most {MAX_BATCH_SIZE} ids'),
+        ):
+            with self.subTest(name=name, ids=ids[:2]), self.assertRaisesMessage(ValueError, message):
+                bulk_transition(entity, name, ids, self.user)
+        self.assertEqual(Invoice.objects.get(pk=self.invoices['draft'].pk).status, 'draft')
+
+
+class PostingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('poster', password='x', role='admin')
+        cls.client_record = Client.objects.create(name='Acme', email='acme@example.com', phone='1', address='Street 1')
+        cls.service = Service.objects.create(name='Survey', description='Site survey', price=Decimal('100'))
+        cls.accounts = default_account_ids()
+
+    def create_invoice(self, status, prices):
+        invoice = Invoice.objects.create(
+            client=self.client_record, date=INVOICE_DATE, due_date=INVOICE_DATE, status=status, created_by=self.user,
+        )
+        for price in prices:
+            InvoiceItem.objects.create(invoice=invoice, service=self.service, price=Decimal(price))
+        return invoice
+
+    def active_entries(self, invoice):
+        return {
+            entry.event: sorted(entry.lines.values_list('account_id', 'debit_amount', 'credit_amount'))
+            for entry in JournalEntry.objects.filter(
+                source_type='invoice', source_id=invoice.pk, reverses__isnull=True, reversal__isnull=True
+            )
+        }
+
+    def balances(self):
+        return {
+            (row.account_id, row.period): (row.debit_total, row.credit_total)
+            for row in AccountBalance.objects.all()
+        }
+
+    def assert_journal_consistent(self):
+        for entry in JournalEntry.objects.annotate(debits=Sum('lines__debit_amount'), credits=Sum('lines__credit_amount')):
+            self.assertEqual(entry.debits, entry.credits, entry.description)
+        incremental = self.balances()
+        rebuild_balances()
+        self.assertEqual(incremental, self.balances())
+
+    def test_post_entries_rejects_invalid_entries(self):
+        receivable, revenue = self.accounts[chart_of_accounts.RECEIVABLE], self.accounts[chart_of_accounts.REVENUE]
+
+        def entry(*lines):
+            return (
+                JournalEntry(reference_number=f'JE-TEST-{len(lines)}', description='Test', transaction_date=INVOICE_DATE,
+                             created_by=self.user),
+                [JournalEntryLine(account_id=account, debit_amount=Decimal(debit), credit_amount=Decimal(credit))
+                 for account, debit, credit in lines],
+            )
+
+        balanced = entry((receivable, '10', '0'), (revenue, '0', '10'))
+        for invalid, message in (
+            (entry(), 'has no lines'),
+            (entry((receivable, '10', '0'), (revenue, '0', '9')), 'is unbalanced'),
+            (entry((receivable, '10', '10'), (revenue, '0', '0')), 'not a single debit or credit'),
+            (entry((receivable, '-10', '0'), (revenue, '0', '-10')), 'not a single debit or credit'),
+        ):
+            with self.subTest(message=message), self.assertRaisesMessage(ValueError, message):
+                post_entries([balanced, invalid])
+        self.assertFalse(JournalEntry.objects.exists())
+        self.assertFalse(AccountBalance.objects.exists())
+
+        post_entries([balanced])
+        self.assertEqual(
+            self.balances(),
+            {(receivable, period_of(INVOICE_DATE)): (Decimal('10'), Decimal('0')),
+             (revenue, period_of(INVOICE_DATE)): (Decimal('0'), Decimal('10'))},
+        )
+
+    def test_invoice_postings_follow_its_state(self):
+        receivable = self.accounts[chart_of_accounts.RECEIVABLE]
+        revenue = self.accounts[chart_of_accounts.REVENUE]
+        cash = self.accounts[chart_of_accounts.CASH]
+        invoice = self.create_invoice('sent', ['100.00', '50.00'])
+
+        self.assertEqual(sync_postings('invoice', [invoice.pk]), {'posted': 1, 'reversed': 0})
+        self.assertEqual(self.active_entries(invoice), {
+            'recognition': [(receivable, Decimal('150.00'), Decimal('0')), (revenue, Decimal('0'), Decimal('150.00'))],
+        })
+        # Nothing changed, nothing posted
+        self.assertEqual(sync_postings('invoice', [invoice.pk]), {'posted': 0, 'reversed': 0})
+
+        invoice.items.update(price=Decimal('60.00'))
+        self.assertEqual(sync_postings('invoice', [invoice.pk]), {'posted': 1, 'reversed': 1})
+        self.assertEqual(self.active_entries(invoice)['recognition'][0], (receivable, Decimal('120.00'), Decimal('0')))
+
+        invoice.status = 'paid'
+        invoice.save()
+        self.assertEqual(sync_postings('invoice', [invoice.pk]), {'posted': 1, 'reversed': 0})
+        self.assertEqual(self.active_entries(invoice)['settlement'], [
+            (cash, Decimal('120.00'), Decimal('0')), (receivable, Decimal('0'), Decimal('120.00')),
+        ])
+        self.assert_journal_consistent()
+
+        invoice_id = invoice.pk
+        invoice.delete()
+        self.assertEqual(sync_postings('invoice', [invoice_id]), {'posted': 0, 'reversed': 2})
+        self.assertEqual(JournalEntry.objects.filter(source_type='invoice', source_id=invoice_id).count(), 6)
+        self.assert_journal_consistent()
+        # Reversals are dated today, so the invoice's accounts only net to zero across periods
+        for account_id, debit, credit in AccountBalance.objects.values('account_id').annotate(
+            debit=Sum('debit_total'), credit=Sum('credit_total')
+        ).values_list('account_id', 'debit', 'credit'):
+            self.assertEqual(debit, credit, account_id)
+
+    def test_draft_invoice_posts_nothing(self):
+        invoice = self.create_invoice('draft', ['100.00'])
+
+        self.assertEqual(sync_postings('invoice', [invoice.pk]), {'posted': 0, 'reversed': 0})
+        self.assertFalse(JournalEntry.objects.exists())
+
+    def test_deleted_activity_keeps_its_entries_and_reverses_them(self):
+        activity = FinancialActivity.objects.create(
+            activity_type='income', amount=Decimal('75.00'), client=self.client_record, description='Consulting',
+            account_id=self.accounts[chart_of_accounts.REVENUE], transaction_date=INVOICE_DATE, status='approved',
+            created_by=self.user,
+        )
+        self.assertEqual(sync_postings('financial_activity', [activity.pk]), {'posted': 1, 'reversed': 0})
+
+        activity_id = activity.pk
+        activity.delete()
+        self.assertEqual(sync_postings('financial_activity', [activity_id]), {'posted': 0, 'reversed': 1})
+
+        entries = JournalEntry.objects.filter(source_type='financial_activity', source_id=activity_id)
+        self.assertEqual(entries.count(), 2)
+        self.assertFalse(entries.filter(financial_activity__isnull=False).exists())
+        self.assert_journal_consistent()
+
+    def test_failed_postings_are_kept_for_retry(self):
+        with mock.patch('api.posting.post_entries', side_effect=ValueError('boom')), \
+                self.assertLogs('api.posting', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            invoice = self.create_invoice('sent', ['100.00'])
+
+        self.assertFalse(JournalEntry.objects.exists())
+        pending = PendingPosting.objects.get()
+        self.assertEqual((pending.source_type, pending.source_id, pending.attempts), ('invoice', invoice.pk, 1))
+        self.assertIn('boom', pending.last_error)
+
+        call_command('retry_postings', stdout=io.StringIO())
+
+        self.assertFalse(PendingPosting.objects.exists())
+        self.assertEqual(list(self.active_entries(invoice)), ['recognition'])
+
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('ledger', password='x', role='admin')
+        accounts = default_account_ids()
+        cls.cash = FinancialAccount.objects.get(pk=accounts[chart_of_accounts.CASH])
+        cls.revenue = FinancialAccount.objects.get(pk=accounts[chart_of_accounts.REVENUE])
+
+        entries = []
+        # Several lines per day across three months, so pages split days and months
+        for number, day in enumerate([datetime.date(2030, month, day) for month in (1, 2, 3) for day in (3, 3, 17)]):
+            amount = Decimal(10 * (number + 1))
+            debit, credit = (cls.cash, cls.revenue) if number % 4 else (cls.revenue, cls.cash)
+            entries.append((
+                JournalEntry(reference_number=f'JE-LEDGER-{number}', description=f'Entry {number}',
+                             transaction_date=day, created_by=user),
+                [JournalEntryLine(account=debit, debit_amount=amount, credit_amount=Decimal('0')),
+                 JournalEntryLine(account=credit, debit_amount=Decimal('0'), credit_amount=amount)],
+            ))
+        post_entries(entries)
+
+    def pages(self, account, limit, **kwargs):
+        pages, cursor = [], None
+        while True:
+            page = account_ledger(account, cursor=cursor, limit=limit, **kwargs)
+            pages.append(page)
+            cursor = page['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_pages_continue_where_the_previous_one_ended(self):
+        whole = account_ledger(self.cash, limit=100)
+        self.assertIsNone(whole['next_cursor'])
+        self.assertEqual(len(whole['results']), 9)
+
+        for limit in (1, 2, 4):
+            with self.subTest(limit=limit):
+                pages = self.pages(self.cash, limit)
+                self.assertEqual([row for page in pages for row in page['results']], whole['results'])
+                for previous, page in zip(pages, pages[1:]):
+                    self.assertEqual(page['opening_balance'], previous['closing_balance'])
+                self.assertEqual(pages[-1]['closing_balance'], whole['closing_balance'])
+
+    def test_running_balance_and_opening_balance_before_start(self):
+        whole = account_ledger(self.cash, limit=100)
+        balance = Decimal('0')
+        for row in whole['results']:
+            balance += row['debit'] - row['credit']
+            self.assertEqual(row['balance'], balance)
+
+        start = datetime.date(2030, 2, 17)
+        before = [row for row in whole['results'] if row['date'] < start]
+        pages = self.pages(self.cash, 2, start=start, end=datetime.date(2030, 3, 3))
+        self.assertEqual(pages[0]['opening_balance'], before[-1]['balance'])
+        self.assertEqual(
+            [row['id'] for page in pages for row in page['results']],
+            [row['id'] for row in whole['results'] if start <= row['date'] <= datetime.date(2030, 3, 3)],
+        )
+
+    def test_credit_normal_account_balance(self):
+        page = account_ledger(self.revenue, limit=100)
+        credits = sum(row['credit'] - row['debit'] for row in page['results'])
+        self.assertEqual(page['closing_balance'], credits)
+        self.assertGreater(credits, 0)
+
+    def test_invalid_cursor(self):
+        cursor = account_ledger(self.cash, limit=1)['next_cursor']
+        for bad in ('garbage', cursor + 'x'):
+            with self.subTest(cursor=bad), self.assertRaisesMessage(ValueError, 'Invalid cursor'):
+                account_ledger(self.cash, cursor=bad)
+        # A cursor only pages the account it was issued for
+        with self.assertRaisesMessage(ValueError, 'Invalid cursor'):
+            account_ledger(self.revenue, cursor=cursor)
+
+    def test_trial_balance(self):
+        result = trial_balance(datetime.date(2030, 2, 28))
+
+        self.assertTrue(result['is_balanced'])
+        self.assertEqual(
+            {row['code']: row['total_debits'] + row['total_credits'] for row in result['accounts']},
+            {'1000': Decimal('210'), '4000': Decimal('210')},
+        )
+
+
+class BulkAssignRoleTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('boss', password='x', role='admin')
+        self.users = [User.objects.create_user(f'staff{n}', password='x', role='viewer') for n in range(3)]
+        self.api = APIClient(HTTP_HOST='localhost')
+        self.api.force_authenticate(self.admin)
+
+    def assign(self, ids, role='accountant'):
+        return self.api.post('/api/users/bulk_assign_role/', {'ids': ids, 'role': role}, format='json')
+
+    def test_logs_each_role_change(self):
+        self.users[2].role = 'accountant'
+        self.users[2].save()
+
+        response = self.assign([user.id for user in self.users])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(set(User.objects.filter(role='accountant').values_list('id', flat=True)),
+                         {user.id for user in self.users})
+        # Their outstanding access tokens are revoked
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).auth_version, 1)
+        self.assertEqual(
+            sorted(ActivityLog.objects.filter(content_type='user').values_list('object_id', 'description')),
+            [(user.id, f'Changed role of {user.username} from viewer to accountant (bulk)') for user in self.users[:2]],
+        )
+
+    def test_invalid_ids(self):
+        for ids, message in (
+            ([str(self.admin.id)], 'Cannot change your own role'),
+            (['x'], 'ids must be integers'),
+            ([], 'ids must be a non-empty list'),
+            ('1,2', 'ids must be a non-empty list'),
+        ):
+            with self.subTest(ids=ids):
+                response = self.assign(ids, role='viewer')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], message)
+        self.assertEqual(User.objects.get(pk=self.admin.pk).role, 'admin')
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('clerk', password='x', role='accountant')
+        self.api = APIClient(HTTP_HOST='localhost')
+
+    def get_clients(self, token):
+        return self.api.get('/api/clients/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def access_token(self):
+        return ClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def test_deactivation_revokes_access_tokens(self):
+        token = self.access_token()
+        self.assertEqual(self.get_clients(token).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.get_clients(token).status_code, 401)
+
+    def test_role_change_revokes_access_tokens(self):
+        token = self.access_token()
+        self.assertEqual(self.get_clients(token).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = 'viewer'
+            self.user.save(update_fields=['role'])
+
+        self.assertEqual(self.get_clients(token).status_code, 401)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.auth_version, 1)
+        self.assertEqual(self.get_clients(self.access_token()).status_code, 200)
+
+    def test_other_changes_keep_tokens_valid(self):
+        token = self.access_token()
+        self.user.first_name = 'Ada'
+        self.user.save()
+
+        self.assertEqual(self.get_clients(token).status_code, 200)
+
+
+class ProjectSectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('pm', password='x', role='admin')
+        self.client_record = Client.objects.create(name='Acme', email='acme@example.com', phone='1', address='Street 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project = Project.objects.create(
+                name='Tower', project_number='P-1', client=self.client_record,
+                start_date=INVOICE_DATE, created_by=self.user,
+            )
+
+    def sections(self, *names):
+        return get_sections(Project.objects.select_related('financials').get(pk=self.project.pk), names)
+
+    def test_writes_retire_cached_sections_without_deleting_them(self):
+        self.assertEqual(self.sections('financials')['financials']['invoices_count'], 0)
+        self.assertEqual(self.sections('notes')['notes'], [])
+        cached_keys = set(cache._cache)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Invoice.objects.create(
+                client=self.client_record, project=self.project, date=INVOICE_DATE, due_date=INVOICE_DATE,
+                created_by=self.user,
+            )
+            ProjectNote.objects.create(project=self.project, content='Poured slab', created_by=self.user)
+
+        # The old entries are still there, as they would be in another worker's LocMemCache
+        self.assertLessEqual(cached_keys, set(cache._cache))
+        sections = self.sections('financials', 'notes')
+        self.assertEqual(sections['financials']['invoices_count'], 1)
+        self.assertEqual([note['content'] for note in sections['notes']], ['Poured slab'])
+
+    def test_counts_come_from_the_rollup(self):
+        self.sections('financials')
+        project = Project.objects.select_related('financials').get(pk=self.project.pk)
+        with self.assertNumQueries(1):
+            # Only the version lookup; the section is served from the cache
+            get_sections(project, ['financials'])
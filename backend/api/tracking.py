@@ -0,0 +1,73 @@
+"""
+Dirty-field tracking for audited models.
+
+TrackedFieldsMixin snapshots the raw column values of an instance when it
+is loaded from the database and, after save(), exposes a compact
+``{field: {'old': ..., 'new': ...}}`` diff in ``saved_changes``. Audit
+trails can use the diff directly instead of serializing the instance
+before and after the write.
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+
+def _jsonable(value):
+    """Convert a raw field value into something JSONField can store"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class TrackedFieldsMixin:
+    """
+    Mixin for models.Model subclasses. Only fields that were loaded are
+    tracked, so instances fetched with only()/defer() never trigger extra
+    queries. Fields listed in TRACKING_EXCLUDE are ignored.
+    """
+    TRACKING_EXCLUDE = ('created_at', 'updated_at')
+
+    @classmethod
+    def _tracked_fields(cls):
+        return [
+            field for field in cls._meta.concrete_fields
+            if not field.primary_key and field.name not in cls.TRACKING_EXCLUDE
+        ]
+
+    def _take_snapshot(self):
+        self._snapshot = {
+            field.name: getattr(self, field.attname)
+            for field in self._tracked_fields()
+            if field.attname in self.__dict__
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def get_changes(self):
+        """Diff of tracked fields changed since the instance was loaded or last saved"""
+        snapshot = getattr(self, '_snapshot', None)
+        if snapshot is None:
+            return {}
+
+        changes = {}
+        for field in self._tracked_fields():
+            if field.name not in snapshot or field.attname not in self.__dict__:
+                continue
+            old, new = snapshot[field.name], getattr(self, field.attname)
+            if old != new:
+                changes[field.name] = {'old': _jsonable(old), 'new': _jsonable(new)}
+        return changes
+
+    def save(self, *args, **kwargs):
+        changes = self.get_changes()
+        super().save(*args, **kwargs)
+        self.saved_changes = changes
+        self._take_snapshot()
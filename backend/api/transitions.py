@@ -0,0 +1,274 @@
+"""
+Bulk status transitions (approve / reject / mark paid) for quotations,
+invoices, project expenses and financial activities.
+
+A batch locks the requested rows, classifies each id (not found, wrong
+source state, eligible) and applies a single
+``UPDATE ... WHERE id IN (...) AND status IN (<allowed sources>)``. Audit
+rows are written with bulk_create - ActivityLog for documents and expenses,
+FinancialAuditLog plus its field-change rows for financial activities -
+instead of one save() and one audit insert per object. One domain event is
+then published per updated row (``invoice.paid``, ``expense.approved``, ...)
+flagged bulk=True, so subscribers see the same events as for single
+transitions while the audit subscriber leaves the rows already written here
+alone.
+
+update() skips save() and model signals, so the ProjectFinancials rollup is
+marked dirty, journal postings are queued (api.posting) and updated_at is
+set explicitly here (PDF cache fingerprints use it). Cached PDFs are not
+pre-rendered for bulk events; they render on first download.
+"""
+from datetime import datetime
+
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from .events import VERB_ACTIONS, client_ip, mark_audited, publish
+from .tracking import _jsonable
+
+MAX_BATCH_SIZE = 1000
+
+# entity -> model, label field, audit table, event/content type name (when it
+# differs from the entity) and allowed transitions. Each
+# transition sets `to` as the status and the `set` fields from a context value
+# ('user', 'now', 'today', 'date', 'reason').
+TRANSITIONS = {
+    'quotation': {
+        'model': 'Quotation',
+        'label': 'number',
+        'audit': 'activity',
+        'transitions': {
+            'approve': {'from': ('draft', 'sent'), 'to': 'approved', 'event': 'approved',
+                        'set': {'approved_by': 'user', 'approved_at': 'now'}},
+            'reject': {'from': ('draft', 'sent'), 'to': 'rejected', 'event': 'rejected'},
+        },
+    },
+    'invoice': {
+        'model': 'Invoice',
+        'label': 'number',
+        'audit': 'activity',
+        'transitions': {
+            'approve': {'from': ('draft', 'sent', 'overdue'), 'to': 'approved', 'event': 'approved',
+                        'set': {'approved_by': 'user', 'approved_at': 'now'}},
+            'mark_paid': {'from': ('sent', 'approved', 'overdue'), 'to': 'paid', 'event': 'paid'},
+            'reject': {'from': ('draft', 'sent', 'approved', 'overdue'), 'to': 'cancelled', 'event': 'rejected'},
+        },
+    },
+    'project_expense': {
+        'model': 'ProjectExpense',
+        'label': 'expense_number',
+        'audit': 'activity',
+        'event_entity': 'expense',
+        'transitions': {
+            'approve': {'from': ('pending',), 'to': 'approved', 'event': 'approved',
+                        'set': {'approved_by': 'user', 'approved_at': 'now'}},
+            'reject': {'from': ('pending',), 'to': 'rejected', 'event': 'rejected'},
+            'mark_paid': {'from': ('approved',), 'to': 'paid', 'event': 'paid',
+                          'set': {'payment_date': 'date'}},
+        },
+    },
+    'financial_activity': {
+        'model': 'FinancialActivity',
+        'label': 'reference_number',
+        'audit': 'financial',
+        'transitions': {
+            'approve': {'from': ('pending',), 'to': 'approved', 'event': 'approved',
+                        'set': {'approved_by': 'user', 'approved_at': 'now'}},
+            'reject': {'from': ('pending',), 'to': 'rejected', 'event': 'rejected',
+                       'set': {'rejection_reason': 'reason'}, 'requires_reason': True},
+            'mark_paid': {'from': ('approved',), 'to': 'paid', 'event': 'paid',
+                          'set': {'paid_date': 'today'}},
+        },
+    },
+}
+
+# Entities whose status feeds ProjectFinancials
+ROLLUP_ENTITIES = ('invoice', 'quotation', 'project_expense')
+
+# Entities with journal entries (api.posting)
+POSTING_ENTITIES = ('invoice', 'project_expense', 'financial_activity')
+
+
+def _clean_ids(ids):
+    if not isinstance(ids, (list, tuple)) or not ids:
+        raise ValueError('ids must be a non-empty list')
+    if len(ids) > MAX_BATCH_SIZE:
+        raise ValueError(f'At most {MAX_BATCH_SIZE} ids per request')
+    try:
+        return list(dict.fromkeys(int(pk) for pk in ids))
+    except (TypeError, ValueError):
+        raise ValueError('ids must be integers')
+
+
+def _describe(entity, transition, label, reason):
+    description = f"{transition['event'].capitalize()} {entity.replace('_', ' ')} {label} (bulk)"
+    if reason:
+        description += f'. Reason: {reason}'
+    return description
+
+
+def _audit_rows(entity, spec, transition, user, updated, changes, reason, request):
+    action = VERB_ACTIONS.get(transition['event'], transition['event'])
+    if spec['audit'] == 'activity':
+        from .models import ActivityLog
+        ActivityLog.objects.bulk_create([
+            ActivityLog(
+                user=user,
+                action=action,
+                content_type=spec.get('event_entity', entity),
+                object_id=obj.pk,
+                description=_describe(entity, transition, getattr(obj, spec['label']), reason),
+            )
+            for obj in updated
+        ])
+        return
+
+    from .models import FinancialAuditFieldChange, FinancialAuditLog
+    logs = FinancialAuditLog.objects.bulk_create([
+        FinancialAuditLog(
+            user=user,
+            action=action,
+            content_type=entity,
+            object_id=obj.pk,
+            object_representation=str(obj)[:200],
+            field_changes=changes[obj.pk],
+            description=_describe(entity, transition, getattr(obj, spec['label']), reason),
+            ip_address=client_ip(request) if request is not None else None,
+            user_agent=request.META.get('HTTP_USER_AGENT', '') if request is not None else '',
+        )
+        for obj in updated
+    ])
+    FinancialAuditFieldChange.objects.bulk_create(
+        [row for log in logs for row in FinancialAuditFieldChange.rows_for(log)]
+    )
+
+
+def bulk_transition(entity, name, ids, user, reason='', date=None, request=None):
+    """
+    Apply transition `name` to the `entity` rows in `ids`.
+
+    Returns {'transition', 'to', 'updated', 'results'}; results has one entry
+    per id with result 'updated', 'not_found' or 'invalid_state'. Raises
+    ValueError for an unknown transition or malformed input.
+    """
+    spec = TRANSITIONS[entity]
+    transition = spec['transitions'].get(name)
+    if transition is None:
+        raise ValueError(f"Unknown transition '{name}'. Valid: {', '.join(spec['transitions'])}")
+    if transition.get('requires_reason') and not reason:
+        raise ValueError('A reason is required')
+    ids = _clean_ids(ids)
+
+    model = apps.get_model('api', spec['model'])
+    now = timezone.now()
+    context = {
+        'user': user,
+        'now': now,
+        'today': timezone.localdate(now),
+        'date': date or timezone.localdate(now),
+        'reason': reason,
+    }
+    values = {'status': transition['to']}
+    values.update({field: context[token] for field, token in transition.get('set', {}).items()})
+
+    with transaction.atomic():
+        rows = {obj.pk: obj for obj in model.objects.select_for_update().filter(pk__in=ids)}
+        previous = {pk: obj.status for pk, obj in rows.items()}
+        eligible = [obj for obj in rows.values() if obj.status in transition['from']]
+
+        updated_count = 0
+        if eligible:
+            update = dict(values)
+            if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+                update['updated_at'] = now
+            updated_count = model.objects.filter(
+                pk__in=[obj.pk for obj in eligible], status__in=transition['from']
+            ).update(**update)
+
+        # Field-level diff per row, in the TrackedFieldsMixin format
+        changes = {}
+        for obj in eligible:
+            diff = {}
+            for field_name, value in values.items():
+                field = model._meta.get_field(field_name)
+                old = getattr(obj, field.attname)
+                new = value.pk if field.is_relation and value is not None else value
+                if old != new:
+                    diff[field_name] = {'old': _jsonable(old), 'new': _jsonable(new)}
+            changes[obj.pk] = diff
+            # Bring the instance in line with the row for the event subscribers
+            for field_name, value in values.items():
+                setattr(obj, field_name, value)
+            if 'updated_at' in update:
+                obj.updated_at = now
+
+        if eligible:
+            _audit_rows(entity, spec, transition, user, eligible, changes, reason, request)
+            if entity in ROLLUP_ENTITIES:
+                from .project_financials import mark_dirty
+                mark_dirty(projects=[obj.project_id for obj in eligible])
+            if entity in POSTING_ENTITIES:
+                from .posting import queue_postings
+                queue_postings(entity, [obj.pk for obj in eligible])
+            event_entity = spec.get('event_entity', entity)
+            for obj in eligible:
+                publish(
+                    f"{event_entity}.{transition['event']}",
+                    user=user,
+                    instance=obj,
+                    description=_describe(entity, transition, getattr(obj, spec['label']), reason),
+                    changes=changes[obj.pk],
+                    request=request,
+                    bulk=True,
+                )
+        mark_audited(f"{entity}.bulk_{transition['event']}")
+
+    results = []
+    for pk in ids:
+        if pk not in previous:
+            results.append({'id': pk, 'result': 'not_found'})
+        elif previous[pk] in transition['from']:
+            results.append({'id': pk, 'result': 'updated', 'from': previous[pk], 'to': transition['to']})
+        else:
+            results.append({'id': pk, 'result': 'invalid_state', 'status': previous[pk]})
+
+    return {
+        'transition': name,
+        'to': transition['to'],
+        'updated': updated_count,
+        'results': results,
+    }
+
+
+def bulk_transition_response(request, entity):
+    """
+    Shared body of the viewsets' bulk_transition actions. Expects
+    {"ids": [...], "transition": "approve", "reason": "...", "payment_date": "YYYY-MM-DD"}.
+    """
+    from rest_framework import status
+    from rest_framework.response import Response
+
+    payment_date = request.data.get('payment_date')
+    if payment_date:
+        try:
+            payment_date = datetime.strptime(payment_date, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Invalid payment date format. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    try:
+        outcome = bulk_transition(
+            entity,
+            request.data.get('transition'),
+            request.data.get('ids'),
+            request.user,
+            reason=request.data.get('reason', ''),
+            date=payment_date or None,
+            request=request,
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(outcome)
@@ -11,7 +11,8 @@ from .views import (
 from .financial_views import (
     FinancialAccountViewSet, FinancialActivityViewSet, FinancialAttachmentViewSet,
     FinancialAuditLogViewSet, financial_dashboard, generate_balance_sheet,
-    export_financial_report, simple_export_test, get_approved_quotations
+    export_financial_report, simple_export_test, get_approved_quotations,
+    account_ledger, trial_balance
 )
 from .project_views import (
     ProjectViewSet, ProjectAssignmentViewSet, ProjectAttachmentViewSet,
@@ -61,6 +62,8 @@ urlpatterns = [
     path('simple-export/', simple_export_test, name='simple_export'),
     path('export-financial-report/', export_financial_report, name='export_financial_report'),
     path('approved-quotations/', get_approved_quotations, name='approved_quotations'),
+    path('ledger/<int:account_id>/', account_ledger, name='account_ledger'),
+    path('trial-balance/', trial_balance, name='trial_balance'),
     
     # New Chart Data endpoints
     path('financial-charts/', financial_charts_data, name='financial_charts_data'),
@@ -10,6 +10,7 @@ from django.template.loader import render_to_string
 from django.utils import timezone
 from io import BytesIO
 from decimal import Decimal
+from functools import lru_cache
 import os
 from datetime import datetime, timedelta
 
@@ -166,9 +167,48 @@ class BottomFooter(Flowable):
         # Draw the footer centered at bottom
         footer_para.drawOn(canv, footer_x, footer_y)
 
-def generate_pdf(doc_type, instance):
+# Logo box on the PDF header, in points
+LOGO_WIDTH = 140
+LOGO_HEIGHT = 80
+# Pixels per point kept when downsampling the logo - 2x stays sharp when printed
+LOGO_RENDER_SCALE = 2
+
+@lru_cache(maxsize=8)
+def _downsampled_logo(logo_path, mtime):
+    """
+    PNG bytes of the logo resized to the header box. Cached per file version,
+    so the source image (3375px square for the default logo) is decoded once
+    per process instead of being embedded at full size in every PDF.
+    """
+    from PIL import Image as PILImage
+
+    with PILImage.open(logo_path) as source:
+        ratio = min(LOGO_WIDTH / source.width, LOGO_HEIGHT / source.height)
+        size = (
+            max(1, round(source.width * ratio * LOGO_RENDER_SCALE)),
+            max(1, round(source.height * ratio * LOGO_RENDER_SCALE)),
+        )
+        if size[0] >= source.width:
+            with open(logo_path, 'rb') as f:
+                return f.read()
+        resized = source.convert('RGBA' if 'A' in source.getbands() else 'RGB').resize(size, PILImage.LANCZOS)
+
+    output = BytesIO()
+    resized.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+def load_logo(logo_path, optimize=True):
+    """Logo flowable for the PDF header, downsampled unless optimize is False"""
+    if optimize:
+        data = _downsampled_logo(logo_path, os.path.getmtime(logo_path))
+        return Image(BytesIO(data), width=LOGO_WIDTH, height=LOGO_HEIGHT, kind='proportional')
+    return Image(logo_path, width=LOGO_WIDTH, height=LOGO_HEIGHT, kind='proportional')
+
+def generate_pdf(doc_type, instance, optimize_assets=True):
     """
     Generate PDF for quotation or invoice - Professional Layout with Fixed Footer
+    optimize_assets=False renders the legacy output (full-size logo,
+    compression left to rl_config) for size comparisons.
     """
     buffer = BytesIO()
     
@@ -180,7 +220,9 @@ def generate_pdf(doc_type, instance):
         leftMargin=35,
         topMargin=35,
         bottomMargin=60,  # Standard bottom margin
-        showBoundary=0
+        showBoundary=0,
+        # Pin stream compression on rather than relying on reportlab's rl_config default
+        pageCompression=1 if optimize_assets else None,
     )
     
     # Create single frame for content
@@ -226,7 +268,7 @@ def generate_pdf(doc_type, instance):
             try:
                 # Scale logo to 140px width with proportional height for better visibility
                 # The logo will maintain aspect ratio and fit nicely in the header
-                logo = Image(logo_path, width=140, height=80, kind='proportional')
+                logo = load_logo(logo_path, optimize=optimize_assets)
                 logo_element = logo
                 logo_loaded = True
                 break
@@ -877,9 +919,19 @@ def send_email_with_pdf(doc_type, instance, recipient_email, custom_message=''):
     """
     Send email with PDF attachment
     """
-    # Generate PDF
-    pdf_content = generate_pdf(doc_type, instance)
-    
+    email = build_document_email(doc_type, instance, recipient_email, custom_message)
+    email.send()
+
+    return True
+
+def build_document_email(doc_type, instance, recipient_email, custom_message='', pdf_content=None, connection=None):
+    """
+    Build the email for a quotation or invoice with its PDF attached.
+    Pass an open mail connection to send several messages over one session.
+    """
+    if pdf_content is None:
+        pdf_content = generate_pdf(doc_type, instance)
+
     # Email subject and content
     subject = f"{doc_type.title()} #{instance.number} from {settings.COMPANY_INFO['name']}"
     
@@ -910,16 +962,14 @@ def send_email_with_pdf(doc_type, instance, recipient_email, custom_message=''):
         body=email_body,
         from_email=settings.DEFAULT_FROM_EMAIL,
         to=[recipient_email],
+        connection=connection,
     )
-    
+
     # Attach PDF
     filename = f"{doc_type}_{instance.number}.pdf"
     email.attach(filename, pdf_content, 'application/pdf')
-    
-    # Send email
-    email.send()
-    
-    return True
+
+    return email
 
 def save_pdf_to_media(doc_type, instance):
     """
@@ -4,13 +4,16 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
-from django.contrib.auth import authenticate
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.http import HttpResponse
 from django.conf import settings
-from django.db.models import Q, Sum, Count
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, prefetch_related_objects
 from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
 from django.utils import timezone
 from datetime import timedelta, datetime
 import os
@@ -24,47 +27,38 @@ from .serializers import (
 )
 from .permissions import RoleBasedPermission
 from .utils import generate_pdf, send_email_with_pdf
+from .outbox import queue_document_email
+from .dunning import run_dunning
+from . import numbering
+from . import activity_archive
+from .pdf_cache import get_or_render_pdf
+from .events import mark_audited, publish
+from .transitions import _clean_ids, bulk_transition_response
+from .authentication import ClaimsTokenObtainPairSerializer, forget_auth_versions
 
 # Authentication Views
 class CustomTokenObtainPairView(TokenObtainPairView):
+    """
+    Login. ClaimsTokenObtainPairSerializer checks the password once, puts the
+    user's role and name in the tokens and returns the user payload as 'user'.
+    """
+    serializer_class = ClaimsTokenObtainPairSerializer
+
     def post(self, request, *args, **kwargs):
-        # Add debug logging
-        print(f"Login attempt for username: {request.data.get('username')}")
-        
-        # Use default JWT authentication
-        response = super().post(request, *args, **kwargs)
-        
-        # If authentication successful, add user data and log the activity
-        if response.status_code == 200:
-            username = request.data.get('username')
-            password = request.data.get('password')
-            user = authenticate(username=username, password=password)
-            if user:
-                # Add user data to response
-                response.data['user'] = {
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'role': user.role,
-                    'is_active': user.is_active,
-                }
-                
-                # Log the activity
-                ActivityLog.objects.create(
-                    user=user,
-                    action='login',
-                    content_type='auth',
-                    object_id=user.id,
-                    description=f'User {user.username} logged in'
-                )
-                print(f"Login successful for user: {user.username}")
-        else:
-            print(f"Login failed with status code: {response.status_code}")
-            print(f"Response data: {response.data}")
-        
-        return response
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        user = serializer.user
+        publish(
+            'auth.logged_in',
+            user=user,
+            instance=user,
+            description=f'User {user.username} logged in'
+        )
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 def logout_view(request):
@@ -76,11 +70,10 @@ def logout_view(request):
         
         # Log logout activity
         if request.user.is_authenticated:
-            ActivityLog.objects.create(
+            publish(
+                'auth.logged_out',
                 user=request.user,
-                action='logout',
-                content_type='auth',
-                object_id=request.user.id,
+                instance=request.user,
                 description=f'User {request.user.username} logged out'
             )
         
@@ -138,11 +131,10 @@ def logout_view(request):
         
         # Log logout activity
         if request.user.is_authenticated:
-            ActivityLog.objects.create(
+            publish(
+                'auth.logged_out',
                 user=request.user,
-                action='logout',
-                content_type='auth',
-                object_id=request.user.id,
+                instance=request.user,
                 description=f'User {request.user.username} logged out'
             )
         
@@ -152,7 +144,8 @@ def logout_view(request):
 
 @api_view(['GET'])
 def profile_view(request):
-    serializer = UserSerializer(request.user)
+    # request.user only carries the token claims; load the full row once
+    serializer = UserSerializer(User.objects.get(pk=request.user.pk))
     return Response(serializer.data)
 
 @api_view(['GET'])
@@ -258,10 +251,9 @@ class UserViewSet(viewsets.ModelViewSet):
             User.objects.filter(id__in=ids).delete()
             
             # Log bulk deletion activity
-            ActivityLog.objects.create(
+            publish(
+                'user.bulk_deleted',
                 user=request.user,
-                action='bulk_delete',
-                content_type='user',
                 object_id=0,
                 description=f'Bulk deleted {deleted_count} users'
             )
@@ -270,6 +262,62 @@ class UserViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'])
+    def bulk_assign_role(self, request):
+        """Assign one role to many users with a single UPDATE"""
+        if request.user.role != 'admin':
+            return Response({'error': 'Only admin can assign roles'}, status=status.HTTP_403_FORBIDDEN)
+
+        role = request.data.get('role')
+        try:
+            ids = _clean_ids(request.data.get('ids'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if role not in dict(User.ROLE_CHOICES):
+            return Response({'error': 'Invalid role'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Prevent admins from demoting themselves
+        if request.user.id in ids:
+            return Response({'error': 'Cannot change your own role'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            changed = list(User.objects.select_for_update().filter(id__in=ids).exclude(role=role).order_by('id'))
+            updated_count = User.objects.filter(id__in=[user.id for user in changed]).update(
+                role=role, auth_version=F('auth_version') + 1
+            )
+            forget_auth_versions([user.id for user in changed])
+
+            # One audit row and one event per user, like bulk_transition
+            ActivityLog.objects.bulk_create([
+                ActivityLog(
+                    user=request.user,
+                    action='update',
+                    content_type='user',
+                    object_id=user.id,
+                    description=f'Changed role of {user.username} from {user.role} to {role} (bulk)',
+                )
+                for user in changed
+            ])
+            for user in changed:
+                changes = {'role': {'old': user.role, 'new': role}}
+                user.role = role
+                publish(
+                    'user.role_changed',
+                    user=request.user,
+                    instance=user,
+                    description=f'Changed role of {user.username} to {role} (bulk)',
+                    changes=changes,
+                    request=request,
+                    bulk=True,
+                )
+            mark_audited('user.bulk_role_changed')
+
+        # Their current access tokens stop working; refreshed tokens carry the new role
+        return Response(
+            {'message': f'Successfully assigned role {role} to {updated_count} users', 'updated': updated_count},
+            status=status.HTTP_200_OK
+        )
+
 class ClientViewSet(viewsets.ModelViewSet):
     queryset = Client.objects.all().select_related('assigned_to').prefetch_related('interactions', 'attachments')
     serializer_class = ClientSerializer
@@ -329,11 +377,10 @@ class ClientViewSet(viewsets.ModelViewSet):
             Client.objects.filter(id__in=ids).delete()
             
             # Log bulk deletion activity
-            ActivityLog.objects.create(
+            publish(
+                'client.bulk_deleted',
                 user=request.user,
-                action='bulk_delete',
-                content_type='client',
-                object_id=0,  # No specific object ID for bulk operations
+                object_id=0,
                 description=f'Bulk deleted {deleted_count} clients'
             )
             
@@ -386,10 +433,9 @@ class ServiceViewSet(viewsets.ModelViewSet):
             Service.objects.filter(id__in=ids).delete()
             
             # Log bulk deletion activity
-            ActivityLog.objects.create(
+            publish(
+                'service.bulk_deleted',
                 user=request.user,
-                action='bulk_delete',
-                content_type='service',
                 object_id=0,
                 description=f'Bulk deleted {deleted_count} services'
             )
@@ -405,31 +451,35 @@ class QuotationViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
-        self._log_activity('create', serializer.instance)
+        self._publish('created', serializer.instance)
 
     def perform_update(self, serializer):
+        previous_status = serializer.instance.status
         serializer.save()
-        self._log_activity('update', serializer.instance)
+        changes = None
+        if serializer.instance.status != previous_status:
+            changes = {'status': {'old': previous_status, 'new': serializer.instance.status}}
+        self._publish('updated', serializer.instance, changes=changes)
 
     def perform_destroy(self, instance):
-        self._log_activity('delete', instance)
+        self._publish('deleted', instance)
         instance.delete()
 
     @action(detail=True, methods=['get'])
     def generate_pdf(self, request, pk=None):
         quotation = self.get_object()
+        prefetch_related_objects([quotation], 'items__service')
         
         try:
-            pdf_content = generate_pdf('quotation', quotation)
+            pdf_content = get_or_render_pdf('quotation', quotation)
             response = HttpResponse(pdf_content, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="quotation_{quotation.number}.pdf"'
             
             # Log activity
-            ActivityLog.objects.create(
+            publish(
+                'quotation.exported',
                 user=request.user,
-                action='export',
-                content_type='quotation',
-                object_id=quotation.id,
+                instance=quotation,
                 description=f'Generated PDF for quotation {quotation.number}'
             )
             
@@ -440,24 +490,30 @@ class QuotationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def send_email(self, request, pk=None):
         quotation = self.get_object()
-        email = request.data.get('email', quotation.client.email)
+        email = request.data.get('email') or quotation.client.email
         message = request.data.get('message', '')
-        
+
         try:
-            send_email_with_pdf('quotation', quotation, email, message)
-            
-            # Log activity
-            ActivityLog.objects.create(
-                user=request.user,
-                action='email',
-                content_type='quotation',
-                object_id=quotation.id,
-                description=f'Sent quotation {quotation.number} via email to {email}'
-            )
-            
-            return Response({'message': 'Email sent successfully'})
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            validate_email(email)
+        except ValidationError:
+            return Response({'error': 'A valid recipient email is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Delivery happens in the process_email_outbox worker so a slow mail
+        # server never holds up this request
+        entry = queue_document_email('quotation', quotation, email, message, user=request.user)
+
+        # Log activity
+        publish(
+            'quotation.emailed',
+            user=request.user,
+            instance=quotation,
+            description=f'Queued quotation {quotation.number} for email to {email}'
+        )
+
+        return Response(
+            {'message': 'Email queued for delivery', 'outbox_id': entry.id},
+            status=status.HTTP_202_ACCEPTED
+        )
 
     @action(detail=True, methods=['post'])
     def convert_to_invoice(self, request, pk=None):
@@ -499,11 +555,10 @@ class QuotationViewSet(viewsets.ModelViewSet):
         quotation.save()
 
         # Log activity
-        ActivityLog.objects.create(
+        publish(
+            'quotation.converted',
             user=request.user,
-            action='convert',
-            content_type='quotation',
-            object_id=quotation.id,
+            instance=quotation,
             description=f'Converted quotation {quotation.number} to invoice {invoice.number}'
         )
         
@@ -525,11 +580,10 @@ class QuotationViewSet(viewsets.ModelViewSet):
         quotation.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        publish(
+            'quotation.approved',
             user=request.user,
-            action='approve',
-            content_type='quotation',
-            object_id=quotation.id,
+            instance=quotation,
             description=f'Approved quotation {quotation.number}'
         )
         
@@ -544,23 +598,22 @@ class QuotationViewSet(viewsets.ModelViewSet):
         quotation.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        publish(
+            'quotation.rejected',
             user=request.user,
-            action='reject',
-            content_type='quotation',
-            object_id=quotation.id,
+            instance=quotation,
             description=f'Rejected quotation {quotation.number}. Reason: {reason}'
         )
         
         return Response({'message': 'Quotation rejected'})
 
-    def _log_activity(self, action, instance):
-        ActivityLog.objects.create(
+    def _publish(self, verb, instance, changes=None):
+        publish(
+            f'quotation.{verb}',
             user=self.request.user,
-            action=action,
-            content_type='quotation',
-            object_id=instance.id,
-            description=f'{action.capitalize()} quotation {instance.number}'
+            instance=instance,
+            description=f'{verb.capitalize()} quotation {instance.number}',
+            changes=changes,
         )
     
     @action(detail=False, methods=['post'])
@@ -575,10 +628,9 @@ class QuotationViewSet(viewsets.ModelViewSet):
             Quotation.objects.filter(id__in=ids).delete()
             
             # Log bulk deletion activity
-            ActivityLog.objects.create(
+            publish(
+                'quotation.bulk_deleted',
                 user=request.user,
-                action='bulk_delete',
-                content_type='quotation',
                 object_id=0,
                 description=f'Bulk deleted {deleted_count} quotations'
             )
@@ -587,6 +639,11 @@ class QuotationViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Approve/reject many quotations in one UPDATE (see api.transitions)"""
+        return bulk_transition_response(request, 'quotation')
+
 class InvoiceViewSet(viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
@@ -594,31 +651,35 @@ class InvoiceViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
-        self._log_activity('create', serializer.instance)
+        self._publish('created', serializer.instance)
 
     def perform_update(self, serializer):
+        previous_status = serializer.instance.status
         serializer.save()
-        self._log_activity('update', serializer.instance)
+        changes = None
+        if serializer.instance.status != previous_status:
+            changes = {'status': {'old': previous_status, 'new': serializer.instance.status}}
+        self._publish('updated', serializer.instance, changes=changes)
 
     def perform_destroy(self, instance):
-        self._log_activity('delete', instance)
+        self._publish('deleted', instance)
         instance.delete()
 
     @action(detail=True, methods=['get'])
     def generate_pdf(self, request, pk=None):
         invoice = self.get_object()
+        prefetch_related_objects([invoice], 'items__service')
         
         try:
-            pdf_content = generate_pdf('invoice', invoice)
+            pdf_content = get_or_render_pdf('invoice', invoice)
             response = HttpResponse(pdf_content, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.number}.pdf"'
             
             # Log activity
-            ActivityLog.objects.create(
+            publish(
+                'invoice.exported',
                 user=request.user,
-                action='export',
-                content_type='invoice',
-                object_id=invoice.id,
+                instance=invoice,
                 description=f'Generated PDF for invoice {invoice.number}'
             )
             
@@ -629,32 +690,66 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def send_email(self, request, pk=None):
         invoice = self.get_object()
-        email = request.data.get('email', invoice.client.email)
+        email = request.data.get('email') or invoice.client.email
         message = request.data.get('message', '')
-        
+
         try:
-            send_email_with_pdf('invoice', invoice, email, message)
-            
-            # Log activity
-            ActivityLog.objects.create(
-                user=request.user,
-                action='email',
-                content_type='invoice',
-                object_id=invoice.id,
-                description=f'Sent invoice {invoice.number} via email to {email}'
-            )
-            
-            return Response({'message': 'Email sent successfully'})
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            validate_email(email)
+        except ValidationError:
+            return Response({'error': 'A valid recipient email is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Delivery happens in the process_email_outbox worker so a slow mail
+        # server never holds up this request
+        entry = queue_document_email('invoice', invoice, email, message, user=request.user)
+
+        # Log activity
+        publish(
+            'invoice.emailed',
+            user=request.user,
+            instance=invoice,
+            description=f'Queued invoice {invoice.number} for email to {email}'
+        )
+
+        return Response(
+            {'message': 'Email queued for delivery', 'outbox_id': entry.id},
+            status=status.HTTP_202_ACCEPTED
+        )
 
     @action(detail=True, methods=['post'])
     def mark_as_paid(self, request, pk=None):
         invoice = self.get_object()
         invoice.status = 'paid'
         invoice.save()
-        self._log_activity('update', invoice)
+        self._publish('paid', invoice)
         return Response({'status': 'marked as paid'})
+
+    @action(detail=False, methods=['post'])
+    def dunning(self, request):
+        """Queue one payment reminder per client covering all of their overdue invoices"""
+        if request.user.role not in ['admin', 'accountant']:
+            return Response(
+                {'error': 'Only admin and accountant users can run dunning'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        as_of = request.data.get('as_of')
+        if as_of:
+            try:
+                as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+            except ValueError:
+                return Response({'error': 'as_of must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        client_ids = request.data.get('client_ids') or None
+        if client_ids is not None:
+            if not isinstance(client_ids, list) or not all(
+                isinstance(pk, int) and not isinstance(pk, bool) for pk in client_ids
+            ):
+                return Response({'error': 'client_ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ['1', 'true', 'yes']
+
+        summary = run_dunning(request.user, as_of=as_of, client_ids=client_ids, dry_run=dry_run)
+        # Reminders are delivered by the email outbox worker
+        return Response(summary, status=status.HTTP_200_OK if dry_run else status.HTTP_202_ACCEPTED)
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -672,11 +767,10 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         invoice.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        publish(
+            'invoice.approved',
             user=request.user,
-            action='approve',
-            content_type='invoice',
-            object_id=invoice.id,
+            instance=invoice,
             description=f'Approved invoice {invoice.number}'
         )
         
@@ -691,23 +785,22 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         invoice.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        publish(
+            'invoice.rejected',
             user=request.user,
-            action='reject',
-            content_type='invoice',
-            object_id=invoice.id,
+            instance=invoice,
             description=f'Rejected invoice {invoice.number}. Reason: {reason}'
         )
         
         return Response({'message': 'Invoice rejected'})
 
-    def _log_activity(self, action, instance):
-        ActivityLog.objects.create(
+    def _publish(self, verb, instance, changes=None):
+        publish(
+            f'invoice.{verb}',
             user=self.request.user,
-            action=action,
-            content_type='invoice',
-            object_id=instance.id,
-            description=f'{action.capitalize()} invoice {instance.number}'
+            instance=instance,
+            description=f'{verb.capitalize()} invoice {instance.number}',
+            changes=changes,
         )
     
     @action(detail=False, methods=['post'])
@@ -722,10 +815,9 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             Invoice.objects.filter(id__in=ids).delete()
             
             # Log bulk deletion activity
-            ActivityLog.objects.create(
+            publish(
+                'invoice.bulk_deleted',
                 user=request.user,
-                action='bulk_delete',
-                content_type='invoice',
                 object_id=0,
                 description=f'Bulk deleted {deleted_count} invoices'
             )
@@ -734,6 +826,11 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Approve/reject/mark paid many invoices in one UPDATE (see api.transitions)"""
+        return bulk_transition_response(request, 'invoice')
+
 class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ActivityLog.objects.all()
     serializer_class = ActivityLogSerializer
@@ -745,6 +842,43 @@ class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(user=self.request.user)
         return queryset.order_by('-created_at')
 
+    @action(detail=False, methods=['get'])
+    def archived(self, request):
+        """
+        Read-only access to archived months. Without ?month=YYYY-MM lists the
+        months available; with it returns that month's rows, newest first.
+        Supports the content_type, object_id, action and (admin only) user filters.
+        """
+        month = request.query_params.get('month')
+        if not month:
+            return Response({
+                'months': [f'{year:04d}-{month:02d}' for year, month in activity_archive.archived_months()]
+            })
+
+        parsed = activity_archive.parse_month(month)
+        if not parsed:
+            return Response({'error': 'month must be in YYYY-MM format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            object_id = int(request.query_params['object_id']) if request.query_params.get('object_id') else None
+            user_id = int(request.query_params['user']) if request.query_params.get('user') else None
+        except ValueError:
+            return Response({'error': 'object_id and user must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.role != 'admin':
+            user_id = request.user.id
+
+        entries = activity_archive.read_archive(
+            *parsed,
+            user_id=user_id,
+            content_type=request.query_params.get('content_type'),
+            object_id=object_id,
+            action=request.query_params.get('action'),
+        )
+        page = self.paginate_queryset(entries)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(entries)
+
 class NumberSequenceViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing number sequences - admin only
@@ -762,30 +896,21 @@ class NumberSequenceViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'])
     def current_numbers(self, request):
-        """Get current number for each document type this month"""
+        """Get current number for each document type in the current period"""
         current_date = timezone.now().date()
         sequences = {}
         
-        for doc_type in ['quotation', 'invoice']:
-            try:
-                sequence = NumberSequence.objects.get(
-                    document_type=doc_type,
-                    year=current_date.year,
-                    month=current_date.month
-                )
-                sequences[doc_type] = {
-                    'last_number': sequence.last_number,
-                    'next_number': sequence.last_number + 1,
-                    'year': sequence.year,
-                    'month': sequence.month
-                }
-            except NumberSequence.DoesNotExist:
-                sequences[doc_type] = {
-                    'last_number': 0,
-                    'next_number': 1,
-                    'year': current_date.year,
-                    'month': current_date.month
-                }
+        for doc_type in ['quotation', 'invoice', 'project']:
+            config = numbering.get_config(doc_type)
+            year, month = numbering.period_key(config, current_date)
+            last_number = numbering.current_value(doc_type, current_date)
+            sequences[doc_type] = {
+                'last_number': last_number,
+                'next_number': last_number + 1,
+                'year': year,
+                'month': month,
+                'mode': config.get('mode', 'gapless'),
+            }
         
         return Response(sequences)
 
@@ -813,11 +938,10 @@ class InteractionViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
         
         # Log activity
-        ActivityLog.objects.create(
+        publish(
+            'interaction.created',
             user=self.request.user,
-            action='create',
-            content_type='interaction',
-            object_id=serializer.instance.id,
+            instance=serializer.instance,
             description=f'Created interaction: {serializer.instance.subject}'
         )
 
@@ -839,11 +963,10 @@ class ClientAttachmentViewSet(viewsets.ModelViewSet):
         serializer.save(uploaded_by=self.request.user)
         
         # Log activity
-        ActivityLog.objects.create(
+        publish(
+            'attachment.created',
             user=self.request.user,
-            action='create',
-            content_type='attachment',
-            object_id=serializer.instance.id,
+            instance=serializer.instance,
             description=f'Uploaded attachment: {serializer.instance.name} for {serializer.instance.client.name}'
         )
 
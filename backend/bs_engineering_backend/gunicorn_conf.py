@@ -52,4 +52,10 @@ def when_ready(server):
     server.log.info("Server is ready. Spawning workers")
 
 def worker_exit(server, worker):
+    # Write audit log rows still queued in this worker
+    try:
+        from api.audit import flush_audit_log
+        flush_audit_log()
+    except Exception as e:
+        server.log.warning("Could not flush audit log on exit: %s", e)
     server.log.info("Worker exited (pid: %s)", worker.pid)
\ No newline at end of file
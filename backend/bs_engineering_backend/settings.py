@@ -179,7 +179,7 @@ AUTH_USER_MODEL = 'api.User'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -202,7 +202,13 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Tokens carry username/role/name claims (api.authentication)
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.ClaimsTokenRefreshSerializer',
 }
+# Seconds a worker trusts its cached copy of a user's auth_version; bounds how
+# long a deactivated or re-roled user's access token keeps working elsewhere
+AUTH_VERSION_CACHE_TIMEOUT = 30
 
 # CORS configuration - allow all origins in all environments
 CORS_ALLOW_ALL_ORIGINS = True
@@ -225,7 +231,11 @@ CSRF_USE_SESSIONS = False
 CSRF_COOKIE_HTTPONLY = False  # Allow JavaScript to read CSRF token
 
 # Email configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Override with django.core.mail.backends.locmem.EmailBackend or
+# django.core.mail.backends.filebased.EmailBackend for local testing
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
@@ -233,6 +243,17 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@bsengineering.com')
 
+# Email outbox - drained by `manage.py process_email_outbox`
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=50, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60  # doubled after every failed attempt
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 3600
+EMAIL_OUTBOX_LOCK_TIMEOUT_SECONDS = 600  # reclaim rows left 'sending' by a dead worker
+
+# Dunning runs - `manage.py send_dunning_reminders` / POST /api/invoices/dunning/ queue
+# one reminder per client in the email outbox; PDFs render in this many threads when sent
+DUNNING_RENDER_WORKERS = config('DUNNING_RENDER_WORKERS', default=4, cast=int)
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -266,6 +287,33 @@ DEFAULT_CURRENCY = 'PKR'
 
 # PDF Settings
 PDF_STORAGE_PATH = MEDIA_ROOT / 'pdfs'
+PDF_CACHE_PATH = PDF_STORAGE_PATH / 'cache'
+# Render approved/sent documents in the background so downloads hit the cache
+PDF_PRERENDER_ENABLED = config('PDF_PRERENDER_ENABLED', default=True, cast=bool)
+
+# Audit log writer - ActivityLog rows from the audit middleware are queued and
+# bulk-inserted by a background thread (api.audit)
+AUDIT_LOG_ASYNC = config('AUDIT_LOG_ASYNC', default=True, cast=bool)
+AUDIT_LOG_FLUSH_INTERVAL_MS = 500
+AUDIT_LOG_BATCH_SIZE = 100
+AUDIT_LOG_MAX_QUEUE = 10000
+
+# ActivityLog retention - `manage.py archive_activity_logs` moves rows older than
+# this many months to gzipped monthly JSONL files, readable via /api/activity-logs/archived/
+ACTIVITY_LOG_RETENTION_MONTHS = config('ACTIVITY_LOG_RETENTION_MONTHS', default=12, cast=int)
+ACTIVITY_LOG_ARCHIVE_PATH = config('ACTIVITY_LOG_ARCHIVE_PATH', default=str(BASE_DIR / 'archive' / 'activity_logs'))
+
+# Document numbering - per-type overrides of api.numbering.DEFAULT_NUMBERING, e.g.
+# DOCUMENT_NUMBERING = {'invoice': {'format': 'INV-{date:%Y}-{seq:05d}', 'period': 'year'}}
+# Modes: 'gapless' (row lock per number), 'block' (per-process reserved blocks),
+# 'sequence' (native Postgres sequences, block mode elsewhere)
+DOCUMENT_NUMBERING = {}
+NUMBERING_BLOCK_SIZE = config('NUMBERING_BLOCK_SIZE', default=20, cast=int)
+
+# Sectioned project detail (api.project_sections) - seconds a cached section
+# entry is kept; writes move the affected sections to a new version (stored in
+# the database, so all workers see it) and the old entries are never read again
+PROJECT_SECTION_CACHE_TIMEOUT = 300
 
 # Logging Configuration
 LOGGING = {